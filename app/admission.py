@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import deque
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from app.monitoring.metrics import registry
+
+# Admission control: each class of routes has a limit of requests in process
+# and a bounded queue of requests waiting for a slot. When both are full, or a
+# request waited more than the queue timeout, it is rejected at once with 503
+# and Retry-After, before doing any work. So cheap writes do not wait behind
+# heavy listings, and a spike does not degrade the whole worker.
+
+HEAVY_LISTINGS = "heavy_listings"
+DETAIL_READS = "detail_reads"
+WRITES = "writes"
+ATHLETE_STATES = "athlete_states"
+
+# Listings that read many trainings and map their users
+HEAVY_LISTING_ROUTES = {
+    "/trainings/",
+    "/trainings/export",
+    "/trainers/me/trainings/",
+    "/trainers/me/stats",
+    "/athletes/me/trainings/",
+}
+# Routes never limited, to observe the service while it is saturated
+UNLIMITED_ROUTES = {"/metrics", "/slow-queries", "/ready"}
+
+ADMISSION_REJECTED = registry.counter(
+    "admission_rejected_total",
+    "Requests rejected with 503 because their route class was saturated",
+    ("route_class",),
+)
+ADMISSION_QUEUE_TIME = registry.histogram(
+    "admission_queue_seconds",
+    "Time the admitted requests waited in the queue of their route class",
+    ("route_class",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+# The limits of the middleware of the app, reported by the gauges below
+reported_limits = {}
+
+
+def admission_in_flight():
+    return {(name,): limit.active for name, limit in reported_limits.items()}
+
+
+def admission_waiting():
+    return {(name,): limit.waiting for name, limit in reported_limits.items()}
+
+
+registry.gauge(
+    "admission_in_flight",
+    "Requests in process by route class",
+    ("route_class",),
+    callback=admission_in_flight,
+)
+registry.gauge(
+    "admission_waiting",
+    "Requests waiting in the queue by route class",
+    ("route_class",),
+    callback=admission_waiting,
+)
+
+
+def route_template(scope):
+    """Template of the route that will handle the request ("/trainings/{id}"),
+    None if no route matches. Kept in the scope, to match only once."""
+
+    if "route_template" not in scope:
+        scope["route_template"] = None
+        for route in scope["app"].routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                scope["route_template"] = route.path
+                break
+    return scope["route_template"]
+
+
+def route_class_of(method: str, template: str):
+    if template is None or template in UNLIMITED_ROUTES:
+        return None
+    if method == "GET":
+        return HEAVY_LISTINGS if template in HEAVY_LISTING_ROUTES else DETAIL_READS
+    if template.startswith("/athletes/me/trainings/"):
+        return ATHLETE_STATES
+    return WRITES
+
+
+def parse_limits(limits: str):
+    """Parse "heavy_listings=16:32,writes=32:64" into {route class: (limit,
+    queue size)}"""
+
+    parsed = {}
+    for item in limits.split(","):
+        if not item.strip():
+            continue
+        name, values = item.strip().split("=")
+        limit, queue_size = values.split(":")
+        parsed[name] = (int(limit), int(queue_size))
+    return parsed
+
+
+class ConcurrencyLimit:
+    """At most "limit" holders, and "queue_size" waiting in FIFO order. A
+    released slot is handed directly to the first waiter."""
+
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # when the slot was handed over just at the timeout, the result
+            # is returned instead of raising
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed over to a request that went away
+            raise
+        finally:
+            if not waiter.done() or waiter.cancelled():
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+
+class AdmissionMiddleware:
+    """Limits the requests in process by route class. Only the middleware
+    built with "report" (the one of the app) is reported by the gauges."""
+
+    def __init__(
+        self,
+        app,
+        limits: dict,
+        queue_timeout: float = 1,
+        retry_after=1,
+        report: bool = False,
+    ):
+        self.app = app
+        self.limits = {
+            name: ConcurrencyLimit(limit, queue_size)
+            for name, (limit, queue_size) in limits.items()
+        }
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        if report:
+            reported_limits.clear()
+            reported_limits.update(self.limits)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route_class = route_class_of(scope["method"], route_template(scope))
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        if not await limit.acquire(self.queue_timeout):
+            ADMISSION_REJECTED.inc(route_class)
+            response = JSONResponse(
+                status_code=503,
+                content=f'Too many requests of {route_class}, retry later',
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            return await response(scope, receive, send)
+
+        ADMISSION_QUEUE_TIME.observe(time.perf_counter() - start, route_class)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.release()
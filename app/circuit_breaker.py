@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import deque
+from fastapi import HTTPException, status
+from app.monitoring.metrics import registry
+
+# Circuit breaker of the requests to another service. While the service fails,
+# the breaker "opens" and the requests fail fast (503) instead of waiting for
+# the timeout, so the coroutines do not pile up. After "open_seconds" it lets
+# a few probe requests pass ("half open"), and closes again when they succeed.
+# REFERENCES:
+# - https://martinfowler.com/bliki/CircuitBreaker.html
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breakers = {}
+
+
+class CircuitOpenError(HTTPException):
+    def __init__(self, service: str, detail: str):
+        super().__init__(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
+        self.service = service
+
+
+class CircuitBreaker:
+    """Opens when, of the last "window" requests (and at least "minimum_calls"),
+    a fraction of "failure_rate" or more failed. Only the breakers built with
+    "register" (the ones of the services) are reported in the metrics."""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        window: int = 20,
+        minimum_calls: int = 10,
+        open_seconds: float = 10,
+        half_open_probes: int = 1,
+        register: bool = False,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._probes = 0
+        self._opened_at = 0
+        self.state = CLOSED
+        if register:
+            breakers[name] = self
+
+    def is_open(self):
+        """Open and still rejecting requests (not ready to probe)"""
+
+        return (
+            self.state == OPEN
+            and time.monotonic() - self._opened_at < self.open_seconds
+        )
+
+    def allow(self):
+        """If a request can be sent. In half open, it takes a probe slot that
+        is released by "record" or "release"."""
+
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    BREAKER_REJECTED.inc(self.name)
+                    return False
+                self.transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    BREAKER_REJECTED.inc(self.name)
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, success: bool):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                self.transition(CLOSED if success else OPEN)
+                return
+            self._outcomes.append(success)
+            if self.state == CLOSED and len(self._outcomes) >= self.minimum_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self.transition(OPEN)
+
+    def release(self):
+        """The request was cancelled, without an outcome"""
+
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+
+    def transition(self, state: str):
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._probes = 0
+        self.state = state
+        BREAKER_TRANSITIONS.inc(self.name, state)
+
+    def reset(self):
+        with self._lock:
+            self._outcomes.clear()
+            self._probes = 0
+            self.state = CLOSED
+
+
+def breakers_state():
+    return {(name,): STATE_VALUES[breaker.state] for name, breaker in breakers.items()}
+
+
+BREAKER_STATE = registry.gauge(
+    "circuit_breaker_state",
+    "State of the circuit breaker of each service (0 closed, 1 half open, 2 open)",
+    ("service",),
+    callback=breakers_state,
+)
+BREAKER_TRANSITIONS = registry.counter(
+    "circuit_breaker_transitions_total",
+    "Times the circuit breaker of each service changed to a state",
+    ("service", "state"),
+)
+BREAKER_REJECTED = registry.counter(
+    "circuit_breaker_rejected_total",
+    "Requests to other services rejected because the circuit was open",
+    ("service",),
+)
@@ -1,12 +1,21 @@
 import jwt
-from passlib.context import CryptContext
+from functools import lru_cache
 from pydantic import BaseSettings
 from datetime import datetime
-from app.config.config import Settings
+from app.config.config import get_settings
 from app.trainings.models import UserRoles
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-app_settings = Settings()
+app_settings = get_settings()
+
+
+@lru_cache()
+def password_context():
+    """Built the first time a password is verified: no route hashes them, so
+    passlib and bcrypt are not loaded when the app starts"""
+
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 class SettingsAuth(BaseSettings):
@@ -22,4 +31,4 @@ class SettingsAuth(BaseSettings):
         return token
 
     def verify_password(plain_password, hashed_password):
-        return pwd_context.verify(plain_password, hashed_password)
+        return password_context().verify(plain_password, hashed_password)
@@ -6,17 +6,27 @@ from os import environ
 from pydantic import BaseSettings
 from app.config.log_config import logconfig
 from datetime import timedelta
-from passlib.context import CryptContext
+from functools import lru_cache
 
+# before the class: its defaults (and the values computed from them, as
+# EXPIRES) are read from the environment when the class is defined
 load_dotenv()
-dictConfig(logconfig)
 logger = logging.getLogger('app')
 
 
 class Settings(BaseSettings):
     PORT: int = environ.get("PORT", 7501)
+    WEB_CONCURRENCY: int = environ.get("WEB_CONCURRENCY", 0)
+    FORWARDED_ALLOW_IPS: str = environ.get("FORWARDED_ALLOW_IPS", "")
     DB_PORT: int = environ.get("DB_PORT", 27017)
     MONGODB_URI: str = environ.get("MONGODB_URI", "mongodb:27017")
+    MONGODB_MIN_POOL_SIZE: int = environ.get("MONGODB_MIN_POOL_SIZE", 4)
+    MONGODB_STARTUP_TIMEOUT_SECONDS: int = environ.get(
+        "MONGODB_STARTUP_TIMEOUT_SECONDS", 10
+    )
+    SHUTDOWN_STEP_TIMEOUT_SECONDS: int = environ.get(
+        "SHUTDOWN_STEP_TIMEOUT_SECONDS", 10
+    )
     JWT_SECRET: str = environ.get("JWT_SECRET", "123456")
     JWT_ALGORITHM: str = environ.get("JWT_ALGORITHM", "HS256")
     RESET_PASSWORD_EXPIRATION_MINUTES = environ.get(
@@ -32,10 +42,95 @@ class Settings(BaseSettings):
     GOALS_SERVICE_URL: str = environ.get(
         "GOALS_SERVICE_URL", "http://goals-microservice:7502"
     )
+    USER_SERVICE_TIMEOUT_SECONDS: float = environ.get("USER_SERVICE_TIMEOUT_SECONDS", 2)
+    # the list of all the users (with their favorites) is much heavier
+    USER_LIST_TIMEOUT_SECONDS: float = environ.get("USER_LIST_TIMEOUT_SECONDS", 10)
+    GOALS_SERVICE_TIMEOUT_SECONDS: float = environ.get(
+        "GOALS_SERVICE_TIMEOUT_SECONDS", 3
+    )
+    USER_HEDGING_ENABLED: bool = environ.get("USER_HEDGING_ENABLED", "false") == "true"
+    USER_HEDGING_BUDGET: float = environ.get("USER_HEDGING_BUDGET", 0.05)
+    HTTP_MAX_CONNECTIONS: int = environ.get("HTTP_MAX_CONNECTIONS", 100)
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = environ.get(
+        "HTTP_MAX_KEEPALIVE_CONNECTIONS", 20
+    )
+    BREAKER_FAILURE_RATE: float = environ.get("BREAKER_FAILURE_RATE", 0.5)
+    BREAKER_WINDOW: int = environ.get("BREAKER_WINDOW", 20)
+    BREAKER_MINIMUM_CALLS: int = environ.get("BREAKER_MINIMUM_CALLS", 10)
+    BREAKER_OPEN_SECONDS: float = environ.get("BREAKER_OPEN_SECONDS", 10)
+    MAP_USERS_DEFAULT: str = environ.get("MAP_USERS_DEFAULT", "true")
+    MAP_USERS_DEADLINE_MS: int = environ.get("MAP_USERS_DEADLINE_MS", 1000)
+    ADMISSION_ENABLED: bool = environ.get("ADMISSION_ENABLED", "false") == "true"
+    ADMISSION_LIMITS: str = environ.get(
+        "ADMISSION_LIMITS",
+        "heavy_listings=16:32,detail_reads=64:128,writes=32:64,athlete_states=16:32",
+    )
+    ADMISSION_QUEUE_TIMEOUT_MS: int = environ.get("ADMISSION_QUEUE_TIMEOUT_MS", 1000)
+    ADMISSION_RETRY_AFTER_SECONDS: int = environ.get("ADMISSION_RETRY_AFTER_SECONDS", 1)
+    RATE_LIMIT_ENABLED: bool = environ.get("RATE_LIMIT_ENABLED", "false") == "true"
+    RATE_LIMITS: str = environ.get(
+        "RATE_LIMITS",
+        "athlete_states=user:0.5:10,ip:5:50;writes=user:5:50,ip:20:200",
+    )
+    RATE_LIMIT_EVICT_SECONDS: int = environ.get("RATE_LIMIT_EVICT_SECONDS", 60)
     CLOUDAMQP_URL: str = environ.get("CLOUDAMQP_URL", "todo-me")
+    PUBLISHER_MODE: str = environ.get("PUBLISHER_MODE", "local")
+    PUBLISHER_SOCKET: str = environ.get(
+        "PUBLISHER_SOCKET", "/tmp/training-publisher.sock"
+    )
+    PUBLISHER_FLUSH_INTERVAL_MS: int = environ.get("PUBLISHER_FLUSH_INTERVAL_MS", 50)
+    PUBLISHER_MAX_PENDING: int = environ.get("PUBLISHER_MAX_PENDING", 10000)
+    PUBLISHER_ENCODING: str = environ.get("PUBLISHER_ENCODING", "json")
+    PUBLISHER_COMPRESSION: str = environ.get("PUBLISHER_COMPRESSION", "none")
+    PUBLISHER_BATCH_SIZE: int = environ.get("PUBLISHER_BATCH_SIZE", 500)
+    PUBLISHER_MAX_IN_FLIGHT: int = environ.get("PUBLISHER_MAX_IN_FLIGHT", 1000)
+    PUBLISHER_CONFIRM_TIMEOUT_SECONDS: float = environ.get(
+        "PUBLISHER_CONFIRM_TIMEOUT_SECONDS", 30
+    )
+    PUBLISHER_AGGREGATION: bool = (
+        environ.get("PUBLISHER_AGGREGATION", "false") == "true"
+    )
+    PUBLISHER_AGGREGATION_SECONDS: float = environ.get(
+        "PUBLISHER_AGGREGATION_SECONDS", 60
+    )
+    PUBLISHER_RAW_ACTIONS: str = environ.get("PUBLISHER_RAW_ACTIONS", "")
     TZ: str = environ.get("TZ", "America/Argentina/Buenos_Aires")
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    METRICS_ENABLED: bool = environ.get("METRICS_ENABLED", "true") == "true"
+    LOOP_WATCHDOG_ENABLED: bool = (
+        environ.get("LOOP_WATCHDOG_ENABLED", "false") == "true"
+    )
+    LOOP_WATCHDOG_THRESHOLD_MS: int = environ.get("LOOP_WATCHDOG_THRESHOLD_MS", 100)
+    LOOP_WATCHDOG_INTERVAL_MS: int = environ.get("LOOP_WATCHDOG_INTERVAL_MS", 50)
+    TRACING_ENABLED: bool = environ.get("TRACING_ENABLED", "false") == "true"
+    TRACING_SAMPLE_RATE: float = environ.get("TRACING_SAMPLE_RATE", 0.1)
+    # addresses whose sampling decision (of "traceparent") is followed
+    TRACING_TRUSTED_UPSTREAMS: str = environ.get("TRACING_TRUSTED_UPSTREAMS", "")
+    TRACING_EXPORTER: str = environ.get("TRACING_EXPORTER", "log")
+    TRACING_FILE: str = environ.get("TRACING_FILE", "traces.ndjson")
+    TRACING_COLLECTOR_URL: str = environ.get(
+        "TRACING_COLLECTOR_URL", "http://localhost:9411/spans"
+    )
+    SLOW_QUERY_ENABLED: bool = environ.get("SLOW_QUERY_ENABLED", "false") == "true"
+    SLOW_QUERY_THRESHOLD_MS: int = environ.get("SLOW_QUERY_THRESHOLD_MS", 100)
+    SLOW_QUERY_EXPLAIN: bool = environ.get("SLOW_QUERY_EXPLAIN", "true") == "true"
+    RANKINGS_REFRESH_SECONDS: int = environ.get("RANKINGS_REFRESH_SECONDS", 300)
+    RANKINGS_STARTUP_TIMEOUT_SECONDS: int = environ.get(
+        "RANKINGS_STARTUP_TIMEOUT_SECONDS", 10
+    )
+    RANKINGS_SIZE: int = environ.get("RANKINGS_SIZE", 50)
+    RANKINGS_MIN_VOTES: int = environ.get("RANKINGS_MIN_VOTES", 3)
+    RANKINGS_TRENDING_HOURS: int = environ.get("RANKINGS_TRENDING_HOURS", 72)
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    """The settings of the app, read once (from the environment and .env) the
+    first time they are needed and shared by every module. The logging is
+    configured then too, not when this module is imported."""
+
+    dictConfig(logconfig)
+    return Settings()
@@ -0,0 +1,117 @@
+import asyncio
+import math
+import threading
+from collections import deque
+from app.monitoring.metrics import registry
+
+# Hedged requests: when a request has not answered after the p95 latency
+# observed for its service, a second attempt is sent and the first answer
+# wins. Only ~5% of the requests are slower than the p95, and the hedges are
+# limited by a budget (a fraction of the requests), so the extra load on the
+# service is bounded.
+# REFERENCES:
+# - https://research.google/pubs/the-tail-at-scale/
+
+HEDGES_ISSUED = registry.counter(
+    "hedged_requests_total",
+    "Second attempts sent to other services after their observed p95",
+    ("service",),
+)
+HEDGES_WON = registry.counter(
+    "hedged_requests_won_total",
+    "Second attempts that answered before the first one",
+    ("service",),
+)
+
+
+class LatencyWindow:
+    """p95 of the last "size" latencies, recomputed every "every" samples"""
+
+    def __init__(self, size: int = 512, every: int = 32, minimum: int = 64):
+        self._latencies = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.every = every
+        self.minimum = minimum
+        self._since = 0
+        self._p95 = None
+
+    def observe(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+            self._since += 1
+            if self._since >= self.every and len(self._latencies) >= self.minimum:
+                self._since = 0
+                latencies = sorted(self._latencies)
+                self._p95 = latencies[math.ceil(0.95 * len(latencies)) - 1]
+
+    def p95(self):
+        """None until "minimum" latencies were observed"""
+
+        return self._p95
+
+
+class HedgeBudget:
+    """Each request earns "ratio" of a hedge, up to "burst" hedges saved"""
+
+    def __init__(self, ratio: float = 0.05, burst: float = 10):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def take(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+def answered(task):
+    """The attempt answered, with a response that is not a server error (the
+    same that request_upstream counts as a success for the breaker)"""
+
+    if task.exception() is not None:
+        return False
+    return getattr(task.result(), "status_code", 0) < 500
+
+
+async def hedged(service, attempt, latencies: LatencyWindow, budget, deadline):
+    """Await attempt(), and send a second one if the first has not answered
+    after the p95 of "latencies" (and before "deadline" seconds). Returns the
+    first answer that is not a server error; the other attempt is cancelled,
+    and so are both if the caller is."""
+
+    budget.earn()
+    primary = asyncio.ensure_future(attempt())
+    pending = {primary}
+    try:
+        delay = latencies.p95()
+        if delay is None or delay >= deadline:
+            return await primary
+
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done or not budget.take():
+            return await primary
+
+        HEDGES_ISSUED.inc(service)
+        hedge = asyncio.ensure_future(attempt())
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if answered(task):
+                    if task is hedge:
+                        HEDGES_WON.inc(service)
+                    return task.result()
+        # neither answered: the server error (or exception) of the first one
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
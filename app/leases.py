@@ -0,0 +1,47 @@
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger('app')
+
+# Work that only one of the workers (of every host) has to do, as the rankings
+# aggregations, is done by the one that holds its lease: a document in the
+# "leases" collection with its owner and when it expires. The owner renews it
+# each time it does the work, and when it stops renewing it (it died or was
+# stopped) another worker takes it once it expired.
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Lease:
+    def __init__(self, collection, name: str, seconds: float, owner: str = WORKER_ID):
+        self.collection = collection
+        self.name = name
+        self.seconds = seconds
+        self.owner = owner
+
+    def acquire(self, now: datetime = None):
+        """Take or renew the lease. False if another worker holds it"""
+
+        now = now or datetime.utcnow()
+        try:
+            # when held by another worker nothing matches, and the upsert
+            # fails as the document of the lease already exists
+            self.collection.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now}}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "expires_at": now + timedelta(seconds=self.seconds),
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False
+        return True
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import time
+from app.monitoring.metrics import registry
+
+logger = logging.getLogger('app')
+
+# Startup and shutdown of the app as a list of steps, in the order they depend
+# on each other (the database before the indexes and caches that use it, the
+# clients before the workers that send requests with them). Each step is
+# timed. If a required step fails, the ones already started are stopped and
+# the startup fails. The shutdown stops the started steps in reverse order, so
+# each one can still use what it depends on to finish its work.
+
+STARTUP_STEP_SECONDS = registry.gauge(
+    "startup_step_seconds",
+    "Seconds that each step of the startup took",
+    ("step",),
+)
+COLD_START_SECONDS = registry.gauge(
+    "cold_start_seconds",
+    "Seconds since the process started until it was ready and until the first "
+    "byte of a response was sent",
+    ("phase",),
+)
+
+IMPORTED_AT = time.time()
+
+
+def process_start_time():
+    """Wall clock time when this process started (from /proc when available,
+    else when this module was imported)"""
+
+    try:
+        with open("/proc/self/stat") as stat:
+            # the fields after the name (that could have spaces), the 22nd
+            # field of the line is the start in clock ticks since boot
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            seconds_since_boot = float(uptime.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return IMPORTED_AT
+    since_start = seconds_since_boot - start_ticks / os.sysconf("SC_CLK_TCK")
+    return time.time() - since_start
+
+
+class Step:
+    __slots__ = ("name", "start", "stop", "required", "timeout")
+
+    def __init__(self, name, start, stop, required, timeout):
+        self.name = name
+        self.start = start
+        self.stop = stop
+        self.required = required
+        self.timeout = timeout
+
+
+class Lifecycle:
+    def __init__(self, stop_timeout: float = 10):
+        self.stop_timeout = stop_timeout
+        self.steps = []
+        self.started = []
+        self.started_at = process_start_time()
+
+    def step(self, name: str, start=None, stop=None, required=False, timeout=None):
+        """Add a step. "start" and "stop" are async functions without
+        arguments; "timeout" bounds the start."""
+
+        self.steps.append(Step(name, start, stop, required, timeout))
+
+    async def start(self):
+        for step in self.steps:
+            begin = time.perf_counter()
+            try:
+                if step.start is not None:
+                    await asyncio.wait_for(step.start(), step.timeout)
+            except Exception as e:
+                logger.error(f'Startup step "{step.name}" failed: {e!r}')
+                if step.required:
+                    await self.stop()
+                    raise
+                continue
+            except BaseException as e:
+                # cancelled (or interrupted) while starting: nothing started
+                # is left running
+                logger.error(f'Startup interrupted at step "{step.name}": {e!r}')
+                await self.stop()
+                raise
+            finally:
+                seconds = time.perf_counter() - begin
+                STARTUP_STEP_SECONDS.set(seconds, step.name)
+                logger.info(f'Startup step "{step.name}" took {seconds:.3f}s')
+            self.started.append(step)
+
+        ready = time.time() - self.started_at
+        COLD_START_SECONDS.set(ready, "ready")
+        logger.info(f'Ready {ready:.3f}s after the process started')
+
+    async def stop(self):
+        while self.started:
+            step = self.started.pop()
+            if step.stop is None:
+                continue
+            try:
+                await asyncio.wait_for(step.stop(), self.stop_timeout)
+            except Exception as e:
+                logger.error(f'Shutdown step "{step.name}" failed: {e!r}')
+
+    def first_byte(self):
+        seconds = time.time() - self.started_at
+        COLD_START_SECONDS.set(seconds, "first_byte")
+        logger.info(f'First response {seconds:.3f}s after the process started')
+
+
+class FirstByteMiddleware:
+    """Reports the time until the first response of the process starts"""
+
+    def __init__(self, app, lifecycle: Lifecycle):
+        self.app = app
+        self.lifecycle = lifecycle
+        self.sent = False
+
+    async def __call__(self, scope, receive, send):
+        if self.sent or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_first(message):
+            if message["type"] == "http.response.start" and not self.sent:
+                self.sent = True
+                self.lifecycle.first_byte()
+            await send(message)
+
+        await self.app(scope, receive, send_first)
@@ -1,51 +1,220 @@
 import asyncio
+import functools
 import pymongo
 import logging
 
 from fastapi import FastAPI
-from logging.config import dictConfig
-from app.config.config import Settings
-from .config.log_config import logconfig
-from app.publisher.publisher_queue import runPublisherManager
+from app.config.config import get_settings
+from app.publisher.publisher_thread import getPublisherThread
 from app.publisher.publisher_queue_middleware import PublisherQueueEventMiddleware
+from app.admission import AdmissionMiddleware, parse_limits
+from app.rate_limit import MemoryBucketStore, RateLimitMiddleware, parse_rate_limits
+from app.monitoring.metrics_middleware import MetricsMiddleware
+from app.monitoring.metrics_mongo import MongoMetricsListener
+from app.monitoring.routes import router_monitoring
+from app.monitoring.slow_queries import slow_queries
+from app.monitoring.loop_watchdog import LoopWatchdog
+from app.monitoring.tracing import (
+    MongoTracingListener,
+    TracingMiddleware,
+    exporter_from,
+    parse_upstreams,
+    tracer,
+)
 from app.trainings.athletes import router_athletes
 from app.trainings.trainings import router_trainings
 from app.trainings.trainings_crud import router_trainers
+from app.trainings.trainers_stats import router_trainers_stats
 from app.trainings.scores import router_scores
 from app.trainings.comments import router_comments
+from app.trainings.rankings import rankings, rankings_lease, runRankingsManager
+from app.services import close_http_clients, open_http_clients
+from app.lifecycle import FirstByteMiddleware, Lifecycle
+from app.leases import Lease
+from app.trainings.indexes import ensure_indexes
 
 
-dictConfig(logconfig)
 app = FastAPI()
-app_settings = Settings()
+app_settings = get_settings()
 logger = logging.getLogger("app")
 
 app.add_middleware(PublisherQueueEventMiddleware)
+if app_settings.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        limits=parse_limits(app_settings.ADMISSION_LIMITS),
+        queue_timeout=int(app_settings.ADMISSION_QUEUE_TIMEOUT_MS) / 1000,
+        retry_after=int(app_settings.ADMISSION_RETRY_AFTER_SECONDS),
+        report=True,
+    )
+if app_settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limits=parse_rate_limits(app_settings.RATE_LIMITS),
+        secret=app_settings.JWT_SECRET,
+        algorithm=app_settings.JWT_ALGORITHM,
+        store=MemoryBucketStore(int(app_settings.RATE_LIMIT_EVICT_SECONDS)),
+    )
+if app_settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+if app_settings.TRACING_ENABLED:
+    tracer.configure(
+        exporter=exporter_from(
+            app_settings.TRACING_EXPORTER,
+            path=app_settings.TRACING_FILE,
+            url=app_settings.TRACING_COLLECTOR_URL,
+        ),
+        sample_rate=float(app_settings.TRACING_SAMPLE_RATE),
+        trusted_upstreams=parse_upstreams(app_settings.TRACING_TRUSTED_UPSTREAMS),
+    )
+    app.add_middleware(TracingMiddleware)
 
 
-@app.on_event("startup")
-async def startup_db_client():
-    try:
-        app.mongodb_client = pymongo.MongoClient(app_settings.MONGODB_URI)
-        logger.info("Connected successfully MongoDB")
-    except Exception as e:
-        logger.error(e)
-        logger.error("Could not connect to MongoDB")
+app.ready = False
+app.loop_watchdog = None
+lifecycle = Lifecycle(stop_timeout=int(app_settings.SHUTDOWN_STEP_TIMEOUT_SECONDS))
+app.add_middleware(FirstByteMiddleware, lifecycle=lifecycle)
 
-    app.logger = logger
+
+async def start_mongo():
+    """Connect to MongoDB and check it answers, opening the minimum of the
+    pool with as many pings at the same time"""
+
+    event_listeners = []
+    if app_settings.METRICS_ENABLED:
+        event_listeners.append(MongoMetricsListener())
+    if app_settings.TRACING_ENABLED:
+        event_listeners.append(MongoTracingListener())
+    if app_settings.SLOW_QUERY_ENABLED:
+        slow_queries.threshold = int(app_settings.SLOW_QUERY_THRESHOLD_MS) / 1000
+        slow_queries.explain = app_settings.SLOW_QUERY_EXPLAIN
+        event_listeners.append(slow_queries)
+    min_pool_size = int(app_settings.MONGODB_MIN_POOL_SIZE)
+    # the startup pings are bounded by the timeout of the step (and the client
+    # closed if they do not answer), the queries keep the timeout of the driver
+    app.mongodb_client = pymongo.MongoClient(
+        app_settings.MONGODB_URI,
+        event_listeners=event_listeners,
+        minPoolSize=min_pool_size,
+    )
+    slow_queries.client = app.mongodb_client
     app.database = app.mongodb_client["training_microservice"]
 
-    app.task_publisher_manager = asyncio.create_task(runPublisherManager())
-    # app.database.trainings.delete_many({})
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.gather(
+            *[
+                loop.run_in_executor(None, app.mongodb_client.admin.command, "ping")
+                for _ in range(max(1, min_pool_size))
+            ]
+        )
+    except BaseException:
+        # failed or timed out (cancelled): the step did not start, so it is
+        # not stopped, and the client (with its monitor threads) is closed here
+        app.mongodb_client.close()
+        raise
+    logger.info("Connected successfully MongoDB")
+
+
+async def stop_mongo():
+    app.mongodb_client.close()
+
+
+async def start_indexes():
+    # by one of the workers that start together
+    lease = Lease(app.database["leases"], "indexes", seconds=60)
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(None, lease.acquire):
+        await loop.run_in_executor(None, ensure_indexes, app.database)
+
+
+async def start_rankings():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        None, rankings.refresh_or_load, app.database, rankings_lease(app.database)
+    )
+
+
+async def start_publisher():
+    if app_settings.PUBLISHER_MODE == "local":
+        getPublisherThread().start()
+
+
+async def stop_publisher():
+    if app_settings.PUBLISHER_MODE != "local":
+        return  # the publisher thread was not started, nor built
+    # waits for the messages of the last requests to be published and
+    # confirmed, half of the step at most, and closes in the other half
+    timeout = int(app_settings.SHUTDOWN_STEP_TIMEOUT_SECONDS) / 2
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        None, functools.partial(getPublisherThread().stop, timeout, timeout)
+    )
+
+
+async def start_rankings_manager():
+    # the first refresh waits a period, unless the one of the startup did not
+    # finish in time
+    app.task_rankings_manager = asyncio.create_task(
+        runRankingsManager(refresh_now=rankings.updated_at is None)
+    )
+
+
+async def stop_rankings_manager():
+    app.task_rankings_manager.cancel()
+
+
+async def start_loop_watchdog():
+    if app_settings.LOOP_WATCHDOG_ENABLED:
+        app.loop_watchdog = LoopWatchdog(
+            threshold=int(app_settings.LOOP_WATCHDOG_THRESHOLD_MS) / 1000,
+            interval=int(app_settings.LOOP_WATCHDOG_INTERVAL_MS) / 1000,
+        )
+        app.loop_watchdog.start()
+
+
+async def stop_loop_watchdog():
+    if app.loop_watchdog:
+        app.loop_watchdog.stop()
+        app.loop_watchdog = None
+
+
+lifecycle.step(
+    "mongo",
+    start_mongo,
+    stop_mongo,
+    required=True,
+    timeout=int(app_settings.MONGODB_STARTUP_TIMEOUT_SECONDS),
+)
+lifecycle.step("indexes", start_indexes)
+lifecycle.step(
+    "rankings",
+    start_rankings,
+    timeout=int(app_settings.RANKINGS_STARTUP_TIMEOUT_SECONDS),
+)
+lifecycle.step("http_clients", open_http_clients, close_http_clients)
+lifecycle.step("publisher", start_publisher, stop_publisher)
+lifecycle.step("rankings_manager", start_rankings_manager, stop_rankings_manager)
+lifecycle.step("loop_watchdog", start_loop_watchdog, stop_loop_watchdog)
+
+
+@app.on_event("startup")
+async def startup_db_client():
+    app.logger = logger
+    await lifecycle.start()
+    app.ready = True
+    logger.info("Ready to accept requests")
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    app.mongodb_client.close()
-    app.task_publisher_manager.cancel()
+    # uvicorn already waited for the requests in process
+    app.ready = False
+    await lifecycle.stop()
     logger.info("Shutdown app")
 
 
+app.include_router(router_monitoring, tags=["Monitoring - Training microservice"])
 app.include_router(
     router_trainings,
     prefix="/trainings",
@@ -56,6 +225,11 @@ app.include_router(
     prefix="/trainers/me/trainings",
     tags=["CRUD for Trainers - Training microservice"],
 )
+app.include_router(
+    router_trainers_stats,
+    prefix="/trainers/me",
+    tags=["Statistics for Trainers - Training microservice"],
+)
 
 app.include_router(
     router_athletes,
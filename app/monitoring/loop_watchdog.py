@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from starlette.requests import Request
+from app.monitoring.metrics import registry
+from app.monitoring.metrics_middleware import route_of
+
+logger = logging.getLogger('app')
+
+APP_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENT_LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop to wake up a sleeping heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+EVENT_LOOP_BLOCKED = registry.counter(
+    "event_loop_blocked_total",
+    "Times the event loop was blocked more than the threshold, by call site",
+    ("route", "call_site"),
+)
+
+
+class LoopWatchdog:
+    """Detect callbacks that block the event loop (e.g. sync pymongo calls
+    inside async handlers).
+
+    A heartbeat task on the loop wakes up every "interval" and measures the lag.
+    A monitor thread checks the last heartbeat, and when the loop has not beat
+    for more than "threshold", it captures the stack of the loop thread once
+    per stall, to report the route and the blocking call site. While the loop
+    runs fine the cost is a wake up per interval in each side."""
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        interval: float = 0.05,
+        history: int = 100,
+        directory: str = APP_DIRECTORY,
+    ):
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self.reports = deque(maxlen=history)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        """Must be called from the event loop to watch"""
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.get_running_loop().create_task(self.heartbeat())
+        self._thread = threading.Thread(
+            target=self.monitor, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+        logger.info(
+            f'Event loop watchdog started with threshold {self.threshold * 1000}ms'
+        )
+
+    def stop(self):
+        self._stopping.set()
+        if self._task:
+            self._task.cancel()
+
+    async def heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            EVENT_LOOP_LAG.observe(max(0, now - expected))
+            self._last_beat = now
+
+    def monitor(self):
+        reported_beat = None
+        while not self._stopping.wait(self.interval):
+            last_beat = self._last_beat
+            blocked = time.monotonic() - last_beat
+            if blocked > self.threshold and reported_beat != last_beat:
+                reported_beat = last_beat
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self.report(frame, blocked)
+
+    def report(self, frame, blocked: float):
+        route, call_site, location = self.describe(frame, self.directory)
+        report = {
+            "blocked_ms": round(blocked * 1000, 1),
+            "route": route,
+            "call_site": call_site,
+            "location": location,
+        }
+        self.reports.append(report)
+        EVENT_LOOP_BLOCKED.inc(report["route"], call_site)
+        logger.warning(
+            f'Event loop blocked for more than {report["blocked_ms"]}ms'
+            + f' in {route} at {call_site} ({location})'
+        )
+
+    @staticmethod
+    def describe(frame, directory: str = APP_DIRECTORY):
+        """Route of the request being handled (its template, as in the metrics
+        of the requests), and the call site of the block: the last function of
+        "directory" and the function that it was calling"""
+
+        route = "unknown"
+        current = frame
+        while current is not None:
+            request = current.f_locals.get("request")
+            if isinstance(request, Request):
+                route = route_of(request.scope)
+                break
+            current = current.f_back
+
+        stack = traceback.extract_stack(frame)
+        app_frames = [
+            index
+            for index, summary in enumerate(stack)
+            if summary.filename.startswith(directory)
+            and not summary.filename.endswith("loop_watchdog.py")
+        ]
+        if not app_frames:
+            summary = stack[-1]
+            location = f"{os.path.relpath(summary.filename)}:{summary.lineno}"
+            return route, summary.name, location
+
+        last_app = stack[app_frames[-1]]
+        call_site = last_app.name
+        if app_frames[-1] + 1 < len(stack):
+            call_site += f" → {stack[app_frames[-1] + 1].name}"
+        location = f"{os.path.relpath(last_app.filename)}:{last_app.lineno}"
+        return route, call_site, location
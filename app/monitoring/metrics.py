@@ -0,0 +1,187 @@
+import threading
+from bisect import bisect_left
+from typing import Callable
+
+# In-process registry of metrics, exposed at /metrics in the Prometheus text
+# format. Every update is a dict lookup and an addition under a lock, so it is
+# cheap enough to stay enabled in production.
+# REFERENCES:
+# - https://prometheus.io/docs/instrumenting/exposition_formats/
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Metric):
+    """Gauge with values set explicitly, or read from a callback at scrape
+    time (the callback returns {labels tuple: value})"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels=(), callback: Callable = None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self.header()
+        values = dict(self._values)
+        if self.callback:
+            try:
+                values.update(self.callback())
+            except Exception:
+                pass
+        for labels, value in values.items():
+            lines.append(f"{self.name}{format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(labels)
+            if values is None:
+                # counts by bucket (the last one is +Inf), sum and count
+                values = self._values[labels] = [[0] * (len(self.buckets) + 1), 0, 0]
+            values[0][index] += 1
+            values[1] += value
+            values[2] += 1
+
+    def count(self, *labels):
+        values = self._values.get(labels)
+        return values[2] if values else 0
+
+    def render(self):
+        lines = self.header()
+        names = self.labels + ("le",)
+        with self._lock:
+            for labels, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(
+                        f"{self.name}_bucket"
+                        f"{format_labels(names, labels + (bound,))} {cumulative}"
+                    )
+                label_text = format_labels(self.labels, labels)
+                lines.append(f"{self.name}_sum{label_text} {total}")
+                lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric: Metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), callback=None):
+        return self.register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "Latency of the requests by route template and status code",
+    ("method", "route", "status"),
+)
+MONGO_OPERATIONS = registry.counter(
+    "mongo_operations_total",
+    "Operations sent to MongoDB by collection, command and result",
+    ("collection", "command", "result"),
+)
+MONGO_OPERATION_DURATION = registry.histogram(
+    "mongo_operation_duration_seconds",
+    "Latency of the MongoDB operations by collection and command",
+    ("collection", "command"),
+)
+UPSTREAM_REQUEST_DURATION = registry.histogram(
+    "upstream_request_duration_seconds",
+    "Latency of the requests to other services",
+    ("service", "method"),
+)
+UPSTREAM_ERRORS = registry.counter(
+    "upstream_errors_total",
+    "Requests to other services that failed, or answered with status >= 500",
+    ("service", "method"),
+)
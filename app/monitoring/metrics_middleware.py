@@ -0,0 +1,48 @@
+import time
+from app.monitoring.metrics import HTTP_REQUEST_DURATION
+
+_routes = {}
+
+
+def route_of(scope):
+    """Template of the route matched for the request, or "unmatched" """
+
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in _routes:
+        for route in scope["app"].routes:
+            if hasattr(route, "endpoint"):
+                _routes.setdefault(route.endpoint, route.path)
+    return _routes.setdefault(endpoint, "unmatched")
+
+
+class MetricsMiddleware:
+    """ASGI middleware that observes the latency of each request, labeled by
+    the template of the route ("/trainings/{training_id}") instead of the
+    path, so the count of series stays bounded."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                route_of(scope),
+                status_code[0],
+            )
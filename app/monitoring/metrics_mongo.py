@@ -0,0 +1,35 @@
+import threading
+from pymongo import monitoring
+from app.monitoring.metrics import MONGO_OPERATION_DURATION, MONGO_OPERATIONS
+
+
+class MongoMetricsListener(monitoring.CommandListener):
+    """Count and time every command sent to MongoDB, by collection. It is
+    registered in the MongoClient created at startup."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        self.finished(event, "success")
+
+    def failed(self, event):
+        self.finished(event, "failure")
+
+    def finished(self, event, result):
+        with self._lock:
+            collection = self._collections.pop(
+                (event.connection_id, event.request_id), ""
+            )
+        MONGO_OPERATIONS.inc(collection, event.command_name, result)
+        MONGO_OPERATION_DURATION.observe(
+            event.duration_micros / 1e6, collection, event.command_name
+        )
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from starlette.responses import JSONResponse, PlainTextResponse
+from app.config.auth_baerer import JWTBearer
+from app.config.config import get_settings
+from app.monitoring.metrics import registry
+from app.monitoring.slow_queries import slow_queries
+from app.trainings.models import UserRoles
+from app.trainings.trainings_crud import get_all_data_of_access_token
+
+app_settings = get_settings()
+router_monitoring = APIRouter()
+
+
+def get_admin(token: str = Depends(JWTBearer())):
+    """Only the admins can see the queries of the service"""
+
+    data = get_all_data_of_access_token(token)
+    if UserRoles(data["role"]) != UserRoles.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Only for admins"
+        )
+    return data
+
+
+@router_monitoring.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Metrics of the service in the Prometheus text format",
+)
+def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@router_monitoring.get(
+    "/slow-queries",
+    summary="Shapes of the MongoDB queries slower than the threshold, by time spent",
+)
+def get_slow_queries(
+    limit: int = Query(50, ge=1, le=500), admin: dict = Depends(get_admin)
+):
+    if not app_settings.SLOW_QUERY_ENABLED:
+        return JSONResponse(status_code=404, content='Slow query log disabled')
+    return JSONResponse(
+        {
+            "threshold_ms": slow_queries.threshold * 1000,
+            "shapes": slow_queries.report()[:limit],
+        }
+    )
+
+
+@router_monitoring.get(
+    "/ready",
+    summary="If the worker finished its warm up and accepts requests",
+)
+def get_ready(request: Request):
+    if not getattr(request.app, "ready", False):
+        return JSONResponse(status_code=503, content='Not ready')
+    return JSONResponse(status_code=200, content='Ready')
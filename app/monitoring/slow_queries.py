@@ -0,0 +1,202 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import monitoring
+
+logger = logging.getLogger('app')
+
+# Part of the command that holds the query, by command name
+QUERY_FIELDS = {
+    "find": ("filter", "sort", "projection"),
+    "aggregate": ("pipeline",),
+    "count": ("query",),
+    "distinct": ("key", "query"),
+    "findAndModify": ("query", "sort"),
+    "update": ("updates",),
+    "delete": ("deletes",),
+}
+# Commands that are explained to get the plan, without side effects
+EXPLAINABLE = ("find", "aggregate", "count", "distinct")
+EXPLAIN_FIELDS = QUERY_FIELDS["find"] + ("pipeline", "query", "key", "cursor")
+
+
+def normalize(value):
+    """Shape of a query: the same keys and operators, with values stripped"""
+
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(item, dict) for item in value):
+            return [normalize(item) for item in value]
+        return "?"
+    return "?"
+
+
+def shape_of(command_name, command):
+    shape = {}
+    for field in QUERY_FIELDS.get(command_name, ()):
+        if field not in command:
+            continue
+        if field == "updates":
+            shape["q"] = [normalize(update.get("q", {})) for update in command[field]]
+        elif field == "deletes":
+            shape["q"] = [normalize(delete.get("q", {})) for delete in command[field]]
+        elif field == "key":
+            shape[field] = command[field]
+        else:
+            shape[field] = normalize(command[field])
+    return shape
+
+
+def summarize_plan(explain):
+    """Docs and keys examined, and the stages of the winning plan, of the
+    result of an explain with executionStats"""
+
+    if "stages" in explain:  # aggregate with more stages than the $cursor
+        explain = explain["stages"][0].get("$cursor", {})
+    stats = explain.get("executionStats", {})
+    stages = []
+    plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    while plan:
+        stage = plan.get("stage")
+        if plan.get("indexName"):
+            stage = f'{stage}({plan["indexName"]})'
+        stages.append(stage)
+        plan = plan.get("inputStage", {})
+    return {
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_returned": stats.get("nReturned"),
+        "plan": " <- ".join(str(stage) for stage in stages),
+    }
+
+
+class SlowQueryLog(monitoring.CommandListener):
+    """Log the commands sent to MongoDB that took more than "threshold", with
+    the shape of their query, and count them by shape for /slow-queries.
+
+    The command is only normalized when it was slow. The first time a shape
+    of a read is seen, it is explained in a background thread to get the
+    docs examined and the plan ("client" must be set to do it)."""
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        explain: bool = True,
+        max_shapes: int = 500,
+        executor=None,
+    ):
+        self.threshold = threshold
+        self.explain = explain
+        self.max_shapes = max_shapes
+        self.client = None
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._commands = {}
+        self.shapes = {}
+
+    def started(self, event):
+        with self._lock:
+            self._commands[(event.connection_id, event.request_id)] = (
+                event.database_name,
+                event.command,
+            )
+
+    def succeeded(self, event):
+        self.finished(event)
+
+    def failed(self, event):
+        self.finished(event)
+
+    def finished(self, event):
+        with self._lock:
+            database_name, command = self._commands.pop(
+                (event.connection_id, event.request_id), (None, None)
+            )
+        duration_ms = event.duration_micros / 1000
+        if command is None or duration_ms < self.threshold * 1000:
+            return
+        if event.command_name == "explain":
+            return
+        self.record(database_name, event.command_name, command, duration_ms)
+
+    def record(self, database_name, command_name, command, duration_ms):
+        collection = command.get(command_name)
+        if not isinstance(collection, str):
+            collection = command.get("collection", "")
+        shape = json.dumps(shape_of(command_name, command), default=str)
+        key = (collection, command_name, shape)
+
+        with self._lock:
+            stats = self.shapes.get(key)
+            new_shape = stats is None
+            if new_shape:
+                if len(self.shapes) >= self.max_shapes:
+                    return
+                stats = self.shapes[key] = {
+                    "collection": collection,
+                    "command": command_name,
+                    "shape": shape,
+                    "count": 0,
+                    "total_ms": 0,
+                    "max_ms": 0,
+                    "plan": None,
+                }
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+
+        logger.warning(
+            f'Slow query on {collection}: {command_name} {shape} took {duration_ms}ms'
+            + (f' ({stats["plan"]})' if stats["plan"] else '')
+        )
+        if new_shape and self.explain and command_name in EXPLAINABLE:
+            if self.client is not None:
+                self.executor().submit(
+                    self.explain_shape, stats, database_name, command_name, command
+                )
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="slow-query-explain"
+            )
+        return self._executor
+
+    def explain_shape(self, stats, database_name, command_name, command):
+        explained = {command_name: command[command_name]}
+        for field in EXPLAIN_FIELDS:
+            if field in command:
+                explained[field] = command[field]
+        if command_name == "aggregate" and any(
+            "$out" in stage or "$merge" in stage for stage in command["pipeline"]
+        ):
+            return
+        try:
+            result = self.client[database_name].command(
+                "explain", explained, verbosity="executionStats"
+            )
+            plan = summarize_plan(result)
+        except Exception as e:
+            logger.warning(f"Slow query could not be explained: {e}")
+            return
+        with self._lock:
+            stats["plan"] = plan
+        logger.warning(
+            f'Plan of slow query on {stats["collection"]}: {stats["command"]}'
+            f' {stats["shape"]}: {plan}'
+        )
+
+    def report(self):
+        """Shapes of the slow queries, the ones that took more time first"""
+
+        with self._lock:
+            shapes = [dict(stats) for stats in self.shapes.values()]
+        for stats in shapes:
+            stats["total_ms"] = round(stats["total_ms"], 3)
+            stats["average_ms"] = round(stats["total_ms"] / stats["count"], 3)
+        return sorted(shapes, key=lambda stats: stats["total_ms"], reverse=True)
+
+
+slow_queries = SlowQueryLog()
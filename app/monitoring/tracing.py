@@ -0,0 +1,341 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+from app.monitoring.metrics_middleware import route_of
+
+logger = logging.getLogger('app')
+
+# Lightweight request-scoped tracing. A root span is opened per sampled request
+# and child spans around each operation to MongoDB and each request to other
+# services. When the request ends, its spans are handed to an exporter. The
+# trace context is propagated in the W3C "traceparent" header, so the spans of
+# the other services can be joined with ours.
+# REFERENCES:
+# - https://www.w3.org/TR/trace-context/
+
+TRACEPARENT = "traceparent"
+
+_current_span = ContextVar("current_span", default=None)
+
+
+def new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+class Span:
+    __slots__ = (
+        "trace",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "name",
+        "attributes",
+        "start",
+        "_start",
+        "duration_ms",
+        "error",
+    )
+
+    def __init__(self, trace, trace_id, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.trace_id = trace_id
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes or {}
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+
+    def child(self, name, **attributes):
+        span = Span(self.trace, self.trace_id, name, self.span_id, attributes)
+        self.trace.append(span)
+        return span
+
+    def finish(self, error=None):
+        self.duration_ms = round((time.perf_counter() - self._start) * 1000, 3)
+        if error is not None:
+            self.error = str(error) or type(error).__name__
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+def parse_traceparent(header: str):
+    """(trace_id, parent_id, sampled) of a traceparent header, None if invalid"""
+
+    parts = header.strip().split("-") if header else []
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = int(parts[3], 16) & 1 == 1
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class LogExporter:
+    def export(self, spans):
+        for span in spans:
+            logger.info(f"span {json.dumps(span.dict())}")
+
+
+class FileExporter:
+    """Append the spans to a file, one JSON per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        lines = "".join(json.dumps(span.dict()) + "\n" for span in spans)
+        with self._lock:
+            with open(self.path, "a") as file:
+                file.write(lines)
+
+
+class CollectorExporter:
+    """POST the spans of each trace as a JSON list to a local collector. The
+    requests are sent by a background thread, so the event loop never waits
+    on the collector; traces are dropped when "max_pending" are waiting."""
+
+    def __init__(self, url: str, max_pending: int = 1000, timeout: float = 2):
+        self.url = url
+        self.timeout = timeout
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(
+            target=self.run, name="trace-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, spans):
+        try:
+            self._pending.put_nowait([span.dict() for span in spans])
+        except queue.Full:
+            logger.warning("Trace collector queue is full, trace dropped")
+
+    def run(self):
+        while True:
+            spans = self._pending.get()
+            try:
+                request = urllib.request.Request(
+                    self.url,
+                    data=json.dumps(spans).encode(),
+                    headers={"Content-Type": "application/json"},
+                )
+                urllib.request.urlopen(request, timeout=self.timeout).close()
+            except Exception as e:
+                logger.warning(f"Trace collector cannot be accessed: {e}")
+
+
+def parse_upstreams(upstreams: str):
+    """Parse "10.0.0.1, 10.0.0.2" into the set of addresses"""
+
+    return {upstream.strip() for upstream in upstreams.split(",") if upstream.strip()}
+
+
+def exporter_from(name: str, path: str = None, url: str = None):
+    if name == "file":
+        return FileExporter(path)
+    if name == "collector":
+        return CollectorExporter(url)
+    return LogExporter()
+
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate: float = 0.0, trusted_upstreams=()):
+        self.exporter = exporter or LogExporter()
+        self.sample_rate = sample_rate
+        self.trusted_upstreams = set(trusted_upstreams)
+
+    def configure(
+        self, exporter=None, sample_rate: float = None, trusted_upstreams=None
+    ):
+        if exporter is not None:
+            self.exporter = exporter
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if trusted_upstreams is not None:
+            self.trusted_upstreams = set(trusted_upstreams)
+
+    def start_trace(
+        self, name: str, traceparent: str = None, upstream: str = None, **attributes
+    ):
+        """Root span of a request, None when the request is not sampled. An
+        incoming trace context is continued. Its sampled flag decides the
+        sampling when it comes from one of the trusted upstreams, as its parent
+        did; from anyone else it is still capped by the sample rate, so clients
+        can not make every request traced."""
+
+        incoming = parse_traceparent(traceparent)
+        if incoming is not None:
+            trace_id, parent_id, sampled = incoming
+            if upstream not in self.trusted_upstreams:
+                sampled = sampled and random.random() < self.sample_rate
+        else:
+            trace_id, parent_id = new_id(16), None
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return None
+        trace = []
+        span = Span(trace, trace_id, name, parent_id, attributes)
+        trace.append(span)
+        return span
+
+    def end_trace(self, root: Span, error=None):
+        root.finish(error)
+        try:
+            self.exporter.export(root.trace)
+        except Exception as e:
+            logger.error(f"Trace could not be exported: {e}")
+
+    @staticmethod
+    def current_span():
+        return _current_span.get()
+
+    @staticmethod
+    @contextmanager
+    def activate(span: Span):
+        """Make "span" the current one, the parent of the spans of the block"""
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Child span of the current one, or nothing if the request is not
+        being traced. The context is restored when the block ends."""
+
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = parent.child(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(e)
+            raise
+        else:
+            span.finish()
+        finally:
+            _current_span.reset(token)
+
+    @staticmethod
+    def inject(headers: dict = None):
+        """Headers with the trace context of the current span, for a request
+        to another service"""
+
+        headers = dict(headers) if headers else {}
+        span = _current_span.get()
+        if span is not None:
+            headers[TRACEPARENT] = span.traceparent()
+        return headers
+
+
+tracer = Tracer()
+
+
+class TracingMiddleware:
+    """ASGI middleware that opens the root span of each sampled request, named
+    by the template of the route once it has been matched"""
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        client = scope.get("client")
+        root = self.tracer.start_trace(
+            scope["method"],
+            traceparent,
+            upstream=client[0] if client else None,
+            path=scope["path"],
+        )
+        if root is None:
+            return await self.app(scope, receive, send)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                root.attributes["status_code"] = message["status"]
+            await send(message)
+
+        error = None
+        try:
+            with self.tracer.activate(root):
+                await self.app(scope, receive, send_with_status)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            root.name = f'{scope["method"]} {route_of(scope)}'
+            self.tracer.end_trace(root, error)
+
+
+class MongoTracingListener(monitoring.CommandListener):
+    """Child spans of the current request around every command sent to
+    MongoDB. pymongo calls the listener in the thread (and context) that runs
+    the operation, so the span of the request is available at "started"."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def started(self, event):
+        parent = _current_span.get()
+        if parent is None:
+            return
+        collection = event.command.get(event.command_name)
+        span = parent.child(
+            f"mongo {event.command_name}",
+            collection=collection if isinstance(collection, str) else "",
+        )
+        with self._lock:
+            self._spans[(event.connection_id, event.request_id)] = span
+
+    def succeeded(self, event):
+        self.finished(event)
+
+    def failed(self, event):
+        self.finished(event, event.failure)
+
+    def finished(self, event, error=None):
+        with self._lock:
+            span = self._spans.pop((event.connection_id, event.request_id), None)
+        if span is not None:
+            span.finish(error)
+            span.duration_ms = event.duration_micros / 1000
@@ -0,0 +1,64 @@
+# Pre-aggregation of the metrics messages. The consumer only charts counts per
+# action and training type per minute, so instead of one message per request
+# the publisher can count them by (action, training_type, status_code, minute)
+# and publish the counts every "flush_interval". The actions in "raw_actions"
+# are still published one by one. A minute can be flushed more than once (when
+# the interval is shorter, or at the edges), so the consumer adds the counts
+# of the same key.
+
+
+def parse_actions(actions: str):
+    """Parse "new_training, media_upload" into a set of actions"""
+
+    return {action.strip() for action in actions.split(",") if action.strip()}
+
+
+class Aggregator:
+    def __init__(self, raw_actions=()):
+        self.raw_actions = set(raw_actions)
+        self.counts = {}
+
+    def add(self, message: dict):
+        """Count the message. Returns False if it has to be published as is"""
+
+        action = message.get("action", "")
+        if action in self.raw_actions:
+            return False
+        key = (
+            action,
+            message.get("training_type", ""),
+            message.get("status_code", ""),
+            message.get("datetime", "")[:16],  # "YYYY-MM-DD HH:MM"
+        )
+        try:
+            response_time = float(message.get("response_time") or 0)
+        except ValueError:
+            response_time = 0
+        count, total, slowest = self.counts.get(key, (0, 0, 0))
+        self.counts[key] = (
+            count + 1,
+            total + response_time,
+            max(slowest, response_time),
+        )
+        return True
+
+    def flush(self, service: str = "training-service"):
+        """The counts since the last flush, as aggregate messages"""
+
+        counts, self.counts = self.counts, {}
+        aggregates = []
+        for key, (count, total, slowest) in counts.items():
+            action, training_type, status_code, minute = key
+            aggregates.append(
+                {
+                    "service": service,
+                    "action": action,
+                    "training_type": training_type,
+                    "status_code": status_code,
+                    "minute": minute,
+                    "count": count,
+                    "response_time_total": total,
+                    "response_time_max": slowest,
+                }
+            )
+        return aggregates
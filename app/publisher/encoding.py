@@ -0,0 +1,152 @@
+import json
+import zlib
+from urllib.parse import urlsplit
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for PUBLISHER_ENCODING=msgpack
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for PUBLISHER_COMPRESSION=zstd
+    zstandard = None
+
+# Encodings of the metrics messages, told to the consumers by the AMQP
+# "content_type" (and "content_encoding" when compressed) of each message, so
+# they can accept the new ones while the old ones are still being published:
+# - "json": one event per message as a JSON object, as always
+#   (application/json)
+# - "schema": a batch envelope of many events, each one a JSON array with the
+#   values of SCHEMA_FIELDS (BATCH_JSON)
+# - "msgpack": the same envelope in msgpack (BATCH_MSGPACK)
+# In the envelope the "service" is sent once, and the "url" is replaced by its
+# "query" (the host is always ours and the path is already a field).
+# The counts of the pre-aggregation mode are always a JSON array of objects
+# (AGGREGATES_JSON), compressed like the rest.
+
+JSON = "application/json"
+BATCH_JSON = "application/vnd.fiufit.metrics-batch+json"
+BATCH_MSGPACK = "application/vnd.fiufit.metrics-batch+msgpack"
+AGGREGATES_JSON = "application/vnd.fiufit.metrics-aggregates+json"
+
+SCHEMA_VERSION = 1
+SCHEMA_FIELDS = (
+    "path",
+    "query",
+    "method",
+    "status_code",
+    "datetime",
+    "response_time",
+    "user_id",
+    "ip",
+    "country",
+    "action",
+    "training_id",
+    "training_type",
+)
+
+CONTENT_TYPES = {"json": JSON, "schema": BATCH_JSON, "msgpack": BATCH_MSGPACK}
+
+
+def compact(message: dict):
+    values = dict(message, query=urlsplit(message.get("url", "")).query)
+    return [values.get(field, "") for field in SCHEMA_FIELDS]
+
+
+def expand(values: list, fields: list, service: str):
+    message = dict(zip(fields, values))
+    message["service"] = service
+    return message
+
+
+class MessageEncoder:
+    """Turns the messages to publish into AMQP bodies and their properties
+    ("content_type", "content_encoding" and a "events" header with the number
+    of events of the body)"""
+
+    def __init__(
+        self,
+        encoding: str = "json",
+        compression: str = "none",
+        batch_size: int = 500,
+    ):
+        if encoding not in CONTENT_TYPES:
+            raise ValueError(f'Unknown metrics encoding: {encoding}')
+        if encoding == "msgpack" and msgpack is None:
+            raise ValueError('The msgpack encoding needs the "msgpack" package')
+        if compression not in ("none", "zlib", "zstd"):
+            raise ValueError(f'Unknown metrics compression: {compression}')
+        if compression == "zstd" and zstandard is None:
+            raise ValueError('The zstd compression needs the "zstandard" package')
+        self.encoding = encoding
+        self.compression = compression
+        self.batch_size = batch_size if encoding != "json" else 1
+
+    def serialize(self, messages: list):
+        if self.encoding == "json":
+            return json.dumps(messages[0]).encode()
+        envelope = {
+            "version": SCHEMA_VERSION,
+            "service": messages[0].get("service", ""),
+            "fields": SCHEMA_FIELDS,
+            "events": [compact(message) for message in messages],
+        }
+        if self.encoding == "msgpack":
+            return msgpack.packb(envelope)
+        return json.dumps(envelope, separators=(",", ":")).encode()
+
+    def compress(self, body: bytes):
+        if self.compression == "zlib":
+            return zlib.compress(body)
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().compress(body)
+        return body
+
+    def properties(self, content_type: str, events: int):
+        properties = {"content_type": content_type, "headers": {"events": events}}
+        if self.compression != "none":
+            properties["content_encoding"] = self.compression
+        return properties
+
+    def encode(self, messages: list):
+        """[(body, properties)] for the messages, "batch_size" per body"""
+
+        encoded = []
+        for start in range(0, len(messages), self.batch_size):
+            end = start + self.batch_size
+            batch = messages[start:end]
+            properties = self.properties(CONTENT_TYPES[self.encoding], len(batch))
+            encoded.append((self.compress(self.serialize(batch)), properties))
+        return encoded
+
+    def encode_aggregates(self, aggregates: list):
+        """[(body, properties)] with all the aggregates in one body"""
+
+        body = json.dumps(aggregates, separators=(",", ":")).encode()
+        properties = self.properties(AGGREGATES_JSON, len(aggregates))
+        return [(self.compress(body), properties)]
+
+
+def decode(body: bytes, content_type: str = JSON, content_encoding: str = None):
+    """The messages of a body, for the consumers (and the tests)"""
+
+    if content_encoding == "zlib":
+        body = zlib.decompress(body)
+    elif content_encoding == "zstd":
+        body = zstandard.ZstdDecompressor().decompress(body)
+
+    if content_type == JSON:
+        return [json.loads(body)]
+    if content_type == AGGREGATES_JSON:
+        return json.loads(body)
+    if content_type == BATCH_MSGPACK:
+        envelope = msgpack.unpackb(body)
+    elif content_type == BATCH_JSON:
+        envelope = json.loads(body)
+    else:
+        raise ValueError(f'Unknown metrics content type: {content_type}')
+    return [
+        expand(values, envelope["fields"], envelope["service"])
+        for values in envelope["events"]
+    ]
@@ -6,31 +6,25 @@ import datetime
 logger = logging.getLogger('app')
 
 
-def MessageQueueFrom(
+STATE_FIELDS = ("user_id", "action", "training_id", "training_type")
+
+
+def message_from(
     request: Request, response: Response, timestamp: float, response_time: float
 ):
+    """The message of the request, and the fields of "request.state" that the
+    route did not set (sent empty)"""
 
     date_time = datetime.datetime.fromtimestamp(timestamp)
     formatted_datetime = date_time.strftime(
         "%Y-%m-%d %H:%M:%S.%f"
     )  # datetime obj to ISO 8601 format
 
-    action = ""
-    user_id = ""
-    training_id = ""
-    training_type = ""
-
-    try:
-        user_id = request.state.user_id
-        action = request.state.action
-        training_id = request.state.training_id
-        training_type = request.state.training_type
-
-    except Exception as e:
-        logger.info(e)
-        pass
+    state = {field: getattr(request.state, field, None) for field in STATE_FIELDS}
+    missing = [field for field, value in state.items() if value is None]
+    state = {field: "" if value is None else value for field, value in state.items()}
 
-    return {
+    message = {
         "service": "training-service",
         "path": f'{request.url.path}',
         "url": f'{request.url}',
@@ -38,10 +32,57 @@ def MessageQueueFrom(
         "status_code": f'{response.status_code}',
         "datetime": f'{formatted_datetime}',
         "response_time": f'{response_time}',
-        "user_id": f'{user_id}',
+        "user_id": f'{state["user_id"]}',
         "ip": f'{request.client.host}',
         "country": "",
-        "action": f'{action}',
-        "training_id": f'{training_id}',
-        "training_type": f'{training_type}',
+        "action": f'{state["action"]}',
+        "training_id": f'{state["training_id"]}',
+        "training_type": f'{state["training_type"]}',
     }
+    return message, missing
+
+
+def log_missing(request: Request, missing: list, messages: int = 1):
+    if missing:
+        logger.debug(
+            f'{messages} message(s) of {request.method} {request.url.path}'
+            + f' without {", ".join(missing)}'
+        )
+
+
+def MessageQueueFrom(
+    request: Request, response: Response, timestamp: float, response_time: float
+):
+    message, missing = message_from(request, response, timestamp, response_time)
+    log_missing(request, missing)
+    return message
+
+
+def MessagesQueueFrom(
+    request: Request, response: Response, timestamp: float, response_time: float
+):
+    """Build the messages of a request. Bulk routes register every training
+    affected in "request.state.trainings" as (training_id, training_type) pairs,
+    and one message is built for each one of them. The fields the route did
+    not set are logged once for the whole batch."""
+
+    trainings = getattr(request.state, "trainings", None)
+    if not trainings:
+        return [MessageQueueFrom(request, response, timestamp, response_time)]
+
+    message, missing = message_from(request, response, timestamp, response_time)
+    missing = [
+        field for field in missing if field not in ("training_id", "training_type")
+    ]
+    log_missing(request, missing, len(trainings))
+
+    messages = []
+    for training_id, training_type in trainings:
+        messages.append(
+            dict(
+                message,
+                training_id=f'{training_id}',
+                training_type=f'{training_type}',
+            )
+        )
+    return messages
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+from app.config.config import get_settings
+from app.monitoring.metrics import registry
+from app.publisher.publisher_queue import getPublisherQueue
+from app.publisher.publisher_thread import getPublisherThread
+
+# Single publisher for many workers. With PUBLISHER_MODE=socket the workers do
+# not connect to RabbitMQ: each metrics message is sent as one datagram to a
+# local unix socket, where a single publisher process receives them and
+# publishes them over its own (and only) AMQP connection. Sending a datagram
+# never blocks the worker: if the publisher is down or behind, the message is
+# dropped and counted.
+
+app_settings = get_settings()
+logger = logging.getLogger('app')
+
+PUBLISHER_DROPPED = registry.counter(
+    "publisher_dropped_messages_total",
+    "Metrics messages dropped by the worker before reaching the publisher",
+    ("reason",),
+)
+
+
+class SocketPublisher:
+    """Worker side: same "publish_message" of the PublisherQueue, but the
+    message goes to the publisher process"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+
+    def publish_message(self, message):
+        try:
+            self._sock.sendto(json.dumps(message).encode(), self.path)
+        except BlockingIOError:
+            PUBLISHER_DROPPED.inc("full")
+        except OSError:  # the publisher process is not running
+            PUBLISHER_DROPPED.inc("unavailable")
+
+    def close(self):
+        self._sock.close()
+
+
+class PublisherServer:
+    """Publisher side: receives the datagrams of the workers on the event loop
+    of the AMQP connection, and hands them to "publisher" (the PublisherQueue,
+    or a fake broker in tests). Everything waiting in the socket is read at
+    once, up to "batch_size" messages per wake up, when the publisher is
+    ready for them."""
+
+    def __init__(
+        self,
+        path: str,
+        publisher,
+        batch_size: int = 256,
+        retry_interval: float = 0.05,
+    ):
+        self.path = path
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.received = 0
+        self._sock = None
+        self._loop = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left by a previous publisher
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        self._loop = loop
+        loop.add_reader(self._sock.fileno(), self.on_readable)
+        logger.info('Publisher listening on %s', self.path)
+
+    def on_readable(self):
+        if not self.publisher.is_ready():
+            # stop reading until it is, the messages wait in the socket and
+            # the workers drop them when it is full
+            self._loop.remove_reader(self._sock.fileno())
+            self._loop.call_later(self.retry_interval, self.resume)
+            return
+        messages = []
+        for _ in range(self.batch_size):
+            try:
+                datagram = self._sock.recv(65536)
+            except BlockingIOError:
+                break
+            try:
+                messages.append(json.loads(datagram))
+            except ValueError as e:
+                logger.error(f'Invalid metrics message: {e}')
+        self.received += len(messages)
+        if messages:
+            self.publisher.publish_messages(messages)
+
+    def resume(self):
+        if self._sock is not None:
+            self._loop.add_reader(self._sock.fileno(), self.on_readable)
+
+    def stop(self):
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def getPublisher():
+    """Publisher of the metrics messages of this process"""
+
+    if app_settings.PUBLISHER_MODE == "socket":
+        return SocketPublisher(app_settings.PUBLISHER_SOCKET)
+    return getPublisherThread()
+
+
+def runPublisherProcess(path: str = None):
+    """Entry of the publisher process: the socket of the workers and the AMQP
+    connection share one event loop, until SIGTERM"""
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    publisher = getPublisherQueue()
+    publisher.use_ioloop(loop)
+    server = PublisherServer(path or app_settings.PUBLISHER_SOCKET, publisher)
+    server.start(loop)
+
+    def stop():
+        server.stop()
+        try:
+            publisher.stop(int(app_settings.SHUTDOWN_STEP_TIMEOUT_SECONDS))
+        except Exception as e:  # not connected yet
+            logger.warning(f'Publisher stopped while connecting: {e}')
+            loop.stop()
+
+    loop.add_signal_handler(signal.SIGTERM, stop)
+    publisher.run()
+    loop.close()
+
+
+if __name__ == "__main__":
+    runPublisherProcess()
@@ -1,8 +1,12 @@
 import functools
-import json
+import logging
+import time
 import pika
-from app.config.config import Settings
-import app.main as main
+from collections import OrderedDict, deque
+from app.config.config import get_settings
+from app.monitoring.metrics import registry
+from app.publisher.aggregation import Aggregator, parse_actions
+from app.publisher.encoding import MessageEncoder
 
 from pika.adapters.asyncio_connection import AsyncioConnection
 
@@ -17,7 +21,14 @@ from app.publisher.queue_settings import EXCHANGE, EXCHANGE_TYPE, QUEUE, ROUTING
 # - https://github.com/pika/pika/blob/main/examples/asynchronous_publisher_example.py
 # - https://github.com/pika/pika/blob/main/examples/asyncio_consumer_example.py
 
-app_settings = Settings()
+app_settings = get_settings()
+logger = logging.getLogger('app')
+
+PUBLISHER_REPUBLISHED = registry.counter(
+    "publisher_republished_messages_total",
+    "AMQP messages published again by reason (nack, timeout or reconnect)",
+    ("reason",),
+)
 
 
 class PublisherQueue:
@@ -32,15 +43,39 @@ class PublisherQueue:
     It uses delivery confirmations and illustrates one way to keep track of
     messages that have been sent and if they've been confirmed by RabbitMQ.
 
+    The messages to publish wait in "_outgoing" (encoded, as (body,
+    properties)). At most "max_in_flight" are published without confirmation,
+    kept by delivery tag in "_deliveries" (in order of publication) with the
+    time they were sent. Acks remove them, and nacks, confirmations that take
+    more than "confirm_timeout" seconds and reconnections put them back first
+    in "_outgoing". While "_outgoing" is not empty the publisher is not ready
+    for more messages, so the ones behind it wait (or are dropped) upstream:
+    messages should only be given to it when "is_ready".
+
     """
 
     instance = None  # For Singleton pattern!
 
-    def __new__(cls, amqp_url):
+    def __new__(
+        cls,
+        amqp_url,
+        encoder: MessageEncoder = None,
+        max_in_flight: int = 1000,
+        confirm_timeout: float = 30,
+        aggregator: Aggregator = None,
+        aggregation_interval: float = 60,
+    ):
         """Setup the example publisher object, passing in the URL we will use
         to connect to RabbitMQ.
 
         :param str amqp_url: The URL for connecting to RabbitMQ
+        :param MessageEncoder encoder: How the messages are encoded (one JSON
+            per message by default)
+        :param int max_in_flight: Messages published and not yet confirmed
+        :param float confirm_timeout: Seconds until a message not confirmed
+            is published again
+        :param Aggregator aggregator: If given, the messages are counted by it
+            and its counts are published every "aggregation_interval" seconds
 
         """
         if cls.instance is None:
@@ -48,16 +83,31 @@ class PublisherQueue:
             cls.instance._connection = None
             cls.instance._channel = None
 
-            cls.instance._deliveries = None
+            cls.instance._deliveries = OrderedDict()
+            cls.instance._outgoing = deque()
+            cls.instance._publishing = False
+            cls.instance._timers = {}
             cls.instance._acked = None
             cls.instance._nacked = None
             cls.instance._message_number = None
 
             cls.instance._stopping = False
             cls.instance._url = amqp_url
+            cls.instance._ioloop = None
+            cls.instance._encoder = encoder or MessageEncoder()
+            cls.instance._max_in_flight = max_in_flight
+            cls.instance._confirm_timeout = confirm_timeout
+            cls.instance._aggregator = aggregator
+            cls.instance._aggregation_interval = aggregation_interval
 
         return cls.instance
 
+    def use_ioloop(cls, ioloop):
+        """Run the connection on "ioloop" instead of a new event loop of pika
+        (or the running one)"""
+
+        cls.instance._ioloop = ioloop
+
     def connect(cls):
         """This method connects to RabbitMQ, returning the connection handle.
         When the connection is established, the on_connection_open method
@@ -66,12 +116,13 @@ class PublisherQueue:
         :rtype: pika.SelectConnection
 
         """
-        main.logger.info('Connecting to %s', cls.instance._url)
+        logger.info('Connecting to %s', cls.instance._url)
         return AsyncioConnection(
             pika.URLParameters(cls.instance._url),
             on_open_callback=cls.instance.on_connection_open,
             on_open_error_callback=cls.instance.on_connection_open_error,
             on_close_callback=cls.instance.on_connection_closed,
+            custom_ioloop=cls.instance._ioloop,
         )
 
     def on_connection_open(cls, _unused_connection):
@@ -82,7 +133,7 @@ class PublisherQueue:
         :param pika.SelectConnection _unused_connection: The connection
 
         """
-        main.logger.info('Connection opened')
+        logger.info('Connection opened')
         cls.instance.open_channel()
 
     def on_connection_open_error(cls, _unused_connection, err):
@@ -93,7 +144,7 @@ class PublisherQueue:
         :param Exception err: The error
 
         """
-        main.logger.error('Connection open failed, reopening in 5 seconds: %s', err)
+        logger.error('Connection open failed, reopening in 5 seconds: %s', err)
         cls.instance._connection.ioloop.call_later(
             5, cls.instance._connection.ioloop.stop
         )
@@ -109,10 +160,14 @@ class PublisherQueue:
 
         """
         cls.instance._channel = None
+        cls.instance._publishing = False
+        for timer in cls.instance._timers.values():
+            timer.cancel()
+        cls.instance._timers = {}
         if cls.instance._stopping:
             cls.instance._connection.ioloop.stop()
         else:
-            main.logger.warning('Connection closed, reopening in 5 seconds: %s', reason)
+            logger.warning('Connection closed, reopening in 5 seconds: %s', reason)
             cls.instance._connection.ioloop.call_later(
                 5, cls.instance._connection.ioloop.stop
             )
@@ -124,7 +179,7 @@ class PublisherQueue:
         will be invoked.
 
         """
-        main.logger.info('Creating a new channel')
+        logger.info('Creating a new channel')
         cls.instance._connection.channel(on_open_callback=cls.instance.on_channel_open)
 
     def on_channel_open(cls, channel):
@@ -136,7 +191,7 @@ class PublisherQueue:
         :param pika.channel.Channel channel: The channel object
 
         """
-        main.logger.info('Channel opened')
+        logger.info('Channel opened')
         cls.instance._channel = channel
         cls.instance.add_on_channel_close_callback()
         cls.instance.setup_exchange(EXCHANGE)
@@ -146,7 +201,7 @@ class PublisherQueue:
         RabbitMQ unexpectedly closes the channel.
 
         """
-        main.logger.info('Adding channel close callback')
+        logger.info('Adding channel close callback')
         cls.instance._channel.add_on_close_callback(cls.instance.on_channel_closed)
 
     def on_channel_closed(cls, channel, reason):
@@ -160,8 +215,9 @@ class PublisherQueue:
         :param Exception reason: why the channel was closed
 
         """
-        main.logger.warning('Channel %i was closed: %s', channel, reason)
+        logger.warning('Channel %i was closed: %s', channel, reason)
         cls.instance._channel = None
+        cls.instance._publishing = False
         if not cls.instance._stopping:
             cls.instance._connection.close()
 
@@ -173,7 +229,7 @@ class PublisherQueue:
         :param str|unicode exchange_name: The name of the exchange to declare
 
         """
-        main.logger.info('Declaring exchange %s', exchange_name)
+        logger.info('Declaring exchange %s', exchange_name)
         # Note: using functools.partial is not required, it is demonstrating
         # how arbitrary data can be passed to the callback when it is called
         cb = functools.partial(
@@ -191,7 +247,7 @@ class PublisherQueue:
         :param str|unicode userdata: Extra user data (exchange name)
 
         """
-        main.logger.info('Exchange declared: %s', userdata)
+        logger.info('Exchange declared: %s', userdata)
         cls.instance.setup_queue(QUEUE)
 
     def setup_queue(cls, queue_name):
@@ -202,7 +258,7 @@ class PublisherQueue:
         :param str|unicode queue_name: The name of the queue to declare.
 
         """
-        main.logger.info('Declaring queue %s', queue_name)
+        logger.info('Declaring queue %s', queue_name)
         cls.instance._channel.queue_declare(
             queue=queue_name, callback=cls.instance.on_queue_declareok
         )
@@ -217,7 +273,7 @@ class PublisherQueue:
         :param pika.frame.Method method_frame: The Queue.DeclareOk frame
 
         """
-        main.logger.info('Binding %s to %s with %s', EXCHANGE, QUEUE, ROUTING_KEY)
+        logger.info('Binding %s to %s with %s', EXCHANGE, QUEUE, ROUTING_KEY)
         cls.instance._channel.queue_bind(
             QUEUE, EXCHANGE, routing_key=ROUTING_KEY, callback=cls.instance.on_bindok
         )
@@ -226,7 +282,7 @@ class PublisherQueue:
         """This method is invoked by pika when it receives the Queue.BindOk
         response from RabbitMQ. Since we know we're now setup and bound, it's
         time to start publishing."""
-        main.logger.info('Queue bound')
+        logger.info('Queue bound')
         cls.instance.start_publishing()
 
     def start_publishing(cls):
@@ -234,8 +290,17 @@ class PublisherQueue:
         first message to be sent to RabbitMQ
 
         """
-        main.logger.info('Issuing consumer related RPC commands')
+        logger.info('Issuing consumer related RPC commands')
         cls.instance.enable_delivery_confirmations()
+        cls.instance._publishing = True
+        cls.instance.every(
+            cls.instance._confirm_timeout / 2, cls.instance.check_timeouts
+        )
+        if cls.instance._aggregator is not None:
+            cls.instance.every(
+                cls.instance._aggregation_interval, cls.instance.publish_aggregates
+            )
+        cls.instance.publish_outgoing()
 
     def enable_delivery_confirmations(cls):
         """Send the Confirm.Select RPC method to RabbitMQ to enable delivery
@@ -248,7 +313,7 @@ class PublisherQueue:
         is confirming or rejecting.
 
         """
-        main.logger.info('Issuing Confirm.Select RPC command')
+        logger.info('Issuing Confirm.Select RPC command')
         cls.instance._channel.confirm_delivery(cls.instance.on_delivery_confirmation)
 
     def on_delivery_confirmation(cls, method_frame):
@@ -268,31 +333,32 @@ class PublisherQueue:
         ack_multiple = method_frame.method.multiple
         delivery_tag = method_frame.method.delivery_tag
 
-        main.logger.info(
+        logger.info(
             'Received %s for delivery tag: %i (multiple: %s)',
             confirmation_type,
             delivery_tag,
             ack_multiple,
         )
 
+        deliveries = cls.instance._deliveries
+        if ack_multiple:
+            # tags are in order, so the confirmed ones are the first ones
+            confirmed = []
+            while deliveries and next(iter(deliveries)) <= delivery_tag:
+                confirmed.append(deliveries.popitem(last=False)[1])
+        else:
+            confirmed = (
+                [deliveries.pop(delivery_tag)] if delivery_tag in deliveries else []
+            )
+
         if confirmation_type == 'ack':
-            cls.instance._acked += 1
+            cls.instance._acked += len(confirmed)
         elif confirmation_type == 'nack':
-            cls.instance._nacked += 1
-
-        del cls.instance._deliveries[delivery_tag]
-
-        if ack_multiple:
-            for tmp_tag in list(cls.instance._deliveries.keys()):
-                if tmp_tag <= delivery_tag:
-                    cls.instance._acked += 1
-                    del cls.instance._deliveries[tmp_tag]
-        """
-        NOTE: at some point you would check cls.instance._deliveries for stale
-        entries and decide to attempt re-delivery
-        """
+            cls.instance._nacked += len(confirmed)
+            cls.instance.republish(confirmed, "nack")
+        cls.instance.publish_outgoing()
 
-        main.logger.info(
+        logger.info(
             'Published %i messages, %i have yet to be confirmed, '
             '%i were acked and %i were nacked',
             cls.instance._message_number,
@@ -301,23 +367,112 @@ class PublisherQueue:
             cls.instance._nacked,
         )
 
-    def publish_message(cls, message):
-        if cls.instance._channel is None or not cls.instance._channel.is_open:
-            return  # !TODO
+    def is_ready(cls):
+        """Whether the channel is open to publish, and the messages already
+        given were published"""
 
-        cls.instance._channel.basic_publish(
-            exchange=EXCHANGE, routing_key=ROUTING_KEY, body=json.dumps(message)
+        return (
+            cls.instance._publishing
+            and cls.instance._channel is not None
+            and cls.instance._channel.is_open
+            and not cls.instance._outgoing
         )
 
-        cls.instance._message_number += 1
-        cls.instance._deliveries[cls.instance._message_number] = True
-        main.logger.info('Publishing message %s', message)
+    def publish_message(cls, message):
+        cls.instance.publish_messages([message])
+
+    def publish_messages(cls, messages):
+        """Publish the messages, as many AMQP messages as the encoder makes
+        of them (one each, or batches of many). When aggregating, only the
+        ones of the raw actions."""
+
+        if cls.instance._aggregator is not None:
+            add = cls.instance._aggregator.add
+            messages = [message for message in messages if not add(message)]
+        for body, properties in cls.instance._encoder.encode(messages):
+            cls.instance._outgoing.append((body, pika.BasicProperties(**properties)))
+        logger.info('Publishing %i metrics messages', len(messages))
+        cls.instance.publish_outgoing()
+
+    def publish_outgoing(cls):
+        """Publish the messages waiting while the window of messages not
+        confirmed has room"""
+
+        if not (cls.instance._publishing and cls.instance._channel is not None):
+            return
+        outgoing = cls.instance._outgoing
+        deliveries = cls.instance._deliveries
+        while outgoing and len(deliveries) < cls.instance._max_in_flight:
+            body, properties = outgoing.popleft()
+            cls.instance._channel.basic_publish(
+                exchange=EXCHANGE,
+                routing_key=ROUTING_KEY,
+                body=body,
+                properties=properties,
+            )
+            cls.instance._message_number += 1
+            deliveries[cls.instance._message_number] = (
+                body,
+                properties,
+                time.monotonic(),
+            )
+
+    def republish(cls, deliveries, reason: str):
+        """Put the (body, properties, sent at) of "deliveries" first to be
+        published again, in the same order"""
+
+        if deliveries:
+            PUBLISHER_REPUBLISHED.inc(reason, amount=len(deliveries))
+            cls.instance._outgoing.extendleft(
+                (body, properties) for body, properties, _ in reversed(deliveries)
+            )
+
+    def check_timeouts(cls, now: float = None):
+        """Publish again the messages not confirmed after "confirm_timeout"
+        (the oldest are the first ones)"""
+
+        now = now if now is not None else time.monotonic()
+        deliveries = cls.instance._deliveries
+        expired = []
+        while deliveries:
+            tag, delivery = next(iter(deliveries.items()))
+            if now - delivery[2] < cls.instance._confirm_timeout:
+                break
+            expired.append(deliveries.pop(tag))
+        cls.instance.republish(expired, "timeout")
+        cls.instance.publish_outgoing()
+
+    def every(cls, interval: float, callback):
+        """Call "callback" every "interval" seconds while connected"""
+
+        def call():
+            callback()
+            cls.instance.every(interval, callback)
+
+        timer = cls.instance._connection.ioloop.call_later(interval, call)
+        cls.instance._timers[callback.__name__] = timer
+
+    def publish_aggregates(cls):
+        """Publish the counts of the messages aggregated since the last time"""
+
+        aggregates = cls.instance._aggregator.flush()
+        if not aggregates:
+            return
+        encoded = cls.instance._encoder.encode_aggregates(aggregates)
+        cls.instance._outgoing.extend(
+            (body, pika.BasicProperties(**properties)) for body, properties in encoded
+        )
+        cls.instance.publish_outgoing()
 
     def run(cls):
         """Run the example code by connecting and then starting the IOLoop."""
+        cls.instance._stopping = False
         while not cls.instance._stopping:
             cls.instance._connection = None
-            cls.instance._deliveries = {}
+            # the tags are of the channel: the messages not confirmed by the
+            # last one are published again by the next one
+            cls.instance.republish(list(cls.instance._deliveries.values()), "reconnect")
+            cls.instance._deliveries = OrderedDict()
             cls.instance._acked = 0
             cls.instance._nacked = 0
             cls.instance._message_number = 0
@@ -333,19 +488,50 @@ class PublisherQueue:
                 ):
                     cls.instance._connection.ioloop.run_forever()
 
-        main.logger.info('Stopped')
+        logger.info('Stopped')
 
-    def stop(cls):
+    def stop(cls, drain_timeout: float = 0):
         """Stop the example by closing the channel and connection. We
         set a flag here so that we stop scheduling new messages to be
         published. The IOLoop is started because this method is
         invoked by the Try/Catch below when KeyboardInterrupt is caught.
         Starting the IOLoop again will allow the publisher to cleanly
-        disconnect from RabbitMQ.
+        disconnect from RabbitMQ. Before closing, it waits up to
+        "drain_timeout" seconds for the messages given to be confirmed.
 
         """
-        main.logger.info('Stopping')
+        logger.info('Stopping')
+        if cls.instance._aggregator is not None and cls.instance._publishing:
+            cls.instance.publish_aggregates()
         cls.instance._stopping = True
+        cls.instance.drain(time.monotonic() + drain_timeout)
+
+    def drained(cls):
+        """Whether every message given was published and confirmed"""
+
+        return not cls.instance._outgoing and not cls.instance._deliveries
+
+    def drain(cls, deadline: float, interval: float = 0.05):
+        """Close the channel and the connection once every message was
+        published and confirmed, or at "deadline" (or when the channel is
+        closed, as nothing else would be confirmed)"""
+
+        if (
+            cls.instance._publishing
+            and not cls.instance.drained()
+            and time.monotonic() < deadline
+        ):
+            timer = cls.instance._connection.ioloop.call_later(
+                interval, cls.instance.drain, deadline, interval
+            )
+            cls.instance._timers["drain"] = timer
+            return
+        if not cls.instance.drained():
+            logger.warning(
+                'Closing with %i messages not published and %i not confirmed',
+                len(cls.instance._outgoing),
+                len(cls.instance._deliveries),
+            )
         cls.instance.close_channel()
         cls.instance.close_connection()
 
@@ -355,19 +541,43 @@ class PublisherQueue:
 
         """
         if cls.instance._channel is not None:
-            main.logger.info('Closing the channel')
+            logger.info('Closing the channel')
             cls.instance._channel.close()
 
     def close_connection(cls):
         """This method closes the connection to RabbitMQ."""
         if cls.instance._connection is not None:
-            main.logger.info('Closing connection')
+            logger.info('Closing connection')
             cls.instance._connection.close()
 
 
 def getPublisherQueue() -> PublisherQueue:
-    return PublisherQueue(app_settings.CLOUDAMQP_URL)
-
-
-async def runPublisherManager():
-    getPublisherQueue().run()
+    return PublisherQueue(
+        app_settings.CLOUDAMQP_URL,
+        MessageEncoder(
+            app_settings.PUBLISHER_ENCODING,
+            app_settings.PUBLISHER_COMPRESSION,
+            int(app_settings.PUBLISHER_BATCH_SIZE),
+        ),
+        max_in_flight=int(app_settings.PUBLISHER_MAX_IN_FLIGHT),
+        confirm_timeout=float(app_settings.PUBLISHER_CONFIRM_TIMEOUT_SECONDS),
+        aggregator=(
+            Aggregator(parse_actions(app_settings.PUBLISHER_RAW_ACTIONS))
+            if app_settings.PUBLISHER_AGGREGATION
+            else None
+        ),
+        aggregation_interval=float(app_settings.PUBLISHER_AGGREGATION_SECONDS),
+    )
+
+
+def publisher_queue_depth():
+    """Messages published and not yet confirmed by RabbitMQ"""
+
+    return {(): len(PublisherQueue.instance._deliveries or {})}
+
+
+registry.gauge(
+    "publisher_unconfirmed_messages",
+    "Metrics messages published and waiting for the confirmation of RabbitMQ",
+    callback=publisher_queue_depth,
+)
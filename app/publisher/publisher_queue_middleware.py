@@ -1,11 +1,11 @@
 from fastapi import Request, Response, status
 from starlette.middleware.base import BaseHTTPMiddleware
 import app.main as main
-from app.publisher.message_queue import MessageQueueFrom
-from app.publisher.publisher_queue import getPublisherQueue
+from app.publisher.message_queue import MessageQueueFrom, MessagesQueueFrom
+from app.publisher.publisher_process import getPublisher
 import datetime
 
-publisher = getPublisherQueue()
+publisher = getPublisher()
 
 
 class PublisherQueueEventMiddleware(BaseHTTPMiddleware):
@@ -16,14 +16,13 @@ class PublisherQueueEventMiddleware(BaseHTTPMiddleware):
             response = await call_next(request)
             end_timestamp = datetime.datetime.now().timestamp()
             if request.state.metrics_allowed:
-                publisher.publish_message(
-                    MessageQueueFrom(
-                        request,
-                        response,
-                        start_timestamp,
-                        end_timestamp - start_timestamp,
-                    )
-                )
+                for message in MessagesQueueFrom(
+                    request,
+                    response,
+                    start_timestamp,
+                    end_timestamp - start_timestamp,
+                ):
+                    publisher.publish_message(message)
             return response
         except AttributeError:  # 'State' object has no attribute 'metrics_allowed'
             return response
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import queue
+import threading
+from app.config.config import get_settings
+from app.monitoring.metrics import registry
+from app.publisher.publisher_queue import getPublisherQueue
+
+# The AMQP connection runs on its own thread and event loop, so connecting,
+# reconnecting and the confirmations of RabbitMQ never run on the loop of the
+# requests. The requests only put their messages in a queue.SimpleQueue, and
+# the publisher thread takes them out every "flush_interval" and publishes
+# them all at once.
+
+app_settings = get_settings()
+logger = logging.getLogger('app')
+
+PUBLISHER_DROPPED_PENDING = registry.counter(
+    "publisher_dropped_pending_messages_total",
+    "Metrics messages dropped because too many were waiting for the publisher",
+)
+
+
+class PublisherThread:
+    def __init__(
+        self,
+        publisher=None,
+        flush_interval: float = 0.05,
+        max_pending: int = 10000,
+    ):
+        self.publisher = publisher
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = queue.SimpleQueue()
+        self._loop = None
+        self._thread = None
+
+    def publish_message(self, message):
+        """Called from the requests: never blocks nor touches the connection.
+        "max_pending" is a soft bound: the size is checked before the put
+        without a lock, so requests of many threads at once can go a few
+        messages over it, which is tolerated to never make them wait."""
+
+        if self.pending.qsize() >= self.max_pending:
+            PUBLISHER_DROPPED_PENDING.inc()
+            return
+        self.pending.put(message)
+
+    def publish_pending(self):
+        """Publish the messages waiting, on the publisher thread. While the
+        channel is not open they keep waiting (up to "max_pending")."""
+
+        if not self.publisher.is_ready():
+            return
+        messages = []
+        while True:
+            try:
+                messages.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if messages:
+            self.publisher.publish_messages(messages)
+
+    def flush(self):
+        self.publish_pending()
+        self._loop.call_later(self.flush_interval, self.flush)
+
+    def run(self):
+        if self.publisher is None:
+            # built here, so importing the app does not build it
+            self.publisher = getPublisherQueue()
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self.publisher.use_ioloop(self._loop)
+        self._loop.call_soon(self.flush)
+        try:
+            self.publisher.run()
+        except Exception as e:
+            logger.error(f'Publisher stopped: {e}')
+        finally:
+            self._loop.close()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, name="publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5, drain_timeout: float = 0):
+        """Publish the messages waiting, wait up to "drain_timeout" seconds
+        for them to be confirmed, and up to "timeout" more to close"""
+
+        if not (self._thread and self._thread.is_alive()):
+            return
+        self._loop.call_soon_threadsafe(self._stop_publisher, drain_timeout)
+        self._thread.join(drain_timeout + timeout)
+
+    def _stop_publisher(self, drain_timeout: float = 0):
+        self.publish_pending()
+        try:
+            self.publisher.stop(drain_timeout)
+        except Exception as e:  # not connected
+            logger.warning(f'Publisher stopped while connecting: {e}')
+            self._loop.stop()
+
+
+publisher_thread = None
+
+
+def getPublisherThread() -> PublisherThread:
+    global publisher_thread
+    if publisher_thread is None:
+        publisher_thread = PublisherThread(
+            flush_interval=int(app_settings.PUBLISHER_FLUSH_INTERVAL_MS) / 1000,
+            max_pending=int(app_settings.PUBLISHER_MAX_PENDING),
+        )
+    return publisher_thread
+
+
+def publisher_pending():
+    return {(): publisher_thread.pending.qsize() if publisher_thread else 0}
+
+
+registry.gauge(
+    "publisher_pending_messages",
+    "Metrics messages of the requests waiting for the publisher thread",
+    callback=publisher_pending,
+)
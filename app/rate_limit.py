@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+import jwt
+from abc import ABC, abstractmethod
+from starlette.responses import JSONResponse
+from app.admission import route_class_of, route_template
+from app.monitoring.metrics import registry
+
+# Rate limiting by token buckets, per user (the "id" of the JWT) and per IP,
+# for groups of routes (the route classes of the admission control). Each key
+# has a bucket of "burst" tokens that refills at "rate" tokens per second, and
+# each request takes one. The check is a dict lookup and some arithmetic.
+
+RATE_LIMITED = registry.counter(
+    "rate_limited_total",
+    "Requests rejected with 429 by route group and key (user or ip)",
+    ("route_group", "key"),
+)
+
+
+def parse_rate_limits(limits: str):
+    """Parse "athlete_states=user:0.2:5,ip:1:20;writes=user:2:20" into
+    {route group: {key type: (rate per second, burst)}}"""
+
+    parsed = {}
+    for group in limits.split(";"):
+        if not group.strip():
+            continue
+        name, rules = group.strip().split("=")
+        parsed[name] = {}
+        for rule in rules.split(","):
+            key, rate, burst = rule.strip().split(":")
+            if float(rate) <= 0 or float(burst) < 1:
+                raise ValueError(f'Invalid rate limit "{rule.strip()}" of {name}')
+            parsed[name][key] = (float(rate), float(burst))
+    return parsed
+
+
+class BucketStore(ABC):
+    """Where the buckets are kept. The in-memory store limits each worker
+    on its own; a shared backend (e.g. Redis with a script doing the same
+    refill and take) would limit across workers with the same interface."""
+
+    @abstractmethod
+    def take_all(self, buckets: list, now: float):
+        """Take a token from each of "buckets", a list of (key, rate, burst),
+        only if all of them have one, so a request rejected by one bucket does
+        not spend the tokens of the others. Returns the seconds until each
+        bucket has a token: all 0 if they were taken"""
+
+    def take(self, key: str, rate: float, burst: float, now: float):
+        """Take a token from the bucket of "key". Returns 0 if it was taken,
+        or the seconds until there is a token"""
+
+        return self.take_all([(key, rate, burst)], now)[0]
+
+    @abstractmethod
+    def evict(self, now: float):
+        """Remove the buckets that would be full again"""
+
+
+class MemoryBucketStore(BucketStore):
+    """Buckets as {key: (tokens, last update, seconds to refill)}. A bucket
+    that would be full again is the same as no bucket, so those are evicted
+    every "evict_seconds" to keep the dict bounded by the active keys."""
+
+    def __init__(self, evict_seconds: float = 60):
+        self.evict_seconds = evict_seconds
+        self.buckets = {}
+        self._lock = threading.Lock()
+        self._next_eviction = time.monotonic() + evict_seconds
+
+    def take_all(self, buckets, now):
+        with self._lock:
+            refilled = []
+            for key, rate, burst in buckets:
+                tokens, last, _ = self.buckets.get(key, (burst, now, 0))
+                refilled.append(min(burst, tokens + (now - last) * rate))
+            waiting = [
+                0 if tokens >= 1 else (1 - tokens) / rate
+                for tokens, (_, rate, _) in zip(refilled, buckets)
+            ]
+            taken = not any(waiting)
+            for tokens, (key, rate, burst) in zip(refilled, buckets):
+                if taken:
+                    tokens -= 1
+                self.buckets[key] = (tokens, now, (burst - tokens) / rate)
+        if now >= self._next_eviction:
+            self.evict(now)
+        return waiting
+
+    def evict(self, now):
+        with self._lock:
+            self._next_eviction = now + self.evict_seconds
+            idle = [
+                key
+                for key, (_, last, refill) in self.buckets.items()
+                if now - last >= refill
+            ]
+            for key in idle:
+                del self.buckets[key]
+        return len(idle)
+
+
+def client_ip(scope):
+    """Address of the client. X-Forwarded-For is not read here: its first
+    entries are sent by the client itself. Behind the router of the platform,
+    uvicorn (proxy_headers with FORWARDED_ALLOW_IPS) sets the client of the
+    scope to the address the router appended."""
+
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def user_id(scope, secret: str, algorithm: str):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                return None
+            try:
+                return str(jwt.decode(token, secret, algorithms=algorithm)["id"])
+            except Exception:
+                return None
+    return None
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        limits: dict,
+        secret: str,
+        algorithm: str,
+        store: BucketStore = None,
+    ):
+        self.app = app
+        self.limits = limits
+        self.secret = secret
+        self.algorithm = algorithm
+        self.store = store or MemoryBucketStore()
+
+    def check(self, scope, group: str, rules: dict):
+        """Seconds to wait if any bucket of the request is empty, else 0"""
+
+        key_types, buckets = [], []
+        for key_type, (rate, burst) in rules.items():
+            if key_type == "user":
+                key = user_id(scope, self.secret, self.algorithm)
+            else:
+                key = client_ip(scope)
+            if key is None:
+                continue
+            key_types.append(key_type)
+            buckets.append((f"{group}:{key_type}:{key}", rate, burst))
+        if not buckets:
+            return 0
+
+        waiting = self.store.take_all(buckets, time.monotonic())
+        for key_type, seconds in zip(key_types, waiting):
+            if seconds:
+                RATE_LIMITED.inc(group, key_type)
+        return max(waiting)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        group = route_class_of(scope["method"], route_template(scope))
+        rules = self.limits.get(group)
+        if rules:
+            waiting = self.check(scope, group, rules)
+            if waiting:
+                response = JSONResponse(
+                    status_code=429,
+                    content=f'Too many requests of {group}, retry later',
+                    headers={"Retry-After": str(math.ceil(waiting))},
+                )
+                return await response(scope, receive, send)
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import uvicorn
+from app.config.config import Settings, get_settings
+from app.config.log_config import logconfig
+from app.publisher.publisher_process import runPublisherProcess
+
+# Production entry: "python -m app.server". Runs one uvicorn worker process
+# per CPU (or WEB_CONCURRENCY). Each worker imports the app on its own, so it
+# has its own pools (MongoClient and httpx clients, created at startup), and
+# it warms up before listening. On SIGTERM uvicorn stops accepting, waits for
+# the requests in process to finish and then runs the shutdown of the app.
+# With PUBLISHER_MODE=socket one more process publishes the metrics messages
+# of all the workers, so there is a single connection to RabbitMQ.
+
+
+def cpu_count():
+    """CPUs this process can run on (the ones of the container or cgroup
+    affinity, not all the ones of the host when available)"""
+
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def workers_count(app_settings: Settings):
+    configured = int(app_settings.WEB_CONCURRENCY)
+    return configured if configured > 0 else cpu_count()
+
+
+def proxy_options(app_settings: Settings):
+    """Read X-Forwarded-For only from the routers in FORWARDED_ALLOW_IPS (the
+    client is then the last address they appended). Off when not set."""
+
+    allowed = app_settings.FORWARDED_ALLOW_IPS.strip()
+    if not allowed:
+        return {"proxy_headers": False}
+    return {"proxy_headers": True, "forwarded_allow_ips": allowed}
+
+
+def main():
+    app_settings = get_settings()
+    publisher = None
+    if app_settings.PUBLISHER_MODE == "socket":
+        publisher = multiprocessing.Process(
+            target=runPublisherProcess,
+            args=(app_settings.PUBLISHER_SOCKET,),
+            name="publisher",
+            daemon=True,
+        )
+        publisher.start()
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=int(app_settings.PORT),
+            workers=workers_count(app_settings),
+            log_config=logconfig,
+            **proxy_options(app_settings),
+        )
+    finally:
+        if publisher:
+            # after the workers, so the messages of their last requests are sent
+            publisher.terminate()
+            publisher.join(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,191 @@
+import asyncio
+import time
 import httpx
 from fastapi import HTTPException, status
-from app.config.config import Settings
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.config.config import get_settings
+from app.hedging import HedgeBudget, LatencyWindow, hedged
+from app.monitoring.metrics import UPSTREAM_ERRORS, UPSTREAM_REQUEST_DURATION
+from app.monitoring.tracing import tracer
 import app.main as main
 
-app_settings = Settings()
+app_settings = get_settings()
+
+breaker_settings = dict(
+    failure_rate=float(app_settings.BREAKER_FAILURE_RATE),
+    window=int(app_settings.BREAKER_WINDOW),
+    minimum_calls=int(app_settings.BREAKER_MINIMUM_CALLS),
+    open_seconds=float(app_settings.BREAKER_OPEN_SECONDS),
+    register=True,
+)
+users_breaker = CircuitBreaker("users", **breaker_settings)
+goals_breaker = CircuitBreaker("goals", **breaker_settings)
+
+SERVICE_NAMES = {"users": "User service", "goals": "Goals service"}
+
+# clients of each service kept open by the worker (opened at startup), so
+# the connections and the SSL context are reused between requests
+http_clients = {}
+
+users_latencies = LatencyWindow()
+users_hedge_budget = HedgeBudget(ratio=float(app_settings.USER_HEDGING_BUDGET))
+
+
+def observe_upstream(
+    service: str, method: str, start: float, response=None, latencies=None
+):
+    """Record latency of a request to another service. Requests that raised
+    (response is None) or answered with a server error are counted as errors.
+    The latency of the successful ones is also added to "latencies", if
+    given."""
+
+    latency = time.perf_counter() - start
+    UPSTREAM_REQUEST_DURATION.observe(latency, service, method)
+    if response is None or response.status_code >= 500:
+        UPSTREAM_ERRORS.inc(service, method)
+    elif latencies is not None:
+        latencies.observe(latency)
+
+
+async def open_http_clients():
+    limits = httpx.Limits(
+        max_connections=int(app_settings.HTTP_MAX_CONNECTIONS),
+        max_keepalive_connections=int(app_settings.HTTP_MAX_KEEPALIVE_CONNECTIONS),
+    )
+    for service in SERVICE_NAMES:
+        http_clients[service] = httpx.AsyncClient(limits=limits)
+
+
+async def close_http_clients():
+    for service in list(http_clients):
+        await http_clients.pop(service).aclose()
+
+
+async def send_request(service, method, url, timeout, **kwargs):
+    """With the client of the service if it was opened, or a new one"""
+
+    client = http_clients.get(service)
+    if client is not None:
+        return await getattr(client, method.lower())(url, timeout=timeout, **kwargs)
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        return await getattr(client, method.lower())(url, **kwargs)
+
+
+def trace_status(span, response):
+    if span is not None:
+        span.attributes["status_code"] = response.status_code
+
+
+async def request_upstream(
+    service, breaker, method, url, path, timeout, headers=None, latencies=None, **kwargs
+):
+    """Send a request to another service through its circuit breaker, with
+    a short timeout. Fails fast with 503 while the circuit is open, and with
+    500 when the service cannot be accessed. "latencies" gets the latency of
+    the successful answers (of the requests that can be hedged)."""
+
+    name = SERVICE_NAMES[service]
+    if not breaker.allow():
+        main.logger.warning(f'{name} circuit is open, request rejected')
+        raise CircuitOpenError(service, f'{name} is unavailable')
+
+    start = time.perf_counter()
+    try:
+        with tracer.span(f"{service} {method}", path=path) as span:
+            response = await send_request(
+                service,
+                method,
+                f"{url}{path}",
+                timeout,
+                headers=tracer.inject(headers),
+                **kwargs,
+            )
+            trace_status(span, response)
+    except asyncio.CancelledError:
+        breaker.release()
+        raise
+    except Exception:
+        observe_upstream(service, method, start)
+        breaker.record(False)
+        main.logger.error(f'{name} cannot be accessed')
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f'{name} cannot be accessed',
+        )
+
+    observe_upstream(service, method, start, response, latencies)
+    breaker.record(response.status_code < 500)
+    return response
 
 
 class ServiceUsers:
     @staticmethod
     async def get(path):
+        """Lookup of a user ("/users/{id}"). Only these lookups are hedged, and
+        only their latencies decide when to hedge them."""
+
+        timeout = float(app_settings.USER_SERVICE_TIMEOUT_SECONDS)
+        latencies = users_latencies
+
+        def attempt():
+            return request_upstream(
+                "users",
+                users_breaker,
+                "GET",
+                app_settings.USER_SERVICE_URL,
+                path,
+                timeout,
+                latencies=latencies,
+            )
+
+        if not app_settings.USER_HEDGING_ENABLED:
+            return await attempt()
+        # the lookups are idempotent, so a slow one can be sent again
+        return await hedged("users", attempt, latencies, users_hedge_budget, timeout)
+
+    @staticmethod
+    async def get_all():
+        """All the users with their favorite trainings, with a longer timeout
+        than the lookups of a user. None when they could not be obtained (the
+        circuit is open or the service failed), so the callers can degrade."""
+
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{app_settings.USER_SERVICE_URL}{path}")
-                return response
-        except Exception:
-            main.logger.error('User service cannot be accessed')
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='User service cannot be accessed',
+            return await request_upstream(
+                "users",
+                users_breaker,
+                "GET",
+                app_settings.USER_SERVICE_URL,
+                "/users/?map_trainings=false",
+                float(app_settings.USER_LIST_TIMEOUT_SECONDS),
             )
+        except HTTPException as e:
+            main.logger.warning(f'Users not obtained: {e.detail}')
+            return None
 
 
 class ServiceGoals:
     @staticmethod
     async def post(path, json, headers):
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{app_settings.GOALS_SERVICE_URL}{path}",
-                    json=json,
-                    headers=headers,
-                )
-                return response
-        except Exception:
-            main.logger.error('Goals service cannot be accessed')
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='Goals service cannot be accessed',
-            )
+        return await request_upstream(
+            "goals",
+            goals_breaker,
+            "POST",
+            app_settings.GOALS_SERVICE_URL,
+            path,
+            float(app_settings.GOALS_SERVICE_TIMEOUT_SECONDS),
+            headers=headers,
+            json=json,
+        )
 
     @staticmethod
     async def patch(path, json, headers):
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.patch(
-                    f"{app_settings.GOALS_SERVICE_URL}{path}",
-                    json=json,
-                    headers=headers,
-                )
-                return response
-        except Exception:
-            main.logger.error('Goals service cannot be accessed')
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='Goals service cannot be accessed',
-            )
+        return await request_upstream(
+            "goals",
+            goals_breaker,
+            "PATCH",
+            app_settings.GOALS_SERVICE_URL,
+            path,
+            float(app_settings.GOALS_SERVICE_TIMEOUT_SECONDS),
+            headers=headers,
+            json=json,
+        )
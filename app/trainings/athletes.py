@@ -1,12 +1,18 @@
 import asyncio
 import logging
+from datetime import datetime
+from typing import List, Optional
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pymongo import ReturnDocument
 from starlette import status
 from app.services import ServiceGoals
 from app.trainings.models import (
+    MapUsers,
     StateGoal,
     StateTraining,
+    StoredStateTraining,
+    TrainingResponse,
     UserRoles,
 )
 from app.trainings.object_id import ObjectIdPydantic
@@ -31,7 +37,7 @@ def is_athlete(request: Request):
 
 def exist_training(training_id: ObjectIdPydantic, request: Request) -> ObjectIdPydantic:
     trainings = request.app.database["trainings"]
-    training = trainings.find_one({"_id": training_id})
+    training = trainings.find_one({"_id": training_id}, {"_id": 1})
     if not training:
         logger.info(f"Training {training_id} does not exist")
         raise HTTPException(
@@ -93,6 +99,67 @@ async def set_state(id_goal, headers, StateGoal):
     return {"status_code": result.status_code, "body": result.json()}
 
 
+@router_athletes.get(
+    '/',
+    response_model=List[TrainingResponse],
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(is_athlete)],
+    summary="Get the trainings started by me. Include state query param to filter",
+)
+async def get_my_trainings(
+    request: Request,
+    state: Optional[StoredStateTraining] = None,
+    data_access_token=Depends(get_all_data_of_access_token),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(128, ge=1, le=1024),
+    map_users: Optional[MapUsers] = None,
+    with_feedback: Optional[bool] = False,
+):
+    """Two indexed queries: the states of the athlete, by (user_id, _id) or
+    (user_id, state, _id), and the trainings of those states, by _id.
+    Comments and scores are not requested unless "with_feedback" is true."""
+
+    id_user = ObjectId(data_access_token["id"])
+    athletes_states = request.app.database["athletes_states"]
+    trainings = request.app.database["trainings"]
+
+    query = {"user_id": id_user}
+    if state:
+        query["state"] = state
+    states = list(
+        athletes_states.find(query, {"training_id": 1, "state": 1})
+        .sort("_id", -1)
+        .skip(offset)
+        .limit(limit)
+    )
+
+    projection = None if with_feedback else {"comments": 0, "scores": 0}
+    trainings_found = {
+        training["_id"]: training
+        for training in trainings.find(
+            {"_id": {"$in": [result["training_id"] for result in states]}},
+            projection,
+        )
+    }
+
+    trainings_list = []
+    for result in states:
+        if training := trainings_found.get(result["training_id"]):
+            training["state"] = result["state"]
+            trainings_list.append(TrainingResponse.from_mongo(training))
+
+    if len(trainings_list) == 0:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content=f'Trainings not found for athlete {id_user} with state {state}',
+        )
+
+    await TrainingResponse.map_users(trainings_list, map_users)
+
+    logger.info(f'Return list of {len(trainings_list)} trainings of athlete {id_user}')
+    return trainings_list
+
+
 @router_athletes.patch(
     '/{training_id}/start',
     status_code=status.HTTP_200_OK,
@@ -100,16 +167,25 @@ async def set_state(id_goal, headers, StateGoal):
 )
 async def start_training(
     request: Request,
-    training_id: ObjectIdPydantic = Depends(exist_training),
+    training_id: ObjectIdPydantic,
     data_access_token=Depends(get_all_data_of_access_token),
 ):
     id_user = data_access_token["id"]
     trainings = request.app.database["trainings"]
     athletes_states = request.app.database["athletes_states"]
-    training = trainings.find_one({"_id": training_id})
+
+    # The existence check and the goals recipe are obtained in the same read
+    training = trainings.find_one({"_id": training_id}, {"goals": 1})
+    if not training:
+        logger.info(f"Training {training_id} does not exist")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Training {training_id} does not exist",
+        )
 
     result_find = athletes_states.find_one(
-        {"user_id": ObjectId(id_user), "training_id": training_id}
+        {"user_id": ObjectId(id_user), "training_id": training_id},
+        {"state": 1, "goals": 1},
     )
     if result_find:
         state_saved = (
@@ -127,9 +203,20 @@ async def start_training(
                 + f" state for athlete {id_user}",
             )
         else:
+            # conditional on the state read, so concurrent starts can not
+            # both succeed
             result_update = athletes_states.update_one(
-                {"user_id": ObjectId(id_user), "training_id": training_id},
-                {"$set": {"state": StateTraining.INIT}},
+                {
+                    "user_id": ObjectId(id_user),
+                    "training_id": training_id,
+                    "state": state_saved,
+                },
+                {
+                    "$set": {
+                        "state": StateTraining.INIT,
+                        "date_start": datetime.utcnow(),
+                    }
+                },
             )
             if result_update.matched_count == 1:
                 headers = request.headers
@@ -188,6 +275,7 @@ async def start_training(
                         "user_id": ObjectId(id_user),
                         "training_id": training_id,
                         "state": StateTraining.INIT,
+                        "date_start": datetime.utcnow(),
                         "goals": [
                             ObjectId(goal["body"]["id"]) for goal in goals_responses
                         ],
@@ -219,10 +307,14 @@ async def start_training(
             )
 
 
-async def stop_an_training(request: Request, training_id: ObjectId, id_user: str):
-    athletes_states = request.app.database["athletes_states"]
+def find_state_not_transitioned(
+    athletes_states, training_id: ObjectId, id_user: str, state_target: str
+):
+    """Called when a conditional state transition did not match, to know why.
+    Returns the JSONResponse with the error to return to the athlete."""
+
     result_find = athletes_states.find_one(
-        {"user_id": ObjectId(id_user), "training_id": training_id}
+        {"user_id": ObjectId(id_user), "training_id": training_id}, {"state": 1}
     )
 
     if not result_find:
@@ -237,48 +329,61 @@ async def stop_an_training(request: Request, training_id: ObjectId, id_user: str
         if isinstance(result_find['state'], str)
         else StateTraining(str(result_find['state']))
     )
-    if (
-        state_saved == StateTraining.NOT_INIT
-        or state_saved == StateTraining.STOP
-        or state_saved == StateTraining.COMPLETE
-    ):
+    logger.info(
+        f"Training {training_id} as {state_saved} state for athlete {id_user},"
+        + f" could not be {state_target}"
+    )
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content=f"Training {training_id} as {state_saved}"
+        + f" state for athlete {id_user}",
+    )
+
+
+async def stop_an_training(request: Request, training_id: ObjectId, id_user: str):
+    athletes_states = request.app.database["athletes_states"]
+
+    # Only an INIT training can be stopped, so the state check and the
+    # update are done in a single atomic operation
+    result_find = athletes_states.find_one_and_update(
+        {
+            "user_id": ObjectId(id_user),
+            "training_id": training_id,
+            "state": StateTraining.INIT,
+        },
+        {"$set": {"state": StateTraining.STOP}},
+        projection={"state": 1, "goals": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+
+    if not result_find:
+        return find_state_not_transitioned(
+            athletes_states, training_id, id_user, StateTraining.STOP
+        )
+
+    headers = request.headers
+    stop_responses = []
+    for id_goal in result_find["goals"]:
+        goal = asyncio.create_task(set_state(id_goal, headers, StateGoal.STOP))
+        stop_responses.append(goal)
+
+    stop_responses = await asyncio.gather(*stop_responses)
+
+    if all(goal["status_code"] == status.HTTP_200_OK for goal in stop_responses):
         logger.info(
-            f"Training {training_id} as {state_saved} state for athlete {id_user}"
+            f"Training {training_id} as STOP state for"
+            + f" athlete {id_user} successfully"
         )
         return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content=f"Training {training_id} as {state_saved}"
-            + f" state for athlete {id_user}",
+            status_code=status.HTTP_200_OK,
+            content=f"Training {training_id} as STOP"
+            + f" state for athlete {id_user} successfully",
         )
 
-    result_update = athletes_states.update_one(
+    athletes_states.update_one(
         {"user_id": ObjectId(id_user), "training_id": training_id},
-        {"$set": {"state": StateTraining.STOP}},
+        {"$set": {"state": result_find["state"]}},
     )
-    if result_update.matched_count == 1:
-        headers = request.headers
-        stop_responses = []
-        for id_goal in result_find["goals"]:
-            goal = asyncio.create_task(set_state(id_goal, headers, StateGoal.STOP))
-            stop_responses.append(goal)
-
-        stop_responses = await asyncio.gather(*stop_responses)
-
-        if all(goal["status_code"] == status.HTTP_200_OK for goal in stop_responses):
-            logger.info(
-                f"Training {training_id} as STOP state for"
-                + f" athlete {id_user} successfully"
-            )
-            return JSONResponse(
-                status_code=status.HTTP_200_OK,
-                content=f"Training {training_id} as STOP"
-                + f" state for athlete {id_user} successfully",
-            )
-        else:
-            athletes_states.update_one(
-                {"user_id": ObjectId(id_user), "training_id": training_id},
-                {"$set": {"state": state_saved}},
-            )
 
     logger.info(f"Training {training_id} could not be STOPPED for athlete {id_user}")
     return JSONResponse(
@@ -313,38 +418,15 @@ async def complete_training(
 ):
     id_user = data_access_token["id"]
     athletes_states = request.app.database["athletes_states"]
-    result_find = athletes_states.find_one(
-        {"user_id": ObjectId(id_user), "training_id": training_id}
-    )
-
-    if not result_find:
-        logger.info(f"Training {training_id} does not exist for athlete {id_user}")
-        return JSONResponse(
-            status_code=status.HTTP_404_NOT_FOUND,
-            content=f"Training {training_id} does not exist for athlete {id_user}",
-        )
-
-    state_saved = (
-        result_find['state']
-        if isinstance(result_find['state'], str)
-        else StateTraining(str(result_find['state']))
-    )
-    if (
-        state_saved == StateTraining.NOT_INIT
-        or state_saved == StateTraining.STOP
-        or state_saved == StateTraining.COMPLETE
-    ):
-        logger.info(
-            f"Training {training_id} as {state_saved}" + f" state for athlete {id_user}"
-        )
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content=f"Training {training_id} as {state_saved}"
-            + f" state for athlete {id_user}",
-        )
 
+    # Only an INIT training can be completed, so the state check and the
+    # update are done in a single atomic operation
     result_update = athletes_states.update_one(
-        {"user_id": ObjectId(id_user), "training_id": training_id},
+        {
+            "user_id": ObjectId(id_user),
+            "training_id": training_id,
+            "state": StateTraining.INIT,
+        },
         {"$set": {"state": StateTraining.COMPLETE}},
     )
     if result_update.matched_count == 1:
@@ -357,12 +439,7 @@ async def complete_training(
             content=f"Training {training_id} as COMPLETE"
             + f" state for athlete {id_user} successfully",
         )
-    else:
-        logger.info(
-            f"Training {training_id} could not be COMPLETED" + f" for athlete {id_user}"
-        )
-        return JSONResponse(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            content=f"Training {training_id} could not be"
-            + f" COMPLETED for athlete {id_user}",
-        )
+
+    return find_state_not_transitioned(
+        athletes_states, training_id, id_user, StateTraining.COMPLETE
+    )
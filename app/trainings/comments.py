@@ -1,7 +1,6 @@
 import logging
 from bson import ObjectId
 from fastapi import APIRouter, Depends, Request
-from passlib.context import CryptContext
 from starlette import status
 from app.trainings.models import (
     CommentRequest,
@@ -15,7 +14,6 @@ from app.trainings.trainings_crud import get_user_id
 
 logger = logging.getLogger('app')
 router_comments = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 @router_comments.post(
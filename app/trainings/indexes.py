@@ -0,0 +1,39 @@
+import logging
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger('app')
+
+# "my trainings" of an athlete, newest first, and filtered by state: the
+# equality fields and then the sort, so the sort is read from the index.
+ATHLETE_TRAININGS = [("user_id", ASCENDING), ("_id", DESCENDING)]
+ATHLETE_TRAININGS_BY_STATE = [
+    ("user_id", ASCENDING),
+    ("state", ASCENDING),
+    ("_id", DESCENDING),
+]
+
+# Indexes that the queries of the service need, by collection.
+INDEXES = {
+    "athletes_states": [
+        ATHLETE_TRAININGS,
+        ATHLETE_TRAININGS_BY_STATE,
+        # state of an athlete in a training
+        [("user_id", ASCENDING), ("training_id", ASCENDING)],
+        # athletes of a training (statistics, block of a training)
+        [("training_id", ASCENDING)],
+    ],
+    "trainings": [
+        # trainings created by a trainer
+        [("id_trainer", ASCENDING)],
+    ],
+}
+
+
+def ensure_indexes(database):
+    """Create the indexes if they do not exist yet. Creating an existing index
+    is a no-op in MongoDB, so this can run on every startup."""
+
+    for collection, indexes in INDEXES.items():
+        for keys in indexes:
+            database[collection].create_index(keys)
+    logger.info('Indexes of MongoDB ensured')
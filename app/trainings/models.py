@@ -1,10 +1,12 @@
 import asyncio
+from datetime import datetime
 from typing import Optional, Union
 from bson import ObjectId
 from fastapi import HTTPException, Query
 from pydantic import BaseConfig, BaseModel, Field
 from enum import Enum
-from app.services import ServiceUsers
+from app.circuit_breaker import CircuitOpenError
+from app.services import ServiceUsers, users_breaker
 from app.trainings.object_id import ObjectIdPydantic
 from app.trainings.user_small import UserResponseSmall
 import app.main as main
@@ -40,6 +42,14 @@ class StateTraining(str, Enum):
     YOU_ARE_NOT_ATHLETE = "YOU_ARE_NOT_ATHLETE"
 
 
+class StoredStateTraining(str, Enum):
+    """The states saved for a training started by an athlete"""
+
+    INIT = "INIT"
+    STOP = "STOP"
+    COMPLETE = "COMPLETE"
+
+
 class GoalOfTraining(BaseModel):
     title: str
     description: str
@@ -80,9 +90,14 @@ class ScoreRequest(BaseModel):
     qualification: int = Field(None, ge=1, le=5)
 
     def encode_json_with(self, id_user: ObjectId):
-        """Encode the json to be inserted in MongoDB"""
+        """Encode the json to be inserted in MongoDB. The date of the score is
+        used to compute the trending trainings"""
 
-        return {"id_user": id_user, "qualification": self.qualification}
+        return {
+            "id_user": id_user,
+            "qualification": self.qualification,
+            "date": datetime.utcnow(),
+        }
 
 
 class ScoreResponse(BaseModel):
@@ -191,6 +206,32 @@ class TrainingDatabase(BaseModel):
     blocked: bool = False
 
 
+class MapUsers(str, Enum):
+    """How the ids of the users are mapped to their data, in the query param
+    "map_users". Accepts the booleans that were accepted before."""
+
+    YES = "true"
+    NO = "false"
+    BEST_EFFORT = "best_effort"
+
+    @classmethod
+    def _missing_(cls, value):
+        value = str(value).lower()
+        if value in ("1", "yes", "on", "true"):
+            return cls.YES
+        if value in ("0", "no", "off", "false"):
+            return cls.NO
+        return None
+
+    @classmethod
+    def default(cls):
+        return cls(main.app_settings.MAP_USERS_DEFAULT)
+
+
+def unmapped_user(user: dict):
+    return {"id": user["id"], "unmapped": True}
+
+
 class TrainingResponse(BaseModel):
     id: ObjectIdPydantic = None
     trainer: Union[UserResponseSmall, dict]
@@ -209,9 +250,23 @@ class TrainingResponse(BaseModel):
         json_encoders = {ObjectId: lambda id: str(id)}  # convert ObjectId into str
 
     @staticmethod
-    async def map_users(trainings_list):
+    async def map_users(trainings_list, mode: MapUsers = None):
         """Map "users IDs" to the "users data" of each training in the list.
-        By example id_trainer, id_users of comments and id_users of scores."""
+        By example id_trainer, id_users of comments and id_users of scores.
+
+        In "best_effort" mode, the users that were not obtained before the
+        deadline (or whose request failed) are left unmapped, instead of
+        failing the whole list. The same happens while the circuit of the
+        user service is open."""
+
+        mode = MapUsers.default() if mode is None else mode
+        if mode == MapUsers.NO:
+            return
+
+        if users_breaker.is_open():
+            main.app.logger.warning('User service circuit is open, users not mapped')
+            TrainingResponse.convert_all_types_ids(trainings_list, {})
+            return
 
         users_tasks = TrainingResponse.prepare_user_tasks(trainings_list)
 
@@ -219,25 +274,87 @@ class TrainingResponse(BaseModel):
             f'Waiting for {len(users_tasks)} \"GET /users/{{id_users}}\" requests'
         )
 
-        # Wait in parallel for all the requests to finish!
-        user_responses = await asyncio.gather(*users_tasks.values())
+        if mode == MapUsers.BEST_EFFORT:
+            user_responses = await TrainingResponse.wait_users_until_deadline(
+                users_tasks
+            )
+        else:
+            # Wait in parallel for all the requests to finish!
+            user_responses = await asyncio.gather(
+                *users_tasks.values(), return_exceptions=True
+            )
+            user_responses = TrainingResponse.without_rejected(user_responses)
 
-        users = TrainingResponse.reorganize_users(users_tasks, user_responses)
+        users = TrainingResponse.reorganize_users(
+            users_tasks, user_responses, best_effort=mode == MapUsers.BEST_EFFORT
+        )
 
         TrainingResponse.convert_all_types_ids(trainings_list, users)
 
+    @staticmethod
+    def without_rejected(responses):
+        """The responses, with None for the requests rejected by the circuit
+        (opened, or half open with its single probe taken): those users are not
+        mapped, and the ones obtained (the probe too) are. Other errors are
+        raised."""
+
+        rejected = 0
+        for response in responses:
+            if isinstance(response, CircuitOpenError):
+                rejected += 1
+            elif isinstance(response, BaseException):
+                raise response
+        if rejected:
+            main.app.logger.warning(
+                f'User service circuit is not closed, {rejected} users not mapped'
+            )
+        return [
+            None if isinstance(response, CircuitOpenError) else response
+            for response in responses
+        ]
+
+    @staticmethod
+    async def wait_users_until_deadline(users_tasks):
+        """Responses of the users requests that finished before the deadline,
+        None for the ones cancelled or failed"""
+
+        if not users_tasks:
+            return []
+        deadline = int(main.app_settings.MAP_USERS_DEADLINE_MS) / 1000
+        done, pending = await asyncio.wait(users_tasks.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            main.app.logger.warning(
+                f'{len(pending)} users not obtained before {deadline}s, not mapped'
+            )
+
+        responses = []
+        for task in users_tasks.values():
+            if task in done and task.exception() is None:
+                responses.append(task.result())
+            else:
+                responses.append(None)
+        return responses
+
     @staticmethod
     def convert_all_types_ids(trainings_list, users):
-        """With the users data, map all the ids users of each training in the list."""
+        """With the users data, map all the ids users of each training in the list.
+        The users missing in "users" (not obtained) are marked as unmapped."""
 
         training_to_delete = []
 
         for training in trainings_list:
             trainings = main.app.database["trainings"]
 
-            if users[str(training.trainer["id"])]:
+            id_trainer = str(training.trainer["id"])
+            if id_trainer not in users:
+                training.trainer = unmapped_user(training.trainer)
+                TrainingResponse.map_ids_users_of_comments(users, training, trainings)
+                TrainingResponse.map_ids_users_of_scores(users, training, trainings)
+            elif users[id_trainer]:
                 training.trainer = UserResponseSmall.from_mongo(
-                    users[str(training.trainer["id"])].copy()
+                    users[id_trainer].copy()
                 )
 
                 TrainingResponse.map_ids_users_of_comments(users, training, trainings)
@@ -257,10 +374,12 @@ class TrainingResponse(BaseModel):
     def map_ids_users_of_scores(users, training, trainings):
         new_elements = []
         for score in training.scores:
-            if users[str(score.user["id"])]:
-                score.user = UserResponseSmall.from_mongo(
-                    users[str(score.user["id"])].copy()
-                )
+            id_user = str(score.user["id"])
+            if id_user not in users:
+                score.user = unmapped_user(score.user)
+                new_elements.append(score)
+            elif users[id_user]:
+                score.user = UserResponseSmall.from_mongo(users[id_user].copy())
                 new_elements.append(score)
 
             else:
@@ -280,10 +399,12 @@ class TrainingResponse(BaseModel):
         new_elements = []
 
         for comment in training.comments:
-            if users[str(comment.user["id"])]:
-                comment.user = UserResponseSmall.from_mongo(
-                    users[str(comment.user["id"])].copy()
-                )
+            id_user = str(comment.user["id"])
+            if id_user not in users:
+                comment.user = unmapped_user(comment.user)
+                new_elements.append(comment)
+            elif users[id_user]:
+                comment.user = UserResponseSmall.from_mongo(users[id_user].copy())
                 new_elements.append(comment)
 
             else:
@@ -299,17 +420,25 @@ class TrainingResponse(BaseModel):
         training.comments = new_elements.copy()
 
     @staticmethod
-    def reorganize_users(users_tasks, responses):
+    def reorganize_users(users_tasks, responses, best_effort: bool = False):
         """Reorganize the users in a dict with the id as key, and the user (obtained in
-        the request) as value. If the user does not exist, the value assigned is None"""
+        the request) as value. If the user does not exist, the value assigned is None.
+        In best effort, the users that could not be obtained are left out of the
+        dict (unmapped) instead of raising an error."""
 
         users = {}
         for id_user, user in zip(users_tasks.keys(), responses):
+            if user is None:
+                continue
             if user.status_code == 200:
                 users[id_user] = user.json()
             elif user.status_code == 404:
                 main.app.logger.warning(f'User with id {id_user} not found')
                 users[id_user] = None
+            elif best_effort:
+                main.app.logger.warning(
+                    f'Error getting user {id_user}: {user.status_code}, not mapped'
+                )
             else:
                 main.app.logger.error(
                     f'Error getting user: {user.status_code} {user.json()}'
@@ -385,6 +514,20 @@ class TrainingResponse(BaseModel):
         return cls(**dict(training, id=id_training))
 
 
+class RankedTrainingResponse(BaseModel):
+    id: ObjectIdPydantic
+    title: str
+    type: TrainingTypes
+    difficulty: int = Field(None, ge=1, le=5)
+    score_average: float = 0
+    count_scores: int = 0
+    count_comments: int = 0
+    count_starts: int = 0
+
+    class Config(BaseConfig):
+        json_encoders = {ObjectId: lambda id: str(id)}  # convert ObjectId into str
+
+
 class UpdateTrainingRequest(BaseModel):
     title: Optional[str]
     description: Optional[str]
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from bson import ObjectId
+from app.config.config import get_settings
+from app.leases import Lease
+import app.main as main
+
+logger = logging.getLogger('app')
+app_settings = get_settings()
+
+# Weights of each kind of recent activity to compute the trending trainings
+TRENDING_WEIGHT_SCORE = 2
+TRENDING_WEIGHT_COMMENT = 1
+TRENDING_WEIGHT_START = 3
+
+
+class TrainingsRankings:
+    """Feeds of "top rated" and "trending" trainings. They are computed by a
+    periodic background job with aggregations in MongoDB, and kept in memory
+    already encoded as json, so each request only has to slice a list. Only
+    one worker computes them, the others load the ones it saved."""
+
+    def __init__(self):
+        self.top = []
+        self.trending = []
+        self.updated_at = None
+
+    def refresh(self, database):
+        """Recompute both feeds. Blocking, must run outside of the event loop"""
+
+        self.top = self.compute_top(database)
+        self.trending = self.compute_trending(database)
+        self.updated_at = datetime.utcnow()
+        logger.info(
+            f'Rankings refreshed: {len(self.top)} top trainings and'
+            + f' {len(self.trending)} trending trainings'
+        )
+
+    def save(self, database):
+        """Keep the feeds in MongoDB, for the workers that do not compute them"""
+
+        database["rankings"].replace_one(
+            {"_id": "feeds"},
+            {"top": self.top, "trending": self.trending, "updated_at": self.updated_at},
+            upsert=True,
+        )
+
+    def load(self, database):
+        """The feeds computed by the worker that holds the lease, if any yet"""
+
+        feeds = database["rankings"].find_one({"_id": "feeds"})
+        if feeds is None:
+            return
+        self.top = feeds["top"]
+        self.trending = feeds["trending"]
+        self.updated_at = feeds["updated_at"]
+
+    def refresh_or_load(self, database, lease: Lease):
+        """Only one worker computes the feeds (the one with the lease) and saves
+        them; the others read them. Blocking, must run outside of the event
+        loop"""
+
+        if lease.acquire():
+            self.refresh(database)
+            self.save(database)
+        else:
+            self.load(database)
+
+    @staticmethod
+    def compute_top(database):
+        """Best trainings by average score, with a minimum count of votes"""
+
+        pipeline = [
+            {"$match": {"blocked": False}},
+            {
+                "$project": {
+                    "title": 1,
+                    "type": 1,
+                    "difficulty": 1,
+                    "count_scores": {"$size": {"$ifNull": ["$scores", []]}},
+                    "score_average": {"$avg": "$scores.qualification"},
+                    "count_comments": {"$size": {"$ifNull": ["$comments", []]}},
+                }
+            },
+            {
+                "$match": {
+                    "count_scores": {"$gte": int(app_settings.RANKINGS_MIN_VOTES)}
+                }
+            },
+            {"$sort": {"score_average": -1, "count_scores": -1}},
+            {"$limit": int(app_settings.RANKINGS_SIZE)},
+        ]
+        return [
+            TrainingsRankings.encode(training)
+            for training in database["trainings"].aggregate(pipeline)
+        ]
+
+    @staticmethod
+    def compute_trending(database):
+        """Most active trainings by recent scores, comments and starts, in a
+        sliding window of RANKINGS_TRENDING_HOURS"""
+
+        since = datetime.utcnow() - timedelta(
+            hours=int(app_settings.RANKINGS_TRENDING_HOURS)
+        )
+        trainings = database["trainings"]
+
+        # comments have no date, but their ObjectId embeds the creation time
+        count_comments = TrainingsRankings.count_by_training(
+            trainings,
+            "comments",
+            {"comments.id": {"$gte": ObjectId.from_datetime(since)}},
+        )
+        count_scores = TrainingsRankings.count_by_training(
+            trainings, "scores", {"scores.date": {"$gte": since}}
+        )
+        count_starts = {
+            result["_id"]: result["count"]
+            for result in database["athletes_states"].aggregate(
+                [
+                    {"$match": {"date_start": {"$gte": since}}},
+                    {"$group": {"_id": "$training_id", "count": {"$sum": 1}}},
+                ]
+            )
+        }
+
+        activity = {}
+        for counts, weight in [
+            (count_scores, TRENDING_WEIGHT_SCORE),
+            (count_comments, TRENDING_WEIGHT_COMMENT),
+            (count_starts, TRENDING_WEIGHT_START),
+        ]:
+            for training_id, count in counts.items():
+                activity[training_id] = activity.get(training_id, 0) + weight * count
+
+        ranked_ids = sorted(activity, key=activity.get, reverse=True)
+        ranked_ids = ranked_ids[: int(app_settings.RANKINGS_SIZE)]
+
+        # a single fetch of the data of all the ranked trainings
+        trainings_found = {
+            training["_id"]: training
+            for training in trainings.find(
+                {"_id": {"$in": ranked_ids}, "blocked": False},
+                {"title": 1, "type": 1, "difficulty": 1},
+            )
+        }
+
+        trending = []
+        for training_id in ranked_ids:
+            if training := trainings_found.get(training_id):
+                training["count_scores"] = count_scores.get(training_id, 0)
+                training["count_comments"] = count_comments.get(training_id, 0)
+                training["count_starts"] = count_starts.get(training_id, 0)
+                trending.append(TrainingsRankings.encode(training))
+        return trending
+
+    @staticmethod
+    def count_by_training(trainings, field, match):
+        pipeline = [
+            {"$match": {"blocked": False}},
+            {"$unwind": f"${field}"},
+            {"$match": match},
+            {"$group": {"_id": "$_id", "count": {"$sum": 1}}},
+        ]
+        return {
+            result["_id"]: result["count"] for result in trainings.aggregate(pipeline)
+        }
+
+    @staticmethod
+    def encode(training: dict):
+        """Json of a RankedTrainingResponse"""
+
+        return {
+            "id": str(training["_id"]),
+            "title": training.get("title"),
+            "type": training.get("type"),
+            "difficulty": training.get("difficulty"),
+            "score_average": training.get("score_average") or 0,
+            "count_scores": training.get("count_scores", 0),
+            "count_comments": training.get("count_comments", 0),
+            "count_starts": training.get("count_starts", 0),
+        }
+
+
+rankings = TrainingsRankings()
+
+
+def rankings_lease(database):
+    """Held by the worker that refreshes the rankings, while it keeps doing it
+    (renewed every refresh, so it expires after two missed ones)"""
+
+    return Lease(
+        database["leases"],
+        "rankings",
+        seconds=2 * int(app_settings.RANKINGS_REFRESH_SECONDS),
+    )
+
+
+async def runRankingsManager(refresh_now: bool = True):
+    """Refresh the rankings forever, every RANKINGS_REFRESH_SECONDS. Without
+    "refresh_now" the first refresh waits a period (warmed up at startup)."""
+
+    loop = asyncio.get_running_loop()
+    if not refresh_now:
+        await asyncio.sleep(int(app_settings.RANKINGS_REFRESH_SECONDS))
+    while True:
+        try:
+            database = main.app.database
+            await loop.run_in_executor(
+                None, rankings.refresh_or_load, database, rankings_lease(database)
+            )
+        except Exception as e:
+            main.logger.error(f'Rankings could not be refreshed: {e}')
+        await asyncio.sleep(int(app_settings.RANKINGS_REFRESH_SECONDS))
@@ -1,7 +1,6 @@
 import logging
 from bson import ObjectId
 from fastapi import APIRouter, Depends, Request
-from passlib.context import CryptContext
 from starlette import status
 from app.trainings.models import (
     ScoreRequest,
@@ -15,7 +14,6 @@ from app.trainings.trainings_crud import get_user_id
 
 logger = logging.getLogger('app')
 router_scores = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 @router_scores.post(
@@ -31,34 +29,22 @@ async def add_score(
     id_user: ObjectId = Depends(get_user_id),
 ):
     trainings = request.app.database["trainings"]
-    current_score = trainings.find(
-        {"_id": training_id, "scores": {"$elemMatch": {"id_user": id_user}}}
+    score_json = request_body.encode_json_with(id_user)
+    result = trainings.update_one(
+        {"_id": training_id, "scores.id_user": {"$ne": id_user}},
+        {"$push": {"scores": score_json}},
     )
-    current_score = list(current_score)
-
-    if current_score is None or len(current_score) == 0:
-        score_json = request_body.encode_json_with(id_user)
-        result = trainings.update_one(
-            {"_id": training_id, "scores.id_user": {"$ne": id_user}},
-            {"$push": {"scores": score_json}},
+    if result.modified_count == 1:
+        request.app.logger.info(
+            f'Score calification for user {id_user} created'
+            + f'successfully on Training {training_id}'
         )
-        if result.modified_count == 1:
-            request.app.logger.info(
-                f'Score calification for user {id_user} created'
-                + f'successfully on Training {training_id}'
-            )
-            return ScoreResponse.from_mongo(score_json)
-        else:
-            request.app.logger.info(
-                f'Score calification for user {id_user} could not be'
-                + f'created on Training {training_id}'
-            )
-            return JSONResponse(
-                status_code=status.HTTP_409_CONFLICT,
-                content=f'Score calification for user {id_user} '
-                + f'could not be created on Training {training_id}',
-            )
-    else:
+        return ScoreResponse.from_mongo(score_json)
+
+    # Only when the score could not be pushed, we look for the reason
+    if trainings.count_documents(
+        {"_id": training_id, "scores.id_user": id_user}, limit=1
+    ):
         logger.info(
             f'Score calification for user {id_user} \
             already exist on Training {training_id}'
@@ -69,6 +55,16 @@ async def add_score(
             + f' exist on Training {training_id}',
         )
 
+    request.app.logger.info(
+        f'Score calification for user {id_user} could not be'
+        + f'created on Training {training_id}'
+    )
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content=f'Score calification for user {id_user} '
+        + f'could not be created on Training {training_id}',
+    )
+
 
 @router_scores.patch(
     "/{training_id}/score",
@@ -82,12 +78,13 @@ async def modify_score(
     id_user: ObjectId = Depends(get_user_id),
 ):
     trainings = request.app.database["trainings"]
-    current_score = trainings.find(
-        {"_id": training_id, "scores": {"$elemMatch": {"id_user": id_user}}}
+    request_body = request_body.encode_json_with(id_user)
+    result = trainings.update_one(
+        {"_id": training_id, "scores.id_user": {"$eq": id_user}},
+        {"$set": {"scores.$": request_body}},
     )
-    current_score = list(current_score)
 
-    if current_score is None or len(current_score) == 0:
+    if result.matched_count == 0:
         logger.info(
             f'Score calification for {id_user} does not exist '
             + f'on Training {training_id}'
@@ -97,28 +94,23 @@ async def modify_score(
             content=f'Score calification for {id_user} does not'
             + f' exist on Training {training_id}',
         )
-    else:
-        request_body = request_body.encode_json_with(id_user)
-        result = trainings.update_one(
-            {"_id": training_id, "scores.id_user": {"$eq": id_user}},
-            {"$set": {"scores.$": request_body}},
+
+    if result.modified_count == 1:
+        logger.info(
+            f'Score calification for {id_user} updated'
+            + f' successfully on Training {training_id}'
         )
-        if result.modified_count == 1:
-            logger.info(
-                f'Score calification for {id_user} updated'
-                + f' successfully on Training {training_id}'
-            )
-            return ScoreResponse.from_mongo(request_body)
-        else:
-            logger.info(
-                f'Score calification for {id_user} could not'
-                + f' be updated on Training {training_id}'
-            )
-            return JSONResponse(
-                status_code=status.HTTP_409_CONFLICT,
-                content=f'Score calification for {id_user} could not'
-                + f' be updated on Training {training_id}',
-            )
+        return ScoreResponse.from_mongo(request_body)
+
+    logger.info(
+        f'Score calification for {id_user} could not'
+        + f' be updated on Training {training_id}'
+    )
+    return JSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content=f'Score calification for {id_user} could not'
+        + f' be updated on Training {training_id}',
+    )
 
 
 @router_scores.delete(
@@ -0,0 +1,124 @@
+import logging
+from typing import Optional
+from bson import ObjectId
+from fastapi import APIRouter, Depends, Request
+from starlette import status
+from starlette.responses import JSONResponse
+from app.services import ServiceUsers
+from app.trainings.models import StateTraining
+from app.trainings.trainings_crud import get_user_id
+
+logger = logging.getLogger('app')
+router_trainers_stats = APIRouter()
+
+STATES_OF_ATHLETES = [StateTraining.INIT, StateTraining.STOP, StateTraining.COMPLETE]
+
+
+def aggregate_trainings_of_trainer(trainings, id_trainer: ObjectId):
+    """Scores and comments statistics of every training of the trainer"""
+
+    pipeline = [
+        {"$match": {"id_trainer": id_trainer}},
+        {
+            "$project": {
+                "title": 1,
+                "count_scores": {"$size": {"$ifNull": ["$scores", []]}},
+                "score_average": {"$avg": "$scores.qualification"},
+                "count_comments": {"$size": {"$ifNull": ["$comments", []]}},
+            }
+        },
+    ]
+    return list(trainings.aggregate(pipeline))
+
+
+def aggregate_states_of_trainings(athletes_states, trainings_ids):
+    """Count of athletes by state of each training, as
+    {training_id: {state: count}}"""
+
+    pipeline = [
+        {"$match": {"training_id": {"$in": trainings_ids}}},
+        {
+            "$group": {
+                "_id": {"training_id": "$training_id", "state": "$state"},
+                "count": {"$sum": 1},
+            }
+        },
+    ]
+    states = {}
+    for result in athletes_states.aggregate(pipeline):
+        counts = states.setdefault(result["_id"]["training_id"], {})
+        counts[result["_id"]["state"]] = result["count"]
+    return states
+
+
+async def count_favorites_of_trainings(trainings_ids):
+    """Count how many users have each training as favorite, with a single
+    request to the users service for all the trainings. None when the users
+    could not be obtained."""
+
+    response = await ServiceUsers.get_all()
+    if response is None:
+        return None
+    if response.status_code != 200:
+        logger.warning(f'Users not obtained: {response.status_code}, favorites unknown')
+        return None
+    favorites = {str(training_id): 0 for training_id in trainings_ids}
+    for user in response.json():
+        for training_favorite in user["trainings"]:
+            if training_favorite["id_training"] in favorites:
+                favorites[training_favorite["id_training"]] += 1
+    return favorites
+
+
+@router_trainers_stats.get(
+    "/stats",
+    status_code=status.HTTP_200_OK,
+    summary="Get the statistics of all the trainings created by me",
+)
+async def get_trainer_stats(
+    request: Request,
+    id_trainer: ObjectId = Depends(get_user_id),
+    map_favorites: Optional[bool] = True,
+):
+    trainings = aggregate_trainings_of_trainer(
+        request.app.database["trainings"], id_trainer
+    )
+    trainings_ids = [training["_id"] for training in trainings]
+
+    states = aggregate_states_of_trainings(
+        request.app.database["athletes_states"], trainings_ids
+    )
+
+    favorites = {}
+    if map_favorites and trainings_ids:
+        favorites = await count_favorites_of_trainings(trainings_ids)
+    # unknown (null) when the users could not be obtained
+    unknown = favorites is None
+
+    stats = []
+    for training in trainings:
+        counts = states.get(training["_id"], {})
+        stats.append(
+            {
+                "id": str(training["_id"]),
+                "title": training["title"],
+                "count_favorites": (
+                    None if unknown else favorites.get(str(training["_id"]), 0)
+                ),
+                "count_scores": training["count_scores"],
+                "score_average": training["score_average"] or 0,
+                "count_comments": training["count_comments"],
+                "count_athletes": {
+                    state.value: counts.get(state.value, 0)
+                    for state in STATES_OF_ATHLETES
+                },
+            }
+        )
+
+    request.app.logger.info(
+        f'Return statistics of {len(stats)} trainings of trainer {id_trainer}'
+    )
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"count_trainings": len(stats), "trainings": stats},
+    )
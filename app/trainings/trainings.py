@@ -1,26 +1,28 @@
 import logging
+from datetime import datetime
 from app.trainings.athletes import stop_an_training
 from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from passlib.context import CryptContext
 from starlette import status
 from typing import List, Optional
 from app.services import ServiceUsers
 from app.trainings.models import (
+    MapUsers,
+    RankedTrainingResponse,
     StateTraining,
     TrainingQueryParamsFilter,
     TrainingResponse,
     UserRoles,
 )
 from app.trainings.object_id import ObjectIdPydantic
-from starlette.responses import JSONResponse
+from app.trainings.rankings import rankings
+from starlette.responses import JSONResponse, StreamingResponse
 
 from app.trainings.trainings_crud import get_all_data_of_access_token
 
 
 logger = logging.getLogger('app')
 router_trainings = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def update_states_to_visualizate(training, athletes_states, request: Request):
@@ -54,7 +56,7 @@ async def get_trainings(
     request: Request,
     queries: TrainingQueryParamsFilter = Depends(),
     limit: int = Query(128, ge=1, le=1024),
-    map_users: Optional[bool] = True,
+    map_users: Optional[MapUsers] = None,
     map_states: Optional[bool] = True,
 ):
     trainings = request.app.database["trainings"]
@@ -68,8 +70,7 @@ async def get_trainings(
         if res := TrainingResponse.from_mongo(training):
             trainings_list.append(res)
 
-    if map_users:
-        await TrainingResponse.map_users(trainings_list)
+    await TrainingResponse.map_users(trainings_list, map_users)
 
     if len(trainings_list) == 0:
         return JSONResponse(
@@ -86,6 +87,98 @@ async def get_trainings(
     return trainings_list
 
 
+def watermark_of(since: str) -> ObjectId:
+    """The watermark can be the id of the last exported training, or an ISO 8601
+    datetime. Both are translated into an ObjectId, that embeds creation time."""
+
+    if ObjectId.is_valid(since):
+        return ObjectId(since)
+    try:
+        return ObjectId.from_datetime(datetime.fromisoformat(since))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid since watermark {since}",
+        )
+
+
+def export_trainings_lines(cursor, batch_size: int):
+    """Iterate the cursor writing one JSON training per line. Lines are grouped
+    by batch, so only one batch of trainings is held in memory at a time."""
+
+    lines = []
+    for training in cursor:
+        lines.append(TrainingResponse.from_mongo(training).json() + "\n")
+        if len(lines) >= batch_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+@router_trainings.get(
+    '/export',
+    status_code=status.HTTP_200_OK,
+    summary="Export all trainings as NDJSON stream. Include query params to filter",
+)
+def export_trainings(
+    request: Request,
+    queries: TrainingQueryParamsFilter = Depends(),
+    since: Optional[str] = None,
+    batch_size: int = Query(256, ge=1, le=1024),
+):
+    """Trainings are streamed in creation order (by ObjectId), so the "id" of the
+    last line received can be used as the "since" watermark of the next pull."""
+
+    trainings = request.app.database["trainings"]
+
+    query = queries.dict(exclude_none=True)
+    if since:
+        query["_id"] = {"$gt": watermark_of(since)}
+
+    cursor = trainings.find(query).sort("_id", 1).batch_size(batch_size)
+
+    request.app.logger.info(f'Exporting trainings with query params: {query}')
+    return StreamingResponse(
+        export_trainings_lines(cursor, batch_size),
+        media_type="application/x-ndjson",
+    )
+
+
+@router_trainings.get(
+    '/top',
+    response_model=List[RankedTrainingResponse],
+    status_code=status.HTTP_200_OK,
+    summary="Get the best rated trainings, with a minimum of votes",
+)
+def get_top_trainings(request: Request, limit: int = Query(10, ge=1, le=50)):
+    if not rankings.top:
+        request.app.logger.info('Top trainings not available')
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content='Top trainings not available',
+        )
+    return JSONResponse(status_code=status.HTTP_200_OK, content=rankings.top[:limit])
+
+
+@router_trainings.get(
+    '/trending',
+    response_model=List[RankedTrainingResponse],
+    status_code=status.HTTP_200_OK,
+    summary="Get the trainings with more recent scores, comments and starts",
+)
+def get_trending_trainings(request: Request, limit: int = Query(10, ge=1, le=50)):
+    if not rankings.trending:
+        request.app.logger.info('Trending trainings not available')
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content='Trending trainings not available',
+        )
+    return JSONResponse(
+        status_code=status.HTTP_200_OK, content=rankings.trending[:limit]
+    )
+
+
 @router_trainings.patch('/{training_id}/block', status_code=status.HTTP_200_OK)
 async def block_status(training_id: ObjectIdPydantic, request: Request):
     trainings = request.app.database["trainings"]
@@ -183,7 +276,7 @@ def unblock_status(training_id: ObjectIdPydantic, request: Request):
 async def get_training_by_id(
     request: Request,
     training_id: ObjectIdPydantic,
-    map_users: Optional[bool] = True,
+    map_users: Optional[MapUsers] = None,
     map_states: Optional[bool] = True,
 ):
     trainings = request.app.database["trainings"]
@@ -201,8 +294,7 @@ async def get_training_by_id(
             training, request.app.database["athletes_states"], request
         )
     if res := TrainingResponse.from_mongo(training):
-        if map_users:
-            await res.map_users([res])
+        await res.map_users([res], map_users)
         return res
     else:
         request.app.logger.error(f"Failed to search training {training_id}'")
@@ -232,14 +324,20 @@ async def get_statistics_training_by_id(
 
     count_scores = len(training["scores"])
     count_comments = len(training["comments"])
-    count_favorites = 0
-    users = (await ServiceUsers.get("/users/?map_trainings=false")).json()
-
-    for user in users:
-        for training_favorite in user["trainings"]:
-            if training_favorite["id_training"] == str(training_id):
-                count_favorites += 1
-                break
+    # unknown (null) when the users could not be obtained
+    count_favorites = None
+    response = await ServiceUsers.get_all()
+    if response is not None and response.status_code == 200:
+        count_favorites = 0
+        for user in response.json():
+            for training_favorite in user["trainings"]:
+                if training_favorite["id_training"] == str(training_id):
+                    count_favorites += 1
+                    break
+    elif response is not None:
+        request.app.logger.warning(
+            f'Users not obtained: {response.status_code}, favorites unknown'
+        )
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -4,6 +4,7 @@ import jwt
 from app.config.auth_baerer import JWTBearer
 from fastapi import APIRouter, Query, Request
 from app.trainings.models import (
+    MapUsers,
     TrainingQueryParamsFilter,
     TrainingRequestPost,
     TrainingResponse,
@@ -13,11 +14,13 @@ from app.definitions import DELETE_TRAINING, MEDIA_UPLOAD, NEW_TRAINING
 from fastapi import Depends, HTTPException, status
 from starlette.responses import JSONResponse
 from app.trainings.object_id import ObjectIdPydantic
-from app.config.config import Settings
+from app.config.config import get_settings
 
-app_settings = Settings()
+app_settings = get_settings()
 router_trainers = APIRouter()
 
+MAX_TRAININGS_BULK = 256
+
 
 def get_user_id(token: str = Depends(JWTBearer())) -> ObjectId:
     """Get user id from the token"""
@@ -83,6 +86,50 @@ async def add_training(
         )
 
 
+@router_trainers.post(
+    "/bulk",
+    response_model=List[TrainingResponse],
+    status_code=status.HTTP_201_CREATED,
+    summary="Create a list of trainings at once",
+)
+async def add_trainings_bulk(
+    request: Request,
+    request_body: List[TrainingRequestPost],
+    id_trainer: ObjectId = Depends(get_user_id),
+):
+    if not request_body or len(request_body) > MAX_TRAININGS_BULK:
+        request.app.logger.info(f'Invalid bulk of {len(request_body)} trainings')
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content=f'Between 1 and {MAX_TRAININGS_BULK} trainings must be'
+            + ' especified to create',
+        )
+
+    trainings = request.app.database["trainings"]
+
+    # insert_many sets the "_id" of each document, so there is no need to
+    # read them again from MongoDB to build the responses
+    trainings_json = [
+        training.encode_json_with(id_trainer) for training in request_body
+    ]
+    trainings.insert_many(trainings_json)
+
+    request.app.logger.info(f'New {len(trainings_json)} trainings created.')
+
+    trainings_list = [TrainingResponse.from_mongo(json) for json in trainings_json]
+
+    request.state.metrics_allowed = True
+    request.state.user_id = str(id_trainer)
+    request.state.action = NEW_TRAINING
+    request.state.trainings = [
+        (str(res.id), str(res.type).split(".")[-1]) for res in trainings_list
+    ]
+
+    # all trainings have the same trainer, so it is requested only once
+    await TrainingResponse.map_users(trainings_list)
+    return trainings_list
+
+
 @router_trainers.get(
     "/",
     response_model=List[TrainingResponse],
@@ -94,7 +141,7 @@ async def get_training_created(
     queries: TrainingQueryParamsFilter = Depends(),
     id_trainer: ObjectId = Depends(get_user_id),
     limit: int = Query(128, ge=1, le=1024),
-    map_users: Optional[bool] = True,
+    map_users: Optional[MapUsers] = None,
 ):
     trainings = request.app.database["trainings"]
 
@@ -113,8 +160,7 @@ async def get_training_created(
             + f'query params: {queries.dict(exclude_none=True)}',
         )
 
-    if map_users:
-        await TrainingResponse.map_users(trainings_list)
+    await TrainingResponse.map_users(trainings_list, map_users)
 
     request.app.logger.info(
         f'Return list of {len(trainings_list)} trainings,'
@@ -132,9 +178,6 @@ async def update_training(
     update_training_request: UpdateTrainingRequest,
     id_trainer: ObjectId = Depends(get_user_id),
 ):
-    trainings = request.app.database["trainings"]
-    trainings = trainings.find({"_id": training_id})
-
     fields_to_change = update_training_request.dict(exclude_none=True)
     if not fields_to_change or len(fields_to_change) == 0:
         request.app.logger.info('No values especified in body to update')
@@ -143,17 +186,16 @@ async def update_training(
             content='No values especified to update',
         )
     trainings = request.app.database["trainings"]
-    training = trainings.find_one({"_id": training_id, "id_trainer": id_trainer})
+    update_result = trainings.update_one(
+        {"_id": training_id, "id_trainer": id_trainer}, {"$set": fields_to_change}
+    )
 
-    if not training:
+    if update_result.matched_count == 0:
         request.app.logger.info(f'Training {training_id} not found to update')
         return JSONResponse(
             status_code=status.HTTP_404_NOT_FOUND,
             content=f'Training {training_id} not found',
         )
-    update_result = trainings.update_one(
-        {"_id": training_id}, {"$set": fields_to_change}
-    )
     if update_result.modified_count > 0:
         if fields_to_change.get('media'):
             request.state.metrics_allowed = True
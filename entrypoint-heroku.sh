@@ -3,4 +3,4 @@
 datadog-agent run > /dev/null &
 /opt/datadog-agent/embedded/bin/trace-agent --config=/etc/datadog-agent/datadog.yaml > /dev/null &
 /opt/datadog-agent/embedded/bin/process-agent --config=/etc/datadog-agent/datadog.yaml > /dev/null &
-poetry run uvicorn app.main:app --host 0.0.0.0 --port ${PORT}
\ No newline at end of file
+poetry run python -m app.server
\ No newline at end of file
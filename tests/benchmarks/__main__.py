@@ -0,0 +1,50 @@
+import argparse
+import json
+import logging
+import sys
+from tests.benchmarks.bench_import import over_import_budget, run_import_benchmark
+from tests.benchmarks.bench_models import compare_benchmarks, run_benchmarks
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.benchmarks",
+        description="Microbenchmarks of the model conversions of each listing",
+    )
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--only", action="append", default=None)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="baseline results file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--import-time",
+        action="store_true",
+        help="also time importing the app (python -X importtime)",
+    )
+    args = parser.parse_args()
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    results = run_benchmarks(args.iterations, args.only)
+    if args.import_time:
+        results.update(run_import_benchmark())
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for key, result in results.items():
+        print(
+            f'{key:50} {result["mean_us"]:>12} us/call'
+            f'  {result["peak_alloc_kib"]:>10} KiB/call'
+        )
+
+    regressions = over_import_budget(results)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions += compare_benchmarks(json.load(file), results, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+# Time to import the app in a fresh interpreter, as reported by
+# "python -X importtime". It is what a cold start pays before the startup.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The budget of importing the app (about 3 times what it takes now), to catch
+# a module that starts doing heavy work at import. Slower machines can raise it.
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", 2))
+
+
+def import_times(module: str = "app.main"):
+    """{imported module: (self us, cumulative us)} of importing "module" """
+
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def run_import_benchmark(runs: int = 3, module: str = "app.main"):
+    """Best of "runs" imports, as the results of the other benchmarks, with
+    the modules of the app that take the longest on their own"""
+
+    best = min(
+        (import_times(module) for _ in range(runs)), key=lambda times: times[module][1]
+    )
+    slowest = sorted(
+        (name for name in best if name.startswith("app")),
+        key=lambda name: best[name][0],
+        reverse=True,
+    )
+    return {
+        f"import {module}": {
+            "mean_us": best[module][1],
+            "peak_alloc_kib": 0,
+            "slowest_self_us": {name: best[name][0] for name in slowest[:5]},
+        }
+    }
+
+
+def over_import_budget(results, budget: float = IMPORT_TIME_BUDGET_SECONDS):
+    """The imports of the results that took longer than the budget"""
+
+    return [
+        f"{key}: {result['mean_us']} us over the budget of {budget}s"
+        for key, result in results.items()
+        if key.startswith("import ") and result["mean_us"] > budget * 1e6
+    ]
@@ -0,0 +1,157 @@
+import gc
+import time
+import tracemalloc
+import mongomock
+from app.main import app
+from app.trainings.models import (
+    CommentResponse,
+    ScoreResponse,
+    TrainingQueryParamsFilter,
+    TrainingResponse,
+)
+from app.trainings.user_small import UserResponseSmall
+from tests.benchmarks.documents import (
+    SIZES,
+    comment_document,
+    copies,
+    score_document,
+    training_document,
+    user_document,
+    users_of,
+)
+
+# Each benchmark prepares the arguments of every call before measuring, as
+# prepare(size, count) -> list of tuples, and then calls "function" with them.
+
+
+def prepare_training(size, count):
+    return [(doc,) for doc in copies(training_document(size), count)]
+
+
+def prepare_comment(size, count):
+    return [(doc,) for doc in copies(comment_document(), count)]
+
+
+def prepare_score(size, count):
+    return [(doc,) for doc in copies(score_document(), count)]
+
+
+def prepare_user(size, count):
+    return [(doc,) for doc in copies(user_document(), count)]
+
+
+def prepare_convert_all_types_ids(size, count):
+    training = training_document(size)
+    users = users_of(training)
+    return [
+        ([TrainingResponse.from_mongo(doc)], users) for doc in copies(training, count)
+    ]
+
+
+def prepare_query_params(size, count):
+    queries = TrainingQueryParamsFilter(
+        title="Benchmark", type="Running", difficulty=3, score=4
+    )
+    return [(queries,) for _ in range(count)]
+
+
+def query_params_dict(queries):
+    return queries.dict(exclude_none=True)
+
+
+BENCHMARKS = {
+    # name: (function, prepare, depends on size)
+    "TrainingResponse.from_mongo": (
+        TrainingResponse.from_mongo,
+        prepare_training,
+        True,
+    ),
+    "CommentResponse.from_mongo": (CommentResponse.from_mongo, prepare_comment, False),
+    "ScoreResponse.from_mongo": (ScoreResponse.from_mongo, prepare_score, False),
+    "UserResponseSmall.from_mongo": (
+        UserResponseSmall.from_mongo,
+        prepare_user,
+        False,
+    ),
+    "TrainingResponse.convert_all_types_ids": (
+        TrainingResponse.convert_all_types_ids,
+        prepare_convert_all_types_ids,
+        True,
+    ),
+    "TrainingQueryParamsFilter.dict": (query_params_dict, prepare_query_params, False),
+}
+
+
+def iterations_for(size, iterations):
+    """Big documents take longer, so they are measured fewer times"""
+
+    return max(3, iterations // max(1, size // 50))
+
+
+def measure(function, calls):
+    """Mean time per call, and mean of allocated memory (peak) per call"""
+
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter_ns()
+        for args in calls[: len(calls) // 2]:
+            function(*args)
+        elapsed = time.perf_counter_ns() - start
+        timed = len(calls) // 2
+
+        tracemalloc.start()
+        peak_total = 0
+        allocated = calls[len(calls) // 2 :]
+        for args in allocated:
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            function(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            peak_total += peak - current
+        tracemalloc.stop()
+    finally:
+        gc.enable()
+
+    return {
+        "calls": timed,
+        "mean_us": round(elapsed / max(1, timed) / 1000, 3),
+        "peak_alloc_kib": round(peak_total / max(1, len(allocated)) / 1024, 3),
+    }
+
+
+def run_benchmarks(iterations: int = 200, names=None):
+    """Run every benchmark (or only "names") for every size of documents"""
+
+    # convert_all_types_ids gets the trainings collection from the app
+    database = getattr(app, "database", None)
+    app.database = mongomock.MongoClient()["training_microservice_benchmark"]
+
+    results = {}
+    try:
+        for name, (function, prepare, sized) in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            for size in SIZES if sized else [0]:
+                count = iterations_for(size, iterations)
+                calls = prepare(size, count * 2)
+                key = f"{name}[{size}]" if sized else name
+                results[key] = measure(function, calls)
+    finally:
+        app.database = database
+    return results
+
+
+def compare_benchmarks(baseline, current, tolerance: float = 0.25):
+    """Benchmarks whose time or allocations grew more than "tolerance" (a
+    fraction) against the baseline results"""
+
+    regressions = []
+    for key, base in baseline.items():
+        now = current.get(key)
+        if now is None:
+            continue
+        for metric in ["mean_us", "peak_alloc_kib"]:
+            if base[metric] and now[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{key}: {metric} {base[metric]} -> {now[metric]}")
+    return regressions
@@ -0,0 +1,55 @@
+import copy
+from bson import ObjectId
+
+# Synthetic documents as they are stored in MongoDB, with a variable count
+# of comments and scores, to measure the model conversions of each listing.
+
+SIZES = [0, 10, 1000]
+
+
+def user_document(id_user=None):
+    return {"id": str(id_user or ObjectId()), "name": "Juan", "lastname": "Perez"}
+
+
+def comment_document(id_user=None):
+    return {"id": ObjectId(), "id_user": id_user or ObjectId(), "detail": "comment"}
+
+
+def score_document(id_user=None):
+    return {"id_user": id_user or ObjectId(), "qualification": 4}
+
+
+def training_document(count_feedback: int):
+    """Training with "count_feedback" comments and "count_feedback" scores"""
+
+    return {
+        "_id": ObjectId(),
+        "id_trainer": ObjectId(),
+        "title": "Benchmark",
+        "description": "Synthetic training",
+        "type": "Running",
+        "difficulty": 3,
+        "media": [{"media_type": "image", "url": "image.png"}],
+        "goals": [
+            {"title": "A", "description": "A", "metric": "Steps", "quantity_steps": 10}
+        ],
+        "blocked": False,
+        "comments": [comment_document() for _ in range(count_feedback)],
+        "scores": [score_document() for _ in range(count_feedback)],
+    }
+
+
+def copies(document, count: int):
+    """The conversions pop keys from the documents, so every call needs its
+    own copy. They are built before measuring."""
+
+    return [copy.deepcopy(document) for _ in range(count)]
+
+
+def users_of(training: dict):
+    """Users dict, as built by TrainingResponse.reorganize_users"""
+
+    users = {str(training["id_trainer"]): user_document(training["id_trainer"])}
+    for feedback in training["comments"] + training["scores"]:
+        users[str(feedback["id_user"])] = user_document(feedback["id_user"])
+    return users
@@ -0,0 +1,80 @@
+import subprocess
+import sys
+from app.main import app
+from tests.benchmarks.bench_import import (
+    ROOT,
+    import_times,
+    over_import_budget,
+    run_import_benchmark,
+)
+from tests.benchmarks.bench_models import (
+    BENCHMARKS,
+    compare_benchmarks,
+    run_benchmarks,
+)
+
+
+def test_run_benchmarks_smoke():
+    database = getattr(app, "database", None)
+    results = run_benchmarks(iterations=4)
+
+    assert getattr(app, "database", None) is database
+
+    assert "TrainingResponse.from_mongo[1000]" in results
+    assert "TrainingQueryParamsFilter.dict" in results
+    assert len(results) == 10
+    assert all(result["mean_us"] > 0 for result in results.values())
+    assert set(key.split("[")[0] for key in results) == set(BENCHMARKS)
+
+
+def test_compare_benchmarks_detects_regressions():
+    baseline = {"A": {"mean_us": 10, "peak_alloc_kib": 1}}
+    current = {"A": {"mean_us": 20, "peak_alloc_kib": 1}}
+    assert compare_benchmarks(baseline, current) == ["A: mean_us 10 -> 20"]
+    assert compare_benchmarks(baseline, baseline) == []
+
+
+def test_import_time_is_tracked_and_skips_unused_modules():
+    results = run_import_benchmark(runs=1)
+    assert results["import app.main"]["mean_us"] > 0
+    assert over_import_budget(results) == []
+    assert over_import_budget(results, budget=0) != []
+    assert results["import app.main"]["slowest_self_us"]
+
+    # password hashing and the publisher connection are built when used
+    imported = import_times()
+    assert "passlib.context" not in imported
+    assert "bcrypt" not in imported
+
+    built = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import app.main;"
+            "from app.publisher.publisher_queue import PublisherQueue;"
+            "print(PublisherQueue.instance)",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert built.stdout.strip() == "None"
+
+
+def test_importing_the_config_does_not_configure_the_logging():
+    imported = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import logging, app.config.config as config;"
+            "print(len(logging.getLogger('app').handlers));"
+            "config.get_settings();"
+            "print(len(logging.getLogger('app').handlers))",
+        ],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert imported.stdout.split() == ["0", "1"]
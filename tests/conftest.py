@@ -0,0 +1,12 @@
+import pytest
+from app.main import app  # noqa: F401 (import order of the app modules)
+from app.circuit_breaker import breakers
+
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    """Failures mocked by a test must not open the circuits of the next ones"""
+
+    for breaker in breakers.values():
+        breaker.reset()
+    yield
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import json
+import sys
+from tests.load.harness import LoadConfig, compare_results, run_load, save_results
+from tests.load.scenarios import DEFAULT_MIX, parse_mix
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m tests.load",
+        description="Load test of the training service against local fakes",
+    )
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--trainings", type=int, default=200)
+    parser.add_argument("--comments-per-training", type=int, default=3)
+    parser.add_argument("--user-latency-ms", type=float, default=5)
+    parser.add_argument("--goals-latency-ms", type=float, default=5)
+    parser.add_argument(
+        "--mix",
+        default=",".join(f"{name}={weight}" for name, weight in DEFAULT_MIX.items()),
+    )
+    parser.add_argument(
+        "--mongo-uri", default=None, help="local MongoDB, mongomock if not given"
+    )
+    parser.add_argument("--seed", type=int, default=4)
+    parser.add_argument("--output", default="load_results.json")
+    parser.add_argument("--compare", default=None, help="baseline results file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = LoadConfig(
+        duration=args.duration,
+        concurrency=args.concurrency,
+        trainings=args.trainings,
+        comments_per_training=args.comments_per_training,
+        user_latency=args.user_latency_ms / 1000,
+        goals_latency=args.goals_latency_ms / 1000,
+        mix=parse_mix(args.mix),
+        mongo_uri=args.mongo_uri,
+        seed=args.seed,
+    )
+    results = asyncio.run(run_load(config))
+    save_results(results, args.output)
+
+    print(f'{results["total_requests"]} requests, {results["rps"]} rps')
+    for route, stats in results["routes"].items():
+        print(
+            f'{route:45} {stats["rps"]:>8} rps  p50 {stats["p50_ms"]:>8}ms'
+            f'  p95 {stats["p95_ms"]:>8}ms  p99 {stats["p99_ms"]:>8}ms'
+        )
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare_results(json.load(file), results, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
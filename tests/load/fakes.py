@@ -0,0 +1,134 @@
+import asyncio
+import socket
+import threading
+import time
+import uvicorn
+from bson import ObjectId
+from fastapi import FastAPI
+
+
+class FakeUsersService:
+    """Fake of the users service. Every user exists, and each request waits
+    "latency" seconds before answering."""
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.requests = 0
+        self.app = FastAPI()
+
+        @self.app.get("/users/")
+        async def get_users():
+            await self.wait()
+            return []
+
+        @self.app.get("/users/{id_user}")
+        async def get_user(id_user: str):
+            await self.wait()
+            return {"id": id_user, "name": "Juan", "lastname": "Perez"}
+
+    async def wait(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeGoalsService:
+    """Fake of the goals service, that accepts every goal created or changed"""
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.requests = 0
+        self.app = FastAPI()
+
+        @self.app.post("/athletes/me/goals/")
+        async def create_goal():
+            await self.wait()
+            return {"id": str(ObjectId())}
+
+        @self.app.patch("/athletes/me/goals/{id_goal}/{action}")
+        async def change_goal(id_goal: str, action: str):
+            await self.wait()
+            return {"id": id_goal, "action": action}
+
+    async def wait(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeServer:
+    """Serve an ASGI app with uvicorn in a background thread, on a free port"""
+
+    def __init__(self, app):
+        self.port = self.free_port()
+        config = uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="error"
+        )
+        self.server = uvicorn.Server(config)
+        # signals belong to the main thread, where the load test runs
+        self.server.install_signal_handlers = lambda: None
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @staticmethod
+    def free_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    def start(self, timeout: float = 10):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Fake server on port {self.port} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+class InMemoryPublisher:
+    """Replaces the RabbitMQ publisher, keeping the messages in a list"""
+
+    def __init__(self):
+        self.messages = []
+
+    def publish_message(self, message):
+        self.messages.append(message)
+
+    def publish_messages(self, messages):
+        self.messages.extend(messages)
+
+
+class FakeBroker(InMemoryPublisher):
+    """Replaces the PublisherQueue on its event loop: "run" serves the loop
+    until "stop", like the connection to RabbitMQ, and keeps the messages and
+    the thread where each one was published"""
+
+    def __init__(self, ready: bool = True):
+        super().__init__()
+        self.ready = ready
+        self.threads = set()
+        self.loop = None
+
+    def use_ioloop(self, loop):
+        self.loop = loop
+
+    def is_ready(self):
+        return self.ready
+
+    def publish_messages(self, messages):
+        self.threads.add(threading.current_thread().name)
+        super().publish_messages(messages)
+
+    def run(self):
+        self.loop.run_forever()
+
+    def stop(self, drain_timeout: float = 0):
+        self.loop.stop()
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from datetime import datetime
+import httpx
+import mongomock
+import pymongo
+from bson import ObjectId
+import app.main as main
+from app.main import app, logger
+from app.lifecycle import Lifecycle
+import app.publisher.publisher_queue_middleware as publisher_middleware
+import app.publisher.publisher_thread as publisher_thread
+import app.services as services
+from app.config.auth_settings import SettingsAuth
+from app.trainings.models import UserRoles
+from tests.load.fakes import (
+    FakeBroker,
+    FakeGoalsService,
+    FakeServer,
+    FakeUsersService,
+)
+from tests.load.scenarios import DEFAULT_MIX, choose
+
+
+class LoadConfig:
+    def __init__(
+        self,
+        duration: float = 10,
+        concurrency: int = 16,
+        trainings: int = 200,
+        comments_per_training: int = 3,
+        user_latency: float = 0.005,
+        goals_latency: float = 0.005,
+        mix: dict = None,
+        mongo_uri: str = None,
+        seed: int = 4,
+    ):
+        self.duration = duration
+        self.concurrency = concurrency
+        self.trainings = trainings
+        self.comments_per_training = comments_per_training
+        self.user_latency = user_latency
+        self.goals_latency = goals_latency
+        self.mix = mix or DEFAULT_MIX
+        self.mongo_uri = mongo_uri
+        self.seed = seed
+
+    def dict(self):
+        return dict(vars(self))
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list"""
+
+    if not sorted_values:
+        return 0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def seed_database(database, config: LoadConfig, rnd: random.Random):
+    trainers = [ObjectId() for _ in range(max(1, config.trainings // 10))]
+    trainings = []
+    for i in range(config.trainings):
+        trainings.append(
+            {
+                "id_trainer": rnd.choice(trainers),
+                "title": f"Training {i}",
+                "description": "Load test training",
+                "type": rnd.choice(["Walking", "Running", "Yoga"]),
+                "difficulty": rnd.randint(1, 5),
+                "media": [],
+                "goals": [
+                    {
+                        "title": "Goal",
+                        "description": "Goal",
+                        "metric": "Steps",
+                        "quantity_steps": 100,
+                    }
+                ],
+                "blocked": False,
+                "scores": [],
+                "comments": [
+                    {"id": ObjectId(), "id_user": ObjectId(), "detail": "comment"}
+                    for _ in range(config.comments_per_training)
+                ],
+            }
+        )
+    return database["trainings"].insert_many(trainings).inserted_ids
+
+
+def open_database(config: LoadConfig):
+    if config.mongo_uri:
+        client = pymongo.MongoClient(config.mongo_uri)
+        client.drop_database("training_microservice_load")
+        return client["training_microservice_load"]
+    return mongomock.MongoClient()["training_microservice_load"]
+
+
+async def virtual_user(client, config, training_ids, deadline, samples, rnd):
+    token = SettingsAuth.generate_token_with_role(str(ObjectId()), UserRoles.ATLETA)
+    headers = {"Authorization": f"Bearer {token}"}
+    while time.monotonic() < deadline:
+        scenario = choose(config.mix, rnd)
+        for route, method, path, body in scenario(rnd.choice(training_ids), rnd):
+            start = time.perf_counter()
+            try:
+                response = await client.request(
+                    method, path, json=body, headers=headers
+                )
+                status_code = response.status_code
+            except Exception:
+                status_code = 599
+            samples.append((route, time.perf_counter() - start, status_code))
+
+
+def summarize(samples, elapsed):
+    routes = {}
+    for route, latency, status_code in samples:
+        stats = routes.setdefault(route, {"latencies": [], "status_codes": {}})
+        stats["latencies"].append(latency * 1000)
+        code = str(status_code)
+        stats["status_codes"][code] = stats["status_codes"].get(code, 0) + 1
+
+    summary = {}
+    for route, stats in sorted(routes.items()):
+        latencies = sorted(stats["latencies"])
+        summary[route] = {
+            "count": len(latencies),
+            "errors": sum(
+                count
+                for code, count in stats["status_codes"].items()
+                if int(code) >= 500
+            ),
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "status_codes": stats["status_codes"],
+        }
+    return summary
+
+
+def startup_steps():
+    """The steps of the startup of the app (pooled clients, publisher thread,
+    rankings...) but the connection to MongoDB: the harness brings its own
+    database"""
+
+    lifecycle = Lifecycle(stop_timeout=main.lifecycle.stop_timeout)
+    lifecycle.steps = [step for step in main.lifecycle.steps if step.name != "mongo"]
+    return lifecycle
+
+
+async def run_load(config: LoadConfig):
+    """Boot the app against the database and fake services, drive the mix of
+    scenarios for "duration" seconds and return the results as a dict"""
+
+    rnd = random.Random(config.seed)
+    users = FakeServer(FakeUsersService(config.user_latency).app).start()
+    goals = FakeServer(FakeGoalsService(config.goals_latency).app).start()
+
+    previous = (
+        app.__dict__.get("database"),
+        services.app_settings.USER_SERVICE_URL,
+        services.app_settings.GOALS_SERVICE_URL,
+        publisher_middleware.publisher,
+        publisher_thread.publisher_thread,
+        logger.level,
+    )
+    # the publisher thread of the app, publishing to a broker in memory
+    broker = FakeBroker()
+    publisher = publisher_thread.PublisherThread(
+        broker,
+        flush_interval=int(main.app_settings.PUBLISHER_FLUSH_INTERVAL_MS) / 1000,
+        max_pending=int(main.app_settings.PUBLISHER_MAX_PENDING),
+    )
+    lifecycle = startup_steps()
+    try:
+        app.database = open_database(config)
+        app.logger = logger
+        training_ids = seed_database(app.database, config, rnd)
+        services.app_settings.USER_SERVICE_URL = users.url
+        services.app_settings.GOALS_SERVICE_URL = goals.url
+        publisher_thread.publisher_thread = publisher
+        publisher_middleware.publisher = publisher
+        logger.setLevel(logging.WARNING)
+        await lifecycle.start()
+
+        samples = []
+        async with httpx.AsyncClient(app=app, base_url="http://load") as client:
+            start = time.monotonic()
+            deadline = start + config.duration
+            await asyncio.gather(
+                *[
+                    virtual_user(
+                        client,
+                        config,
+                        training_ids,
+                        deadline,
+                        samples,
+                        random.Random(rnd.random()),
+                    )
+                    for _ in range(config.concurrency)
+                ]
+            )
+            elapsed = time.monotonic() - start
+    finally:
+        await lifecycle.stop()
+        (
+            app.database,
+            services.app_settings.USER_SERVICE_URL,
+            services.app_settings.GOALS_SERVICE_URL,
+            publisher_middleware.publisher,
+            publisher_thread.publisher_thread,
+            level,
+        ) = previous
+        logger.setLevel(level)
+        users.stop()
+        goals.stop()
+
+    return {
+        "datetime": datetime.utcnow().isoformat(),
+        "config": config.dict(),
+        "elapsed_s": round(elapsed, 3),
+        "total_requests": len(samples),
+        "rps": round(len(samples) / elapsed, 2),
+        "messages_published": len(broker.messages),
+        "routes": summarize(samples, elapsed),
+    }
+
+
+def save_results(results, path):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def compare_results(baseline, current, tolerance: float = 0.2):
+    """Routes whose p95 got worse, or whose rps dropped, more than "tolerance"
+    (a fraction) against the baseline results"""
+
+    regressions = []
+    for route, base in baseline["routes"].items():
+        now = current["routes"].get(route)
+        if now is None:
+            continue
+        if base["p95_ms"] and now["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f'{route}: p95 {base["p95_ms"]}ms -> {now["p95_ms"]}ms')
+        if base["rps"] and now["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f'{route}: rps {base["rps"]} -> {now["rps"]}')
+    return regressions
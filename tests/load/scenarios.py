@@ -0,0 +1,83 @@
+import random
+
+# Each scenario is a list of requests that a virtual user sends one after
+# the other. A request is (route label, method, path, body); the path can use
+# {training_id} of a random training. Scenarios are weighted to build the mix,
+# and their random values come from "rnd", so a seed repeats the same run.
+
+
+def browse(training_id, rnd=random):
+    return [
+        ("GET /trainings/", "GET", "/trainings/?limit=64", None),
+    ]
+
+
+def detail(training_id, rnd=random):
+    return [
+        ("GET /trainings/{id}", "GET", f"/trainings/{training_id}", None),
+    ]
+
+
+def score(training_id, rnd=random):
+    return [
+        (
+            "POST /trainings/{id}/score",
+            "POST",
+            f"/trainings/{training_id}/score",
+            {"qualification": rnd.randint(1, 5)},
+        ),
+    ]
+
+
+def comment(training_id, rnd=random):
+    return [
+        (
+            "POST /trainings/{id}/comment",
+            "POST",
+            f"/trainings/{training_id}/comment",
+            {"detail": "Load test comment"},
+        ),
+    ]
+
+
+def start_stop(training_id, rnd=random):
+    path = f"/athletes/me/trainings/{training_id}"
+    return [
+        ("PATCH /athletes/me/trainings/{id}/start", "PATCH", f"{path}/start", None),
+        ("PATCH /athletes/me/trainings/{id}/stop", "PATCH", f"{path}/stop", None),
+    ]
+
+
+SCENARIOS = {
+    "browse": browse,
+    "detail": detail,
+    "score": score,
+    "comment": comment,
+    "start_stop": start_stop,
+}
+
+# Realistic mix: mostly reads, some feedback and some athletes training
+DEFAULT_MIX = {
+    "browse": 30,
+    "detail": 40,
+    "score": 10,
+    "comment": 10,
+    "start_stop": 10,
+}
+
+
+def parse_mix(mix: str):
+    """Parse a mix like "browse=30,detail=40" into a dict of weights"""
+
+    weights = {}
+    for item in mix.split(","):
+        name, weight = item.split("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name}")
+        weights[name] = int(weight)
+    return weights
+
+
+def choose(mix, rnd=random):
+    names = list(mix.keys())
+    return SCENARIOS[rnd.choices(names, weights=[mix[name] for name in names])[0]]
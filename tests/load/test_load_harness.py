@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+import pytest
+import app.publisher.publisher_thread as publisher_thread
+import app.services as services
+from tests.load.harness import (
+    LoadConfig,
+    compare_results,
+    percentile,
+    run_load,
+    startup_steps,
+)
+from tests.load.scenarios import score
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0
+
+
+def test_compare_results_detects_regressions():
+    baseline = {"routes": {"GET /trainings/": {"p95_ms": 10, "rps": 100}}}
+    current = {"routes": {"GET /trainings/": {"p95_ms": 20, "rps": 50}}}
+    assert len(compare_results(baseline, current)) == 2
+    assert compare_results(baseline, baseline) == []
+
+
+@pytest.mark.asyncio
+async def test_run_load_smoke():
+    config = LoadConfig(
+        duration=1,
+        concurrency=2,
+        trainings=5,
+        comments_per_training=0,
+        mix={"detail": 3, "start_stop": 1},
+        user_latency=0.001,
+        goals_latency=0.001,
+    )
+    previous_publisher = publisher_thread.publisher_thread
+    results = await run_load(config)
+
+    assert results["total_requests"] > 0
+    # the startup steps were stopped: the pooled clients closed and the
+    # publisher thread of the app restored
+    assert services.http_clients == {}
+    assert publisher_thread.publisher_thread is previous_publisher
+    assert "GET /trainings/{id}" in results["routes"]
+    for stats in results["routes"].values():
+        assert stats["errors"] == 0
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+
+
+def test_load_runs_the_startup_steps_but_mongo():
+    names = [step.name for step in startup_steps().steps]
+    assert "http_clients" in names
+    assert "publisher" in names
+    assert "mongo" not in names
+
+
+def test_scenarios_use_the_random_of_the_run():
+    rnd = SimpleNamespace(randint=lambda low, high: high)
+
+    [(_, _, _, body)] = score("1", rnd)
+    assert body == {"qualification": 5}
@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.main import app  # noqa: F401
+from app.lifecycle import (
+    COLD_START_SECONDS,
+    STARTUP_STEP_SECONDS,
+    FirstByteMiddleware,
+    Lifecycle,
+)
+
+
+def recording_lifecycle(events, failing=None, required=False):
+    lifecycle = Lifecycle()
+
+    def step(name):
+        async def start():
+            if name == failing:
+                raise RuntimeError(f'{name} is down')
+            events.append(f'start {name}')
+
+        async def stop():
+            events.append(f'stop {name}')
+
+        lifecycle.step(name, start, stop, required=required and name == failing)
+
+    for name in ("database", "clients", "workers"):
+        step(name)
+    return lifecycle
+
+
+@pytest.mark.asyncio
+async def test_steps_start_in_order_and_stop_in_reverse():
+    events = []
+    lifecycle = recording_lifecycle(events)
+
+    await lifecycle.start()
+    await lifecycle.stop()
+
+    assert events == [
+        "start database",
+        "start clients",
+        "start workers",
+        "stop workers",
+        "stop clients",
+        "stop database",
+    ]
+    assert STARTUP_STEP_SECONDS.value("clients") >= 0
+    assert COLD_START_SECONDS.value("ready") > 0
+
+
+@pytest.mark.asyncio
+async def test_optional_step_failing_is_skipped():
+    events = []
+    lifecycle = recording_lifecycle(events, failing="clients")
+
+    await lifecycle.start()
+    await lifecycle.stop()
+
+    assert events == [
+        "start database",
+        "start workers",
+        "stop workers",
+        "stop database",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_required_step_failing_stops_the_started_ones():
+    events = []
+    lifecycle = recording_lifecycle(events, failing="clients", required=True)
+
+    with pytest.raises(RuntimeError):
+        await lifecycle.start()
+
+    assert events == ["start database", "stop database"]
+    assert lifecycle.started == []
+
+
+@pytest.mark.asyncio
+async def test_cancelled_startup_stops_the_started_steps():
+    events = []
+    lifecycle = Lifecycle()
+    blocked = asyncio.Event()
+
+    async def start_database():
+        events.append("start database")
+
+    async def stop_database():
+        events.append("stop database")
+
+    async def start_clients():
+        blocked.set()
+        await asyncio.sleep(10)
+
+    lifecycle.step("database", start_database, stop_database)
+    lifecycle.step("clients", start_clients)
+    startup = asyncio.ensure_future(lifecycle.start())
+    await blocked.wait()
+    startup.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await startup
+    assert events == ["start database", "stop database"]
+    assert lifecycle.started == []
+
+
+@pytest.mark.asyncio
+async def test_slow_optional_step_is_skipped_after_its_timeout():
+    lifecycle = Lifecycle()
+
+    async def slow():
+        await asyncio.sleep(10)
+
+    lifecycle.step("rankings", slow, timeout=0.01)
+    await asyncio.wait_for(lifecycle.start(), timeout=1)
+
+    assert lifecycle.started == []
+
+
+def test_first_byte_is_reported_once(monkeypatch):
+    lifecycle = Lifecycle()
+    reported = []
+    monkeypatch.setattr(lifecycle, "first_byte", lambda: reported.append(True))
+    first = FastAPI()
+    first.add_middleware(FirstByteMiddleware, lifecycle=lifecycle)
+
+    @first.get("/")
+    async def root():
+        return "root"
+
+    client = TestClient(first)
+    assert client.get("/").status_code == 200
+    assert client.get("/").status_code == 200
+    assert reported == [True]
@@ -0,0 +1,82 @@
+import asyncio
+import inspect
+import os
+import sys
+import time
+import pytest
+from starlette.requests import Request
+from app.main import app
+from app.monitoring.loop_watchdog import EVENT_LOOP_BLOCKED, LoopWatchdog
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_reports_blocking_call_site():
+    watchdog = LoopWatchdog(threshold=0.1, interval=0.02, directory=TESTS_DIRECTORY)
+    watchdog.start()
+    try:
+        await asyncio.sleep(0.05)
+        blocking_call()
+        await asyncio.sleep(0.1)
+    finally:
+        watchdog.stop()
+
+    assert len(watchdog.reports) == 1
+    report = watchdog.reports[0]
+    assert report["blocked_ms"] >= 100
+    assert report["call_site"] == "blocking_call"
+    # the line of time.sleep, the first one of the body of blocking_call
+    line = inspect.getsourcelines(blocking_call)[1] + 1
+    assert report["location"].endswith(f'test_loop_watchdog.py:{line}')
+    assert EVENT_LOOP_BLOCKED.value("unknown", "blocking_call") >= 1
+
+
+@pytest.mark.asyncio
+async def test_watchdog_does_not_report_a_healthy_loop():
+    watchdog = LoopWatchdog(threshold=0.1, interval=0.02)
+    watchdog.start()
+    try:
+        for _ in range(5):
+            await asyncio.sleep(0.02)
+    finally:
+        watchdog.stop()
+
+    assert len(watchdog.reports) == 0
+
+
+def test_describe_reports_the_last_frame_and_its_callee():
+    def handler():
+        return LoopWatchdog.describe(sys._getframe(), TESTS_DIRECTORY)
+
+    route, call_site, location = handler()
+    assert route == "unknown"
+    assert call_site == "handler"
+
+
+def describe_route(scope):
+    def handler(request):
+        return LoopWatchdog.describe(sys._getframe(), TESTS_DIRECTORY)
+
+    route, _, _ = handler(Request(scope))
+    return route
+
+
+def test_describe_labels_the_route_by_its_template():
+    endpoint = next(
+        route.endpoint
+        for route in app.routes
+        if getattr(route, "path", None) == "/trainings/{training_id}/statistics"
+    )
+    scope = {"type": "http", "app": app, "endpoint": endpoint}
+    assert describe_route(scope) == "/trainings/{training_id}/statistics"
+
+
+def test_describe_labels_unmatched_requests_with_a_fixed_route():
+    # a scanner probing urls must not create one series per url
+    scope = {"type": "http", "app": app, "path": "/wp-admin/setup.php"}
+    assert describe_route(scope) == "unmatched"
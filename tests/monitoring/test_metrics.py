@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+from bson import ObjectId
+import mongomock
+import pytest
+from requests.models import Response
+from fastapi.testclient import TestClient
+from app.main import app, logger
+from app.monitoring.metrics import (
+    HTTP_REQUEST_DURATION,
+    MONGO_OPERATIONS,
+    UPSTREAM_ERRORS,
+    Registry,
+)
+from app.monitoring.metrics_mongo import MongoMetricsListener
+from app.services import ServiceUsers
+
+client = TestClient(app)
+
+
+async def mock_get_fail(*args, **kwargs):
+    response = Response()
+    response.status_code = 503
+    return response
+
+
+@pytest.fixture()
+def mongo_mock(monkeypatch):
+    db = mongomock.MongoClient().get_database("training_microservice")
+    app.logger = logger
+    monkeypatch.setattr(app, "database", db, raising=False)
+
+
+def test_histogram_render_is_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency", "Latency", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+
+    text = registry.render()
+    assert '# TYPE latency histogram' in text
+    assert 'latency_bucket{route="/a",le="0.1"} 1' in text
+    assert 'latency_bucket{route="/a",le="1"} 2' in text
+    assert 'latency_bucket{route="/a",le="+Inf"} 3' in text
+    assert 'latency_count{route="/a"} 3' in text
+
+
+def test_counter_and_gauge_with_callback_render():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events", ("action",))
+    counter.inc("start")
+    counter.inc("start", amount=2)
+    registry.gauge("depth", "Depth", callback=lambda: {(): 7})
+
+    text = registry.render()
+    assert 'events_total{action="start"} 3' in text
+    assert 'depth 7' in text
+
+
+def test_metrics_endpoint_labels_requests_by_route_template(mongo_mock):
+    training_id = str(ObjectId())
+    before = HTTP_REQUEST_DURATION.count(
+        "GET", "/trainings/{training_id}/statistics", 404
+    )
+
+    response = client.get(f"/trainings/{training_id}/statistics")
+    assert response.status_code == 404
+
+    assert (
+        HTTP_REQUEST_DURATION.count("GET", "/trainings/{training_id}/statistics", 404)
+        == before + 1
+    )
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/trainings/{training_id}/statistics"' in response.text
+    assert training_id not in response.text
+    assert "publisher_unconfirmed_messages" in response.text
+
+
+def test_mongo_listener_counts_operations_by_collection():
+    listener = MongoMetricsListener()
+    before = MONGO_OPERATIONS.value("trainings", "find", "success")
+
+    listener.started(
+        SimpleNamespace(
+            command={"find": "trainings", "filter": {}},
+            command_name="find",
+            connection_id=("localhost", 27017),
+            request_id=1,
+        )
+    )
+    listener.succeeded(
+        SimpleNamespace(
+            command_name="find",
+            connection_id=("localhost", 27017),
+            request_id=1,
+            duration_micros=1500,
+        )
+    )
+
+    assert MONGO_OPERATIONS.value("trainings", "find", "success") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_upstream_errors_are_counted(monkeypatch):
+    monkeypatch.setattr("app.services.httpx.AsyncClient.get", mock_get_fail)
+    before = UPSTREAM_ERRORS.value("users", "GET")
+
+    response = await ServiceUsers.get("/users/1")
+
+    assert response.status_code == 503
+    assert UPSTREAM_ERRORS.value("users", "GET") == before + 1
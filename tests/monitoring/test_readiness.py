@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+import mongomock
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+from fastapi.testclient import TestClient
+from app.main import app
+import app.services as services
+from app.server import cpu_count, proxy_options, workers_count
+
+
+def test_ready_only_after_warm_up(monkeypatch):
+    monkeypatch.setattr(
+        "app.main.pymongo.MongoClient", lambda *args, **kwargs: mongomock.MongoClient()
+    )
+    client = TestClient(app)
+    assert client.get("/ready").status_code == 503
+
+    with TestClient(app) as started:
+        response = started.get("/ready")
+        assert response.status_code == 200
+        indexes = app.database["athletes_states"].index_information()
+        assert len(indexes) > 1
+        assert set(services.http_clients) == {"users", "goals"}
+
+    assert client.get("/ready").status_code == 503
+    assert services.http_clients == {}
+
+
+def test_startup_fails_if_mongo_does_not_answer(monkeypatch):
+    closed = []
+
+    class UnreachableClient(mongomock.MongoClient):
+        def __init__(self, *args, **kwargs):
+            super().__init__()
+            self.admin.command = self.unreachable
+
+        def unreachable(self, *args, **kwargs):
+            raise ServerSelectionTimeoutError("mongodb:27017: timed out")
+
+        def close(self):
+            closed.append(self)
+
+    monkeypatch.setattr("app.main.pymongo.MongoClient", UnreachableClient)
+
+    with pytest.raises(ServerSelectionTimeoutError):
+        with TestClient(app):
+            pass
+    assert not app.ready
+    assert services.http_clients == {}
+    assert closed == [app.mongodb_client]
+
+
+def test_workers_from_cpu_count_unless_configured():
+    assert workers_count(SimpleNamespace(WEB_CONCURRENCY=3)) == 3
+    assert workers_count(SimpleNamespace(WEB_CONCURRENCY="0")) == cpu_count()
+    assert cpu_count() >= 1
+
+
+def test_forwarded_headers_only_from_configured_routers():
+    assert proxy_options(SimpleNamespace(FORWARDED_ALLOW_IPS="")) == {
+        "proxy_headers": False
+    }
+    assert proxy_options(SimpleNamespace(FORWARDED_ALLOW_IPS="10.1.0.1")) == {
+        "proxy_headers": True,
+        "forwarded_allow_ips": "10.1.0.1",
+    }
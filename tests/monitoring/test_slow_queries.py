@@ -0,0 +1,169 @@
+from types import SimpleNamespace
+from bson import ObjectId
+from fastapi.testclient import TestClient
+from app.main import app
+from app.config.auth_settings import SettingsAuth
+from app.trainings.models import UserRoles
+import app.monitoring.routes as routes
+from app.monitoring.slow_queries import (
+    SlowQueryLog,
+    normalize,
+    slow_queries,
+    summarize_plan,
+)
+
+client = TestClient(app)
+
+
+def bearer(role: UserRoles):
+    token = SettingsAuth.generate_token_with_role(str(ObjectId()), role)
+    return {"Authorization": f"Bearer {token}"}
+
+
+EXPLAIN_RESULT = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "id_trainer_1"},
+        }
+    },
+    "executionStats": {
+        "nReturned": 3,
+        "totalDocsExamined": 3,
+        "totalKeysExamined": 3,
+    },
+}
+
+
+class SyncExecutor:
+    def submit(self, function, *args):
+        function(*args)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.commands = []
+
+    def command(self, name, command, verbosity=None):
+        self.commands.append((name, command, verbosity))
+        return EXPLAIN_RESULT
+
+
+def run_command(listener, command_name, command, duration_ms, request_id=1):
+    listener.started(
+        SimpleNamespace(
+            command=command,
+            command_name=command_name,
+            database_name="training_microservice",
+            connection_id=("localhost", 27017),
+            request_id=request_id,
+        )
+    )
+    listener.succeeded(
+        SimpleNamespace(
+            command_name=command_name,
+            connection_id=("localhost", 27017),
+            request_id=request_id,
+            duration_micros=duration_ms * 1000,
+        )
+    )
+
+
+def test_normalize_strips_values_and_keeps_operators():
+    query = {
+        "id_trainer": ObjectId(),
+        "difficulty": {"$gte": 2},
+        "type": {"$in": ["Walking", "Running"]},
+        "$or": [{"title": "A"}, {"description": "B"}],
+    }
+
+    assert normalize(query) == {
+        "id_trainer": "?",
+        "difficulty": {"$gte": "?"},
+        "type": {"$in": "?"},
+        "$or": [{"title": "?"}, {"description": "?"}],
+    }
+
+
+def test_slow_queries_are_aggregated_by_shape_and_explained_once():
+    database = FakeDatabase()
+    listener = SlowQueryLog(threshold=0.1, executor=SyncExecutor())
+    listener.client = {"training_microservice": database}
+
+    run_command(listener, "find", {"find": "trainings", "filter": {"type": "A"}}, 150)
+    run_command(listener, "find", {"find": "trainings", "filter": {"type": "B"}}, 250)
+    run_command(listener, "find", {"find": "trainings", "filter": {"type": "C"}}, 10)
+    run_command(
+        listener, "find", {"find": "trainings", "filter": {"title": "A"}}, 120
+    )
+
+    report = listener.report()
+    assert [stats["count"] for stats in report] == [2, 1]
+    assert report[0]["collection"] == "trainings"
+    assert report[0]["shape"] == '{"filter": {"type": "?"}}'
+    assert report[0]["total_ms"] == 400
+    assert report[0]["max_ms"] == 250
+    assert report[0]["plan"] == {
+        "docs_examined": 3,
+        "keys_examined": 3,
+        "docs_returned": 3,
+        "plan": "FETCH <- IXSCAN(id_trainer_1)",
+    }
+    assert len(database.commands) == 2
+    assert database.commands[0][2] == "executionStats"
+
+
+def test_writes_are_recorded_but_not_explained():
+    database = FakeDatabase()
+    listener = SlowQueryLog(threshold=0.1, executor=SyncExecutor())
+    listener.client = {"training_microservice": database}
+
+    run_command(
+        listener,
+        "update",
+        {"update": "trainings", "updates": [{"q": {"_id": 1}, "u": {"$set": {}}}]},
+        200,
+    )
+
+    assert listener.report()[0]["shape"] == '{"q": [{"_id": "?"}]}'
+    assert database.commands == []
+
+
+def test_summarize_plan_of_collection_scan():
+    summary = summarize_plan(
+        {
+            "queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}},
+            "executionStats": {"totalDocsExamined": 1000, "nReturned": 1},
+        }
+    )
+    assert summary["plan"] == "COLLSCAN"
+    assert summary["docs_examined"] == 1000
+
+
+def test_slow_queries_endpoint(monkeypatch):
+    listener = SlowQueryLog(threshold=0.1, explain=False)
+    run_command(listener, "find", {"find": "trainings", "filter": {"type": "A"}}, 150)
+    monkeypatch.setattr(slow_queries, "shapes", listener.shapes)
+
+    monkeypatch.setattr(routes.app_settings, "SLOW_QUERY_ENABLED", True)
+
+    response = client.get("/slow-queries", headers=bearer(UserRoles.ADMIN))
+    assert response.status_code == 200
+    body = response.json()
+    assert body["shapes"][0]["shape"] == '{"filter": {"type": "?"}}'
+    assert body["shapes"][0]["average_ms"] == 150
+
+
+def test_slow_queries_endpoint_is_only_for_admins(monkeypatch):
+    monkeypatch.setattr(routes.app_settings, "SLOW_QUERY_ENABLED", True)
+
+    assert client.get("/slow-queries").status_code == 403
+    response = client.get("/slow-queries", headers=bearer(UserRoles.ATLETA))
+    assert response.status_code == 403
+
+
+def test_slow_queries_endpoint_is_off_unless_enabled(monkeypatch):
+    monkeypatch.setattr(routes.app_settings, "SLOW_QUERY_ENABLED", False)
+
+    response = client.get("/slow-queries", headers=bearer(UserRoles.ADMIN))
+    assert response.status_code == 404
@@ -0,0 +1,166 @@
+from types import SimpleNamespace
+from bson import ObjectId
+import mongomock
+import pytest
+from requests.models import Response
+from fastapi.testclient import TestClient
+from app.main import app, logger
+from app.monitoring.tracing import (
+    MongoTracingListener,
+    Tracer,
+    TracingMiddleware,
+    parse_traceparent,
+)
+
+trainer_id = str(ObjectId())
+sent_headers = []
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.traces = []
+
+    def export(self, spans):
+        self.traces.append([span.dict() for span in spans])
+
+
+async def mock_get(*args, **kwargs):
+    sent_headers.append(kwargs.get("headers") or {})
+    response = Response()
+    response.status_code = 200
+    response.json = lambda: {"id": trainer_id, "name": "Juan", "lastname": "Perez"}
+    return response
+
+
+@pytest.fixture()
+def mongo_mock(monkeypatch):
+    db = mongomock.MongoClient().get_database("training_microservice")
+    training_id = db["trainings"].insert_one(
+        {
+            "id_trainer": ObjectId(trainer_id),
+            "title": "A",
+            "description": "string",
+            "type": "Walking",
+            "difficulty": 1,
+            "media": [],
+            "blocked": False,
+            "scores": [],
+            "comments": [],
+        }
+    ).inserted_id
+    app.logger = logger
+    monkeypatch.setattr(app, "database", db, raising=False)
+    monkeypatch.setattr("app.services.httpx.AsyncClient.get", mock_get)
+    sent_headers.clear()
+    return str(training_id)
+
+
+def traced_client(sample_rate, trusted_upstreams=()):
+    exporter = MemoryExporter()
+    tracer = Tracer(
+        exporter=exporter,
+        sample_rate=sample_rate,
+        trusted_upstreams=trusted_upstreams,
+    )
+    return TestClient(TracingMiddleware(app, tracer=tracer)), exporter
+
+
+def test_parse_traceparent():
+    trace_id, span_id = "a" * 32, "b" * 16
+    assert parse_traceparent(f"00-{trace_id}-{span_id}-01") == (
+        trace_id,
+        span_id,
+        True,
+    )
+    assert parse_traceparent(f"00-{trace_id}-{span_id}-00")[2] is False
+    assert parse_traceparent("00-xyz-abc-01") is None
+    assert parse_traceparent(None) is None
+
+
+def test_sampled_request_exports_spans_and_propagates_trace_id(mongo_mock):
+    client, exporter = traced_client(sample_rate=1)
+
+    response = client.get(f"/trainings/{mongo_mock}?map_states=false")
+    assert response.status_code == 200
+
+    assert len(exporter.traces) == 1
+    root, *children = exporter.traces[0]
+    assert root["name"] == "GET /trainings/{training_id}"
+    assert root["parent_id"] is None
+    assert root["attributes"]["status_code"] == 200
+    users = [span for span in children if span["name"] == "users GET"]
+    assert len(users) == 1
+    assert users[0]["parent_id"] == root["span_id"]
+    assert users[0]["trace_id"] == root["trace_id"]
+
+    assert sent_headers[0]["traceparent"] == (
+        f'00-{root["trace_id"]}-{users[0]["span_id"]}-01'
+    )
+
+
+def test_not_sampled_request_is_not_traced(mongo_mock):
+    client, exporter = traced_client(sample_rate=0)
+
+    response = client.get(f"/trainings/{mongo_mock}?map_states=false")
+    assert response.status_code == 200
+
+    assert exporter.traces == []
+    assert "traceparent" not in sent_headers[0]
+
+
+def test_incoming_sampled_trace_is_continued(mongo_mock):
+    # TestClient requests come from "testclient"
+    client, exporter = traced_client(sample_rate=0, trusted_upstreams={"testclient"})
+    trace_id, parent_id = "1" * 32, "2" * 16
+
+    client.get(
+        f"/trainings/{mongo_mock}?map_users=false&map_states=false",
+        headers={"traceparent": f"00-{trace_id}-{parent_id}-01"},
+    )
+
+    root = exporter.traces[0][0]
+    assert root["trace_id"] == trace_id
+    assert root["parent_id"] == parent_id
+
+
+def test_sampled_flag_of_untrusted_clients_is_capped_by_the_rate(mongo_mock):
+    client, exporter = traced_client(sample_rate=0)
+
+    client.get(
+        f"/trainings/{mongo_mock}?map_users=false&map_states=false",
+        headers={"traceparent": f"00-{'1' * 32}-{'2' * 16}-01"},
+    )
+
+    assert exporter.traces == []
+
+
+def test_mongo_listener_opens_child_spans_of_the_current_span():
+    exporter = MemoryExporter()
+    tracer = Tracer(exporter=exporter, sample_rate=1)
+    listener = MongoTracingListener()
+    root = tracer.start_trace("GET /trainings/")
+
+    with tracer.activate(root):
+        listener.started(
+            SimpleNamespace(
+                command={"find": "trainings", "filter": {}},
+                command_name="find",
+                connection_id=("localhost", 27017),
+                request_id=1,
+            )
+        )
+    listener.succeeded(
+        SimpleNamespace(
+            command_name="find",
+            connection_id=("localhost", 27017),
+            request_id=1,
+            duration_micros=1500,
+        )
+    )
+    tracer.end_trace(root)
+
+    mongo = exporter.traces[0][1]
+    assert mongo["name"] == "mongo find"
+    assert mongo["attributes"]["collection"] == "trainings"
+    assert mongo["parent_id"] == root.span_id
+    assert mongo["duration_ms"] == 1.5
@@ -0,0 +1,44 @@
+from app.main import app  # noqa: F401
+from app.publisher.aggregation import Aggregator, parse_actions
+
+
+def message(action, training_type="Running", status_code="200", second="00"):
+    return {
+        "action": action,
+        "training_type": training_type,
+        "status_code": status_code,
+        "datetime": f'2023-05-01 12:00:{second}.000000',
+        "response_time": "0.5",
+    }
+
+
+def test_parse_actions():
+    assert parse_actions(" media_upload,, delete_training") == {
+        "media_upload",
+        "delete_training",
+    }
+    assert parse_actions("") == set()
+
+
+def test_messages_are_counted_by_action_type_status_and_minute():
+    aggregator = Aggregator(raw_actions={"media_upload"})
+
+    for second in ("01", "30", "59"):
+        assert aggregator.add(message("new_training", second=second))
+    assert aggregator.add(message("new_training", status_code="500"))
+    assert aggregator.add(message("new_training", training_type="Yoga"))
+    assert not aggregator.add(message("media_upload"))
+
+    aggregates = aggregator.flush()
+    assert len(aggregates) == 3
+    assert aggregates[0] == {
+        "service": "training-service",
+        "action": "new_training",
+        "training_type": "Running",
+        "status_code": "200",
+        "minute": "2023-05-01 12:00",
+        "count": 3,
+        "response_time_total": 1.5,
+        "response_time_max": 0.5,
+    }
+    assert aggregator.flush() == []
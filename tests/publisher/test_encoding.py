@@ -0,0 +1,91 @@
+import pytest
+from app.main import app  # noqa: F401
+from app.publisher.encoding import (
+    BATCH_JSON,
+    JSON,
+    MessageEncoder,
+    SCHEMA_FIELDS,
+    decode,
+)
+
+
+def event(number: int):
+    return {
+        "service": "training-service",
+        "path": f'/trainings/{number}',
+        "url": f'http://training-microservice:7501/trainings/{number}?map_users=true',
+        "method": "GET",
+        "status_code": "200",
+        "datetime": "2023-05-01 12:00:00.000000",
+        "response_time": "0.01",
+        "user_id": "6441a9e0f1b2c3d4e5f6a7b8",
+        "ip": "10.0.0.1",
+        "country": "",
+        "action": "get_training",
+        "training_id": f'{number}',
+        "training_type": "Running",
+    }
+
+
+def expected(message: dict):
+    compacted = {field: message.get(field) for field in SCHEMA_FIELDS}
+    compacted["query"] = "map_users=true"
+    compacted["service"] = message["service"]
+    return compacted
+
+
+def properties_of(properties: dict):
+    return {
+        "content_type": properties["content_type"],
+        "content_encoding": properties.get("content_encoding"),
+    }
+
+
+def test_json_is_one_event_per_message():
+    messages = [event(1), event(2)]
+    encoded = MessageEncoder().encode(messages)
+
+    assert len(encoded) == 2
+    body, properties = encoded[0]
+    assert properties == {"content_type": JSON, "headers": {"events": 1}}
+    assert decode(body, properties["content_type"]) == [messages[0]]
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_schema_batches_many_events_per_message(compression):
+    messages = [event(number) for number in range(250)]
+    encoded = MessageEncoder("schema", compression, batch_size=100).encode(messages)
+
+    assert [properties["headers"]["events"] for _, properties in encoded] == [
+        100,
+        100,
+        50,
+    ]
+    decoded = []
+    for body, properties in encoded:
+        assert properties["content_type"] == BATCH_JSON
+        assert properties.get("content_encoding") == (
+            None if compression == "none" else compression
+        )
+        decoded += decode(body, **properties_of(properties))
+    assert decoded == [expected(message) for message in messages]
+
+    json_bytes = sum(len(body) for body, _ in MessageEncoder().encode(messages))
+    assert sum(len(body) for body, _ in encoded) < json_bytes / 2
+
+
+def test_msgpack_and_zstd_are_optional():
+    for module, options in (
+        ("msgpack", ("msgpack",)),
+        ("zstandard", ("schema", "zstd")),
+    ):
+        try:
+            __import__(module)
+        except ImportError:
+            with pytest.raises(ValueError):
+                MessageEncoder(*options)
+            continue
+        messages = [event(1), event(2)]
+        [(body, properties)] = MessageEncoder(*options).encode(messages)
+        decoded = decode(body, **properties_of(properties))
+        assert decoded == [expected(message) for message in messages]
@@ -0,0 +1,51 @@
+import logging
+from fastapi import Request, Response
+from app.publisher.message_queue import MessageQueueFrom, MessagesQueueFrom
+
+
+def bulk_request(**state):
+    return Request(
+        {
+            "type": "http",
+            "method": "POST",
+            "path": "/trainings/bulk",
+            "query_string": b"",
+            "headers": [],
+            "scheme": "http",
+            "server": ("test", 80),
+            "client": ("10.0.0.1", 1234),
+            "state": state,
+        }
+    )
+
+
+def test_batch_logs_one_summary_of_the_missing_fields(caplog):
+    request = bulk_request(
+        user_id="u1",
+        trainings=[(f"t{index}", "Running") for index in range(100)],
+    )
+
+    with caplog.at_level(logging.DEBUG, logger="app"):
+        messages = MessagesQueueFrom(request, Response(status_code=201), 0, 0.1)
+
+    assert [message["training_id"] for message in messages] == [
+        f"t{index}" for index in range(100)
+    ]
+    assert {message["user_id"] for message in messages} == {"u1"}
+    assert {message["action"] for message in messages} == {""}
+    [record] = caplog.records
+    assert record.levelno == logging.DEBUG
+    assert record.getMessage() == (
+        "100 message(s) of POST /trainings/bulk without action"
+    )
+
+
+def test_message_sends_the_missing_fields_empty():
+    request = bulk_request(user_id="u1", action="start")
+
+    message = MessageQueueFrom(request, Response(status_code=200), 0, 0.1)
+
+    assert message["user_id"] == "u1"
+    assert message["action"] == "start"
+    assert message["training_id"] == ""
+    assert message["training_type"] == ""
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from app.main import app  # noqa: F401
+from app.publisher.publisher_process import (
+    PUBLISHER_DROPPED,
+    PublisherServer,
+    SocketPublisher,
+)
+from tests.load.fakes import FakeBroker
+
+
+async def wait_for(condition, timeout: float = 2):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_workers_messages_reach_the_single_publisher(tmp_path):
+    path = str(tmp_path / "publisher.sock")
+    broker = FakeBroker()
+    server = PublisherServer(path, broker, batch_size=2)
+    server.start(asyncio.get_running_loop())
+
+    workers = [SocketPublisher(path) for _ in range(3)]
+    for number, worker in enumerate(workers):
+        worker.publish_message({"action": "start", "worker": number})
+        worker.publish_message({"action": "finish", "worker": number})
+
+    await wait_for(lambda: len(broker.messages) == 6)
+    assert server.received == 6
+    assert {message["worker"] for message in broker.messages} == {0, 1, 2}
+
+    server.stop()
+    for worker in workers:
+        worker.close()
+
+
+@pytest.mark.asyncio
+async def test_socket_is_not_read_until_the_publisher_is_ready(tmp_path):
+    path = str(tmp_path / "publisher.sock")
+    broker = FakeBroker(ready=False)
+    server = PublisherServer(path, broker, retry_interval=0.01)
+    server.start(asyncio.get_running_loop())
+    worker = SocketPublisher(path)
+
+    worker.publish_message({"action": "start"})
+    await asyncio.sleep(0.05)
+    assert broker.messages == []
+
+    broker.ready = True
+    await wait_for(lambda: len(broker.messages) == 1)
+    server.stop()
+    worker.close()
+
+
+def test_messages_are_dropped_without_publisher(tmp_path):
+    worker = SocketPublisher(str(tmp_path / "missing.sock"))
+    before = PUBLISHER_DROPPED.value("unavailable")
+
+    worker.publish_message({"action": "start"})
+
+    assert PUBLISHER_DROPPED.value("unavailable") == before + 1
+    worker.close()
@@ -0,0 +1,153 @@
+import time
+from collections import OrderedDict, deque
+from types import SimpleNamespace
+import pytest
+from app.main import app  # noqa: F401
+from app.publisher.aggregation import Aggregator
+from app.publisher.encoding import AGGREGATES_JSON, decode
+from app.publisher.publisher_queue import PUBLISHER_REPUBLISHED, PublisherQueue
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.published = []
+        self.content_types = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        messages = decode(body, properties.content_type)
+        self.content_types.append(properties.content_type)
+        self.published.append(messages if len(messages) > 1 else messages[0]["number"])
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeConnection:
+    """Keeps the callbacks of call_later instead of running them"""
+
+    def __init__(self):
+        self.ioloop = self
+        self.later = []
+        self.is_closed = False
+
+    def call_later(self, delay, callback, *args):
+        self.later.append((callback, args))
+        return SimpleNamespace(cancel=lambda: None)
+
+    def run_later(self):
+        later, self.later = self.later, []
+        for callback, args in later:
+            callback(*args)
+
+    def close(self):
+        self.is_closed = True
+
+
+def confirmation(kind: str, delivery_tag: int, multiple: bool = False):
+    return SimpleNamespace(
+        method=SimpleNamespace(
+            NAME=f'Basic.{kind}', delivery_tag=delivery_tag, multiple=multiple
+        )
+    )
+
+
+@pytest.fixture
+def publisher():
+    publisher = PublisherQueue("amqp://localhost")
+    saved = dict(vars(publisher))
+    publisher._channel = FakeChannel()
+    publisher._connection = FakeConnection()
+    publisher._timers = {}
+    publisher._publishing = True
+    publisher._deliveries = OrderedDict()
+    publisher._outgoing = deque()
+    publisher._acked = publisher._nacked = publisher._message_number = 0
+    publisher._max_in_flight = 3
+    publisher._confirm_timeout = 30
+    publisher._aggregator = None
+    yield publisher
+    vars(publisher).update(saved)
+
+
+def test_window_of_messages_not_confirmed_is_bounded(publisher):
+    publisher.publish_messages([{"number": number} for number in range(5)])
+
+    assert publisher._channel.published == [0, 1, 2]
+    assert not publisher.is_ready()
+
+    publisher.on_delivery_confirmation(confirmation("Ack", 2, multiple=True))
+    assert publisher._acked == 2
+    assert publisher._channel.published == [0, 1, 2, 3, 4]
+    assert list(publisher._deliveries) == [3, 4, 5]
+    assert publisher.is_ready()
+
+
+def test_nacked_messages_are_published_again(publisher):
+    before = PUBLISHER_REPUBLISHED.value("nack")
+    publisher.publish_messages([{"number": number} for number in range(3)])
+
+    publisher.on_delivery_confirmation(confirmation("Nack", 2))
+    publisher.on_delivery_confirmation(confirmation("Ack", 3))
+
+    assert publisher._channel.published == [0, 1, 2, 1]
+    assert list(publisher._deliveries) == [1, 4]
+    assert PUBLISHER_REPUBLISHED.value("nack") == before + 1
+
+
+def test_messages_not_confirmed_in_time_are_published_again(publisher):
+    publisher.publish_messages([{"number": number} for number in range(2)])
+    sent_at = publisher._deliveries[1][2]
+
+    publisher.check_timeouts(now=sent_at + 10)
+    assert publisher._channel.published == [0, 1]
+
+    publisher.check_timeouts(now=sent_at + 31)
+    assert publisher._channel.published == [0, 1, 0, 1]
+    assert list(publisher._deliveries) == [3, 4]
+
+
+def test_aggregated_messages_are_published_as_counts(publisher):
+    publisher._aggregator = Aggregator(raw_actions={"delete_training"})
+    publisher._max_in_flight = 10
+    messages = [
+        {"number": 0, "action": "new_training", "datetime": "2023-05-01 12:00:01"},
+        {"number": 1, "action": "new_training", "datetime": "2023-05-01 12:00:59"},
+        {"number": 2, "action": "delete_training", "datetime": "2023-05-01 12:00:59"},
+        {"number": 3, "action": "new_training", "datetime": "2023-05-01 12:01:00"},
+    ]
+    publisher.publish_messages(messages)
+    assert publisher._channel.published == [2]
+
+    publisher.publish_aggregates()
+    counts = {
+        aggregate["minute"]: aggregate["count"]
+        for aggregate in publisher._channel.published[1]
+    }
+    assert counts == {"2023-05-01 12:00": 2, "2023-05-01 12:01": 1}
+    assert publisher._channel.content_types[1] == AGGREGATES_JSON
+
+
+def test_stop_waits_for_the_messages_to_be_confirmed(publisher):
+    publisher.publish_messages([{"number": number} for number in range(2)])
+
+    publisher.stop(drain_timeout=30)
+    assert not publisher._connection.is_closed
+
+    publisher.on_delivery_confirmation(confirmation("Ack", 2, multiple=True))
+    publisher._connection.run_later()
+    assert not publisher._channel.is_open
+    assert publisher._connection.is_closed
+
+
+def test_stop_closes_after_the_drain_timeout(publisher):
+    publisher.publish_messages([{"number": number} for number in range(2)])
+
+    publisher.stop(drain_timeout=0.01)
+    assert not publisher._connection.is_closed
+
+    time.sleep(0.02)
+    publisher._connection.run_later()
+    assert list(publisher._deliveries) == [1, 2]
+    assert publisher._connection.is_closed
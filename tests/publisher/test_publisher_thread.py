@@ -0,0 +1,58 @@
+import time
+import pytest
+from app.main import app  # noqa: F401
+import app.main as main
+import app.publisher.publisher_thread as publisher_thread
+from app.publisher.publisher_thread import PUBLISHER_DROPPED_PENDING, PublisherThread
+from tests.load.fakes import FakeBroker
+
+
+def wait_for(condition, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_messages_are_published_on_the_publisher_thread():
+    broker = FakeBroker()
+    publisher = PublisherThread(broker, flush_interval=0.01)
+    publisher.start()
+
+    for number in range(100):
+        publisher.publish_message({"number": number})
+
+    wait_for(lambda: len(broker.messages) == 100)
+    assert [message["number"] for message in broker.messages] == list(range(100))
+    assert broker.threads == {"publisher"}
+
+    publisher.stop()
+    assert not publisher._thread.is_alive()
+
+
+def test_messages_wait_for_the_channel_up_to_max_pending():
+    broker = FakeBroker(ready=False)
+    publisher = PublisherThread(broker, flush_interval=0.01, max_pending=2)
+    publisher.start()
+    before = PUBLISHER_DROPPED_PENDING.value()
+
+    for number in range(3):
+        publisher.publish_message({"number": number})
+    time.sleep(0.05)
+    assert broker.messages == []
+    assert PUBLISHER_DROPPED_PENDING.value() == before + 1
+
+    broker.ready = True
+    wait_for(lambda: len(broker.messages) == 2)
+    publisher.stop()
+
+
+@pytest.mark.asyncio
+async def test_publisher_thread_is_not_built_in_socket_mode(monkeypatch):
+    monkeypatch.setattr(main.app_settings, "PUBLISHER_MODE", "socket")
+    monkeypatch.setattr(publisher_thread, "publisher_thread", None)
+
+    await main.start_publisher()
+    await main.stop_publisher()
+
+    assert publisher_thread.publisher_thread is None
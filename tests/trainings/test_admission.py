@@ -0,0 +1,107 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.main import app
+import app.admission as admission
+from app.admission import (
+    ADMISSION_REJECTED,
+    AdmissionMiddleware,
+    ConcurrencyLimit,
+    admission_in_flight,
+    parse_limits,
+    route_class_of,
+    route_template,
+)
+
+
+def class_of(method, path):
+    scope = {"type": "http", "method": method, "path": path, "app": app}
+    return route_class_of(method, route_template(scope))
+
+
+def test_routes_are_classified():
+    assert class_of("GET", "/trainings/") == "heavy_listings"
+    assert class_of("GET", "/athletes/me/trainings/") == "heavy_listings"
+    assert class_of("GET", "/trainings/6441a9e0f1b2c3d4e5f6a7b8") == "detail_reads"
+    assert class_of("POST", "/trainings/6441a9e0f1b2c3d4e5f6a7b8/score") == "writes"
+    assert (
+        class_of("PATCH", "/athletes/me/trainings/6441a9e0f1b2c3d4e5f6a7b8/start")
+        == "athlete_states"
+    )
+    assert class_of("GET", "/metrics") is None
+    assert class_of("GET", "/unknown") is None
+
+
+def test_parse_limits():
+    assert parse_limits("writes=4:8, detail_reads=2:0") == {
+        "writes": (4, 8),
+        "detail_reads": (2, 0),
+    }
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_queues_then_rejects():
+    limit = ConcurrencyLimit(limit=1, queue_size=1)
+    assert await limit.acquire(timeout=1)
+
+    waiting = asyncio.ensure_future(limit.acquire(timeout=1))
+    await asyncio.sleep(0)
+    assert limit.waiting == 1
+    assert not await limit.acquire(timeout=1)  # the queue is full
+
+    limit.release()
+    assert await waiting
+    assert limit.active == 1
+
+    assert not await limit.acquire(timeout=0.01)  # timed out in the queue
+    assert limit.waiting == 0
+    limit.release()
+    assert limit.active == 0
+
+
+@pytest.mark.asyncio
+async def test_saturated_route_class_is_rejected_with_retry_after():
+    limited = FastAPI()
+    limited.add_middleware(
+        AdmissionMiddleware,
+        limits={"writes": (1, 0), "detail_reads": (1, 0)},
+        retry_after=2,
+    )
+    release = asyncio.Event()
+
+    @limited.post("/slow")
+    async def slow():
+        await release.wait()
+        return "done"
+
+    @limited.get("/read")
+    async def read():
+        return "read"
+
+    before = ADMISSION_REJECTED.value("writes")
+    async with httpx.AsyncClient(app=limited, base_url="http://test") as client:
+        first = asyncio.ensure_future(client.post("/slow"))
+        await asyncio.sleep(0.05)
+
+        rejected = await client.post("/slow")
+        assert rejected.status_code == 503
+        assert rejected.headers["retry-after"] == "2"
+
+        # other route classes are not affected
+        assert (await client.get("/read")).status_code == 200
+
+        release.set()
+        assert (await first).status_code == 200
+
+    assert ADMISSION_REJECTED.value("writes") == before + 1
+
+
+def test_only_the_middleware_of_the_app_is_reported(monkeypatch):
+    monkeypatch.setattr(admission, "reported_limits", {})
+
+    reported = AdmissionMiddleware(None, limits={"writes": (1, 0)}, report=True)
+    AdmissionMiddleware(None, limits={"writes": (1, 0), "detail_reads": (1, 0)})
+    reported.limits["writes"].active = 1
+
+    assert admission_in_flight() == {("writes",): 1}
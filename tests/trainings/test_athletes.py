@@ -1,12 +1,15 @@
-
+import os
 from bson import ObjectId
 import mongomock
+import pymongo
 import pytest
 from requests.models import Response
 from fastapi.testclient import TestClient
 from app.main import app, logger
 from app.config.auth_settings import SettingsAuth
 from app.trainings.models import StateTraining, UserRoles
+from app.trainings.indexes import ensure_indexes
+from app.monitoring.slow_queries import summarize_plan
 from starlette import status
 
 client = TestClient(app)
@@ -399,4 +402,92 @@ def test_complete_training_init_with_role_athlete_return_training_completed_for_
     assert response.status_code == status.HTTP_200_OK
     
     response = client.get("/trainings", headers={"Authorization": f"Bearer {access_token_athlete_example}"})
-    assert response.json()[0]["state"] == StateTraining.COMPLETE.value
\ No newline at end of file
+    assert response.json()[0]["state"] == StateTraining.COMPLETE.value
+
+def test_get_my_trainings_filtered_by_state(mongo_mock):
+    trainings = app.database.get_collection("trainings")
+    athletes_states = app.database.get_collection("athletes_states")
+    id_training = trainings.find_one({"title": "A"})["_id"]
+    other = dict(training_example_mock, title="B")
+    other.pop("_id", None)
+    id_other = trainings.insert_one(other).inserted_id
+
+    user_id = ObjectId("60b9b0a9d6b9a9b3f0a1a1a1")
+    access_token_athlete_example = SettingsAuth.generate_token_with_role(str(user_id), UserRoles.ATLETA)
+    headers = {"Authorization": f"Bearer {access_token_athlete_example}"}
+
+    response = client.get("/athletes/me/trainings/", headers=headers)
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    athletes_states.insert_one({"user_id": user_id, "training_id": id_training, "state": StateTraining.INIT.value, "goals": []})
+    athletes_states.insert_one({"user_id": user_id, "training_id": id_other, "state": StateTraining.COMPLETE.value, "goals": []})
+    athletes_states.insert_one({"user_id": ObjectId(), "training_id": id_other, "state": StateTraining.INIT.value, "goals": []})
+
+    response = client.get("/athletes/me/trainings/?map_users=false", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [(training["title"], training["state"]) for training in response.json()] == [
+        ("B", StateTraining.COMPLETE.value),
+        ("A", StateTraining.INIT.value),
+    ]
+
+    response = client.get("/athletes/me/trainings/?state=INIT", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+    assert [training["title"] for training in response.json()] == ["A"]
+    assert response.json()[0]["trainer"]["name"] == "Juan"
+
+    # only the states saved for an athlete can be filtered
+    response = client.get("/athletes/me/trainings/?state=NOT_INIT", headers=headers)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = client.get("/athletes/me/trainings/?offset=1&limit=1&map_users=false", headers=headers)
+    assert [training["title"] for training in response.json()] == ["A"]
+
+    response = client.get("/athletes/me/trainings/", headers={"Authorization": f"Bearer {access_token_trainer_example}"})
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+def test_ensure_indexes_of_athletes_states(mongo_mock):
+    ensure_indexes(app.database)
+    indexes = app.database.get_collection("athletes_states").index_information()
+    assert any(
+        [key for key, _ in index["key"]][:2] == ["user_id", "state"]
+        for index in indexes.values()
+    )
+
+
+# Queries of "my trainings": (equality fields, sort)
+MY_TRAININGS_QUERIES = [
+    ({"user_id"}, ("_id", -1)),
+    ({"user_id", "state"}, ("_id", -1)),
+]
+
+
+def test_my_trainings_are_sorted_by_an_index(mongo_mock):
+    ensure_indexes(app.database)
+    indexes = app.database.get_collection("athletes_states").index_information()
+    for fields, sort in MY_TRAININGS_QUERIES:
+        # the equality fields first and then the sort: no sort in memory
+        assert any(
+            {key for key, _ in index["key"][:-1]} == fields
+            and tuple(index["key"][-1]) == sort
+            for index in indexes.values()
+        ), fields
+
+
+@pytest.mark.skipif(
+    not os.environ.get("MONGODB_TEST_URI"),
+    reason="explain needs a MongoDB (MONGODB_TEST_URI)",
+)
+def test_plans_of_my_trainings_in_mongodb():
+    client = pymongo.MongoClient(os.environ["MONGODB_TEST_URI"])
+    database = client["training_microservice_test_plans"]
+    try:
+        ensure_indexes(database)
+        states = database["athletes_states"]
+        for query in [{"user_id": ObjectId()}, {"user_id": ObjectId(), "state": "INIT"}]:
+            explain = states.find(query).sort("_id", -1).explain()
+            plan = summarize_plan(explain)["plan"]
+            assert "IXSCAN" in plan and "SORT" not in plan, plan
+    finally:
+        client.drop_database("training_microservice_test_plans")
+        client.close()
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from bson import ObjectId
+import mongomock
+import pytest
+from requests.models import Response
+from fastapi.testclient import TestClient
+from app.main import app, logger
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, breakers
+from app.services import ServiceUsers, users_breaker
+from app.trainings.models import CommentRequest
+
+client = TestClient(app)
+
+trainer_id = str(ObjectId())
+upstream_calls = []
+
+
+async def mock_get_fail(*args, **kwargs):
+    upstream_calls.append(args)
+    response = Response()
+    response.status_code = 503
+    return response
+
+
+@pytest.fixture()
+def mongo_mock(monkeypatch):
+    db = mongomock.MongoClient().get_database("training_microservice")
+    training_id = db["trainings"].insert_one(
+        {
+            "id_trainer": ObjectId(trainer_id),
+            "title": "A",
+            "description": "string",
+            "type": "Walking",
+            "difficulty": 1,
+            "media": [],
+            "blocked": False,
+            "scores": [],
+            "comments": [],
+        }
+    ).inserted_id
+    app.logger = logger
+    monkeypatch.setattr(app, "database", db, raising=False)
+    monkeypatch.setattr("app.services.httpx.AsyncClient.get", mock_get_fail)
+    upstream_calls.clear()
+    return str(training_id)
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("test", window=4, minimum_calls=4, open_seconds=0.05)
+
+    for success in (True, False, False, True):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # a single probe at once
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert set(breakers) == {"users", "goals"}
+
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = CircuitBreaker("test", window=2, minimum_calls=2, open_seconds=0.05)
+    breaker.record(False)
+    breaker.record(False)
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_without_calling_the_service(mongo_mock):
+    for _ in range(users_breaker.minimum_calls):
+        await ServiceUsers.get("/users/1")
+    assert users_breaker.state == OPEN
+    calls = len(upstream_calls)
+
+    with pytest.raises(Exception) as error:
+        await ServiceUsers.get("/users/1")
+    assert error.value.status_code == 503
+    assert len(upstream_calls) == calls
+
+
+def test_listing_degrades_to_unmapped_users_when_circuit_is_open(mongo_mock):
+    users_breaker.transition(OPEN)
+
+    response = client.get(f"/trainings/{mongo_mock}?map_states=false")
+    assert response.status_code == 200
+    assert response.json()["trainer"] == {"id": trainer_id, "unmapped": True}
+    assert upstream_calls == []
+
+    metrics = client.get("/metrics").text
+    assert 'circuit_breaker_state{service="users"} 2' in metrics
+
+
+def test_half_open_listing_probes_and_closes_the_circuit(mongo_mock, monkeypatch):
+    app.database["trainings"].update_one(
+        {"_id": ObjectId(mongo_mock)},
+        {
+            "$push": {
+                "comments": CommentRequest(detail="Nice").encode_json_with(
+                    ObjectId()
+                )
+            }
+        },
+    )
+
+    async def mock_get_user(url, *args, **kwargs):
+        await asyncio.sleep(0.01)
+        upstream_calls.append(url)
+        response = Response()
+        response.status_code = 200
+        id_user = url.split("/users/")[1].split("?")[0]
+        response.json = lambda: {"id": id_user, "name": "Juan", "lastname": "Perez"}
+        return response
+
+    monkeypatch.setattr(
+        "app.services.httpx.AsyncClient.get",
+        lambda client, url, *args, **kwargs: mock_get_user(url),
+    )
+    users_breaker.transition(OPEN)
+    users_breaker._opened_at -= users_breaker.open_seconds
+
+    # the trainer is the probe, the commenter is rejected meanwhile
+    response = client.get(f"/trainings/{mongo_mock}?map_states=false")
+    assert response.status_code == 200
+    assert response.json()["trainer"]["name"] == "Juan"
+    assert response.json()["comments"][0]["user"]["unmapped"]
+    assert users_breaker.state == CLOSED
+
+    response = client.get(f"/trainings/{mongo_mock}?map_states=false")
+    assert response.json()["comments"][0]["user"]["name"] == "Juan"
@@ -0,0 +1,172 @@
+import asyncio
+import pytest
+from requests.models import Response
+from app.main import app  # noqa: F401
+from app.hedging import (
+    HEDGES_ISSUED,
+    HEDGES_WON,
+    HedgeBudget,
+    LatencyWindow,
+    hedged,
+)
+import app.services as services
+from app.services import ServiceUsers
+
+
+def window_with_p95(latency):
+    latencies = LatencyWindow(size=64, every=64, minimum=64)
+    for _ in range(64):
+        latencies.observe(latency)
+    return latencies
+
+
+def attempts_with_delays(*delays):
+    """attempt() that answers the n-th call after delays[n], with n"""
+
+    calls = []
+
+    async def attempt():
+        number = len(calls)
+        calls.append(number)
+        await asyncio.sleep(delays[number])
+        return number
+
+    return attempt, calls
+
+
+def test_latency_window_p95():
+    latencies = LatencyWindow(size=100, every=10, minimum=100)
+    for latency in range(1, 101):
+        latencies.observe(latency)
+    assert latencies.p95() == 95
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged_and_the_hedge_wins():
+    attempt, calls = attempts_with_delays(1, 0.01)
+    budget = HedgeBudget(ratio=1)
+    issued = HEDGES_ISSUED.value("test")
+    won = HEDGES_WON.value("test")
+
+    result = await hedged("test", attempt, window_with_p95(0.02), budget, 5)
+
+    assert result == 1
+    assert calls == [0, 1]
+    assert HEDGES_ISSUED.value("test") == issued + 1
+    assert HEDGES_WON.value("test") == won + 1
+
+
+@pytest.mark.asyncio
+async def test_fast_request_is_not_hedged():
+    attempt, calls = attempts_with_delays(0, 0)
+
+    result = await hedged("test", attempt, window_with_p95(0.05), HedgeBudget(1), 5)
+
+    assert result == 0
+    assert calls == [0]
+
+
+@pytest.mark.asyncio
+async def test_hedges_are_limited_by_the_budget():
+    attempt, calls = attempts_with_delays(0.05, 0)
+
+    # a request earns 0.5 hedges, not enough for one
+    result = await hedged(
+        "test", attempt, window_with_p95(0.01), HedgeBudget(ratio=0.5), 5
+    )
+
+    assert result == 0
+    assert calls == [0]
+
+
+@pytest.mark.asyncio
+async def test_server_error_of_the_primary_does_not_win():
+    calls = []
+
+    async def attempt():
+        calls.append(len(calls))
+        response = Response()
+        if len(calls) == 1:
+            await asyncio.sleep(0.05)
+            response.status_code = 503
+        else:
+            await asyncio.sleep(0.1)
+            response.status_code = 200
+        return response
+
+    won = HEDGES_WON.value("test")
+
+    response = await hedged("test", attempt, window_with_p95(0.01), HedgeBudget(1), 5)
+
+    assert response.status_code == 200
+    assert calls == [0, 1]
+    assert HEDGES_WON.value("test") == won + 1
+
+
+@pytest.mark.asyncio
+async def test_primary_is_cancelled_with_the_caller():
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def attempt():
+        started.set()
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.ensure_future(
+        hedged("test", attempt, window_with_p95(0.5), HedgeBudget(0), 5)
+    )
+    await started.wait()
+    caller.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=0.5)
+
+
+@pytest.mark.asyncio
+async def test_user_lookups_are_hedged_when_enabled(monkeypatch):
+    delays = [1, 0]
+
+    async def mock_get(*args, **kwargs):
+        await asyncio.sleep(delays.pop(0))
+        response = Response()
+        response.status_code = 200
+        return response
+
+    monkeypatch.setattr("app.services.httpx.AsyncClient.get", mock_get)
+    monkeypatch.setattr(services.app_settings, "USER_HEDGING_ENABLED", True)
+    monkeypatch.setattr(services, "users_latencies", window_with_p95(0.01))
+    monkeypatch.setattr(services, "users_hedge_budget", HedgeBudget(ratio=1))
+    won = HEDGES_WON.value("users")
+
+    response = await asyncio.wait_for(ServiceUsers.get("/users/1"), timeout=0.5)
+
+    assert response.status_code == 200
+    assert HEDGES_WON.value("users") == won + 1
+
+
+@pytest.mark.asyncio
+async def test_list_of_all_users_is_not_hedged_nor_observed(monkeypatch):
+    calls = []
+
+    async def mock_get(*args, **kwargs):
+        calls.append(args)
+        await asyncio.sleep(0.05)
+        response = Response()
+        response.status_code = 200
+        return response
+
+    latencies = window_with_p95(0.01)
+    monkeypatch.setattr("app.services.httpx.AsyncClient.get", mock_get)
+    monkeypatch.setattr(services.app_settings, "USER_HEDGING_ENABLED", True)
+    monkeypatch.setattr(services, "users_latencies", latencies)
+    monkeypatch.setattr(services, "users_hedge_budget", HedgeBudget(ratio=1))
+    observed = list(latencies._latencies)
+
+    response = await ServiceUsers.get_all()
+
+    assert response.status_code == 200
+    assert len(calls) == 1
+    assert list(latencies._latencies) == observed
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+import mongomock
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app, logger
+from app.leases import Lease
+from app.trainings.models import StateTraining
+from app.trainings.rankings import TrainingsRankings, rankings
+
+client = TestClient(app)
+
+
+def training_with(title, qualifications, count_comments=0, blocked=False, days=0):
+    date = datetime.utcnow() - timedelta(days=days)
+    return {
+        "id_trainer": ObjectId(),
+        "title": title,
+        "description": "string",
+        "type": "Walking",
+        "difficulty": 1,
+        "media": [],
+        "blocked": blocked,
+        "scores": [
+            {"id_user": ObjectId(), "qualification": qualification, "date": date}
+            for qualification in qualifications
+        ],
+        "comments": [
+            {
+                "id": ObjectId.from_datetime(date),
+                "id_user": ObjectId(),
+                "detail": "comment",
+            }
+            for _ in range(count_comments)
+        ],
+    }
+
+
+@pytest.fixture()
+def mongo_mock(monkeypatch):
+    mongo_client = mongomock.MongoClient()
+    db = mongo_client.get_database("training_microservice")
+    trainings = db.get_collection("trainings")
+
+    global ids
+    ids = {}
+    for training in [
+        training_with("Good", [5, 4, 5]),
+        training_with("Best", [5, 5, 5, 5]),
+        training_with("Few votes", [5]),
+        training_with("Blocked", [5, 5, 5], blocked=True),
+        training_with("Old", [1, 1, 1], count_comments=5, days=30),
+    ]:
+        ids[training["title"]] = trainings.insert_one(training).inserted_id
+
+    db.get_collection("athletes_states").insert_many(
+        [
+            {
+                "user_id": ObjectId(),
+                "training_id": ids["Few votes"],
+                "state": StateTraining.INIT.value,
+                "date_start": datetime.utcnow(),
+                "goals": [],
+            }
+            for _ in range(3)
+        ]
+    )
+
+    app.logger = logger
+    monkeypatch.setattr(app, "database", db, raising=False)
+    monkeypatch.setattr(rankings, "top", [])
+    monkeypatch.setattr(rankings, "trending", [])
+    return db
+
+
+def test_rankings_not_computed_return_not_found(mongo_mock):
+    assert client.get("/trainings/top").status_code == 404
+    assert client.get("/trainings/trending").status_code == 404
+
+
+def test_top_trainings(mongo_mock):
+    rankings.refresh(mongo_mock)
+
+    response = client.get("/trainings/top")
+    assert response.status_code == 200
+    assert [training["title"] for training in response.json()] == [
+        "Best",
+        "Good",
+        "Old",
+    ]
+    assert response.json()[0]["score_average"] == 5
+    assert response.json()[0]["count_scores"] == 4
+
+    response = client.get("/trainings/top?limit=1")
+    assert [training["id"] for training in response.json()] == [str(ids["Best"])]
+
+
+def test_trending_trainings(mongo_mock):
+    rankings.refresh(mongo_mock)
+
+    response = client.get("/trainings/trending")
+    assert response.status_code == 200
+
+    # "Few votes": 1 score * 2 + 3 starts * 3, "Old" activity is out of window
+    titles = [training["title"] for training in response.json()]
+    assert titles == ["Few votes", "Best", "Good"]
+    assert response.json()[0]["count_starts"] == 3
+
+
+def test_rankings_are_computed_with_aggregations(mongo_mock):
+    top = TrainingsRankings.compute_top(mongo_mock)
+    assert "Blocked" not in [training["title"] for training in top]
+    assert all(training["count_scores"] >= 3 for training in top)
+
+
+def test_lease_is_held_by_one_worker_until_it_expires(mongo_mock):
+    now = datetime.utcnow()
+    first = Lease(mongo_mock["leases"], "rankings", seconds=10, owner="first")
+    second = Lease(mongo_mock["leases"], "rankings", seconds=10, owner="second")
+
+    assert first.acquire(now)
+    assert not second.acquire(now)
+    assert first.acquire(now + timedelta(seconds=5))  # renewed
+    assert not second.acquire(now + timedelta(seconds=14))
+    assert second.acquire(now + timedelta(seconds=16))
+    assert not first.acquire(now + timedelta(seconds=16))
+
+
+def test_only_the_worker_with_the_lease_computes_the_rankings(mongo_mock):
+    leader = TrainingsRankings()
+    follower = TrainingsRankings()
+    leases = mongo_mock["leases"]
+
+    leader.refresh_or_load(mongo_mock, Lease(leases, "rankings", 60, owner="a"))
+    # the follower does not aggregate: it reads what the leader saved
+    mongo_mock["trainings"].delete_many({})
+    follower.refresh_or_load(mongo_mock, Lease(leases, "rankings", 60, owner="b"))
+
+    assert follower.top == leader.top
+    assert follower.trending == leader.trending
+    assert [training["title"] for training in follower.top][:1] == ["Best"]
@@ -0,0 +1,125 @@
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+from app.main import app_settings
+from app.config.auth_settings import SettingsAuth
+from app.rate_limit import (
+    RATE_LIMITED,
+    MemoryBucketStore,
+    RateLimitMiddleware,
+    parse_rate_limits,
+)
+from app.trainings.models import UserRoles
+
+
+def limited_client(limits):
+    limited = FastAPI()
+    limited.add_middleware(
+        RateLimitMiddleware,
+        limits=parse_rate_limits(limits),
+        secret=app_settings.JWT_SECRET,
+        algorithm=app_settings.JWT_ALGORITHM,
+    )
+
+    @limited.patch("/athletes/me/trainings/{training_id}/start")
+    async def start(training_id: str):
+        return training_id
+
+    @limited.get("/trainings/{training_id}")
+    async def detail(training_id: str):
+        return training_id
+
+    # as uvicorn runs it, trusting the router (the test client) in front
+    return TestClient(ProxyHeadersMiddleware(limited, trusted_hosts="testclient"))
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("athlete_states=user:0.5:10,ip:5:50;writes=ip:1:2") == {
+        "athlete_states": {"user": (0.5, 10), "ip": (5, 50)},
+        "writes": {"ip": (1, 2)},
+    }
+    with pytest.raises(ValueError):
+        parse_rate_limits("writes=ip:0:10")
+
+
+def test_bucket_refills_and_idle_buckets_are_evicted():
+    store = MemoryBucketStore(evict_seconds=60)
+    assert store.take("a", rate=1, burst=2, now=0) == 0
+    assert store.take("a", rate=1, burst=2, now=0) == 0
+    assert store.take("a", rate=1, burst=2, now=0) == 1
+    assert store.take("a", rate=1, burst=2, now=1) == 0
+    store.take("b", rate=1, burst=2, now=1)
+
+    assert store.evict(now=2) == 1  # "b" is full again, "a" needs 1s more
+    assert store.evict(now=3) == 1
+    assert store.buckets == {}
+
+
+def test_a_rejected_request_takes_no_token_of_the_other_buckets():
+    store = MemoryBucketStore(evict_seconds=60)
+    user, ip = ("user", 1, 2), ("ip", 1, 1)
+    assert store.take_all([user, ip], now=0) == [0, 0]
+    assert store.take_all([user, ip], now=0) == [0, 1]
+    # the user bucket still has the token the rejected request did not take
+    assert store.take("user", rate=1, burst=2, now=0) == 0
+
+
+def test_request_rejected_by_ip_does_not_spend_user_tokens():
+    client = limited_client("athlete_states=user:0.001:2,ip:0.001:1")
+    path = "/athletes/me/trainings/1/start"
+    token = SettingsAuth.generate_token_with_role(str(ObjectId()), UserRoles.ATLETA)
+    first = {"Authorization": f"Bearer {token}", "X-Forwarded-For": "10.0.0.1"}
+    other = {"Authorization": f"Bearer {token}", "X-Forwarded-For": "10.0.0.2"}
+
+    assert client.patch(path, headers=first).status_code == 200
+    for _ in range(3):
+        assert client.patch(path, headers=first).status_code == 429
+    # the user has one token left despite the requests rejected by ip
+    assert client.patch(path, headers=other).status_code == 200
+    assert client.patch(path, headers=other).status_code == 429
+
+
+def test_each_user_has_its_own_bucket():
+    client = limited_client("athlete_states=user:0.001:2")
+    path = "/athletes/me/trainings/1/start"
+    tokens = [
+        SettingsAuth.generate_token_with_role(str(ObjectId()), UserRoles.ATLETA)
+        for _ in range(2)
+    ]
+    before = RATE_LIMITED.value("athlete_states", "user")
+
+    for _ in range(2):
+        response = client.patch(path, headers={"Authorization": f"Bearer {tokens[0]}"})
+        assert response.status_code == 200
+    response = client.patch(path, headers={"Authorization": f"Bearer {tokens[0]}"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+
+    response = client.patch(path, headers={"Authorization": f"Bearer {tokens[1]}"})
+    assert response.status_code == 200
+    assert RATE_LIMITED.value("athlete_states", "user") == before + 1
+
+
+def test_ip_limit_only_applies_to_its_route_group():
+    client = limited_client("athlete_states=ip:0.001:1")
+    headers = {"X-Forwarded-For": "10.0.0.1"}
+
+    assert client.patch("/athletes/me/trainings/1/start", headers=headers).status_code == 200
+    assert client.patch("/athletes/me/trainings/1/start", headers=headers).status_code == 429
+    assert client.get("/trainings/1", headers=headers).status_code == 200
+
+    other = {"X-Forwarded-For": "10.0.0.2"}
+    assert client.patch("/athletes/me/trainings/1/start", headers=other).status_code == 200
+
+
+def test_spoofed_first_hop_does_not_get_a_new_bucket():
+    client = limited_client("athlete_states=ip:0.001:1")
+    path = "/athletes/me/trainings/1/start"
+
+    # the router appends the address it saw after what the client sent
+    first = {"X-Forwarded-For": "1.1.1.1, 10.0.0.1"}
+    assert client.patch(path, headers=first).status_code == 200
+    spoofed = {"X-Forwarded-For": "2.2.2.2, 10.0.0.1"}
+    assert client.patch(path, headers=spoofed).status_code == 429
@@ -0,0 +1,187 @@
+from bson import ObjectId
+import mongomock
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app, logger
+from app.config.auth_settings import SettingsAuth
+from app.trainings.models import StateTraining, UserRoles
+from starlette import status
+
+client = TestClient(app)
+
+trainer_id_example_mock = ObjectId()
+athlete_id_example_mock = ObjectId()
+
+access_token_trainer_example = SettingsAuth.generate_token_with_role(
+    str(trainer_id_example_mock), UserRoles.TRAINER
+)
+access_token_athlete_example = SettingsAuth.generate_token_with_role(
+    str(athlete_id_example_mock), UserRoles.ATLETA
+)
+
+OPERATIONS = [
+    "find",
+    "find_one",
+    "find_one_and_update",
+    "update_one",
+    "insert_one",
+    "insert_many",
+    "delete_one",
+    "count_documents",
+    "aggregate",
+]
+
+
+class CountingCollection:
+    """Proxy of a collection that counts every operation sent to MongoDB"""
+
+    def __init__(self, collection, calls):
+        self._collection = collection
+        self._calls = calls
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in OPERATIONS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._calls.append((self._collection.name, name))
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+class CountingDatabase:
+    def __init__(self, database):
+        self._database = database
+        self.calls = []
+
+    def __getitem__(self, name):
+        return CountingCollection(self._database[name], self.calls)
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+
+async def mock_set_state(*args, **kwargs):
+    return {"status_code": 200, "body": {"ok": "ok"}}
+
+
+async def mock_post_goals(*args, **kwargs):
+    return {"status_code": 200, "body": {"id": str(ObjectId())}}
+
+
+@pytest.fixture()
+def counting_db(monkeypatch):
+    mongo_client = mongomock.MongoClient()
+    db = mongo_client.get_database("training_microservice")
+    global training_id_example_mock
+    training_id_example_mock = db["trainings"].insert_one(
+        {
+            "id_trainer": trainer_id_example_mock,
+            "title": "A",
+            "description": "string",
+            "type": "Walking",
+            "difficulty": 1,
+            "media": [],
+            "blocked": False,
+            "scores": [],
+            "comments": [],
+            "goals": [
+                {"title": "A", "description": "A", "metric": "Steps", "quantity_steps": 1}
+            ],
+        }
+    ).inserted_id
+
+    counting = CountingDatabase(db)
+    app.logger = logger
+    monkeypatch.setattr(app, "database", counting, raising=False)
+    monkeypatch.setattr("app.trainings.athletes.create_goal_started", mock_post_goals)
+    monkeypatch.setattr("app.trainings.athletes.set_state", mock_set_state)
+    return counting
+
+
+def request_counting(counting_db, method, url, token, **kwargs):
+    counting_db.calls.clear()
+    response = client.request(
+        method, url, headers={"Authorization": f"Bearer {token}"}, **kwargs
+    )
+    return response, list(counting_db.calls)
+
+
+def test_update_training_is_a_single_round_trip(counting_db):
+    response, calls = request_counting(
+        counting_db,
+        "PATCH",
+        f"/trainers/me/trainings/{training_id_example_mock}",
+        access_token_trainer_example,
+        json={"title": "B"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert calls == [("trainings", "update_one")]
+
+
+def test_add_and_modify_score_are_a_single_round_trip(counting_db):
+    response, calls = request_counting(
+        counting_db,
+        "POST",
+        f"/trainings/{training_id_example_mock}/score",
+        access_token_athlete_example,
+        json={"qualification": 4},
+    )
+    assert response.status_code == status.HTTP_201_CREATED
+    assert calls == [("trainings", "update_one")]
+
+    response, calls = request_counting(
+        counting_db,
+        "PATCH",
+        f"/trainings/{training_id_example_mock}/score",
+        access_token_athlete_example,
+        json={"qualification": 5},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert calls == [("trainings", "update_one")]
+
+
+def test_start_stop_and_complete_round_trips(counting_db):
+    url = f"/athletes/me/trainings/{training_id_example_mock}"
+
+    response, calls = request_counting(
+        counting_db, "PATCH", f"{url}/start", access_token_athlete_example
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert calls == [
+        ("trainings", "find_one"),
+        ("athletes_states", "find_one"),
+        ("athletes_states", "insert_one"),
+    ]
+
+    response, calls = request_counting(
+        counting_db, "PATCH", f"{url}/stop", access_token_athlete_example
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert calls == [
+        ("trainings", "find_one"),
+        ("athletes_states", "find_one_and_update"),
+    ]
+
+    response, calls = request_counting(
+        counting_db, "PATCH", f"{url}/start", access_token_athlete_example
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert calls == [
+        ("trainings", "find_one"),
+        ("athletes_states", "find_one"),
+        ("athletes_states", "update_one"),
+    ]
+
+    response, calls = request_counting(
+        counting_db, "PATCH", f"{url}/complete", access_token_athlete_example
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert calls == [("trainings", "find_one"), ("athletes_states", "update_one")]
+
+    state = counting_db["athletes_states"].find_one(
+        {"user_id": athlete_id_example_mock}
+    )
+    assert state["state"] == StateTraining.COMPLETE.value
@@ -169,3 +169,121 @@ def test_delete_training(mongo_mock):
 
     assert response.status_code == 404
     assert response_body == f"Training {training_id} not found to delete"
+
+
+def test_post_trainings_bulk(mongo_mock, monkeypatch):
+    calls = []
+
+    async def mock_get_counting(*args, **kwargs):
+        calls.append(args[0])
+        return await mock_get(*args, **kwargs)
+
+    published = []
+    monkeypatch.setattr("app.services.ServiceUsers.get", mock_get_counting)
+    monkeypatch.setattr(
+        "app.publisher.publisher_queue_middleware.publisher.publish_message",
+        published.append,
+    )
+
+    data = [
+        {"title": f"Bulk {i}", "description": "BABA", "type": "Running", "difficulty": 2}
+        for i in range(3)
+    ]
+    response = client.post(
+        "trainers/me/trainings/bulk",
+        json=data,
+        headers={"Authorization": f"Bearer {access_token_trainer_example}"},
+    )
+
+    assert response.status_code == 201
+    response_body = response.json()
+    assert [training["title"] for training in response_body] == ["Bulk 0", "Bulk 1", "Bulk 2"]
+    assert all(training["trainer"]["name"] == "Juan" for training in response_body)
+    assert len(calls) == 1
+
+    trainings = app.database["trainings"]
+    for training in response_body:
+        assert trainings.find_one({"_id": ObjectId(training["id"])})["title"] == training["title"]
+
+    assert [message["training_id"] for message in published] == [
+        training["id"] for training in response_body
+    ]
+    assert all(message["action"] == "new_training" for message in published)
+    assert all(message["training_type"] == "RUNNING" for message in published)
+
+
+def test_post_trainings_bulk_empty(mongo_mock):
+    response = client.post(
+        "trainers/me/trainings/bulk",
+        json=[],
+        headers={"Authorization": f"Bearer {access_token_trainer_example}"},
+    )
+    assert response.status_code == 400
+
+
+def test_get_trainer_stats(mongo_mock, monkeypatch):
+    async def mock_get_all_users(*args, **kwargs):
+        response = Response()
+        response.status_code = 200
+        response.json = lambda: [
+            {"id": str(ObjectId()), "trainings": [{"id_training": str(training_id_example_mock)}]},
+            {"id": str(ObjectId()), "trainings": []},
+        ]
+        return response
+
+    monkeypatch.setattr("app.trainings.trainers_stats.ServiceUsers.get_all", mock_get_all_users)
+    trainings = app.database["trainings"]
+    trainings.update_one(
+        {"_id": training_id_example_mock},
+        {"$set": {
+            "scores": [{"id_user": ObjectId(), "qualification": 4}, {"id_user": ObjectId(), "qualification": 2}],
+            "comments": [{"id": ObjectId(), "id_user": ObjectId(), "detail": "hola"}],
+        }},
+    )
+    athletes_states = app.database["athletes_states"]
+    for state in ["INIT", "INIT", "COMPLETE"]:
+        athletes_states.insert_one({"user_id": ObjectId(), "training_id": training_id_example_mock, "state": state, "goals": []})
+    athletes_states.insert_one({"user_id": ObjectId(), "training_id": ObjectId(), "state": "STOP", "goals": []})
+
+    response = client.get("/trainers/me/stats", headers={"Authorization": f"Bearer {access_token_trainer_example}"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "count_trainings": 1,
+        "trainings": [{
+            "id": str(training_id_example_mock),
+            "title": "A",
+            "count_favorites": 1,
+            "count_scores": 2,
+            "score_average": 3,
+            "count_comments": 1,
+            "count_athletes": {"INIT": 2, "STOP": 0, "COMPLETE": 1},
+        }],
+    }
+
+
+def test_get_trainer_stats_without_the_users_service(mongo_mock, monkeypatch):
+    async def mock_get_all_failed(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr("app.trainings.trainers_stats.ServiceUsers.get_all", mock_get_all_failed)
+
+    response = client.get("/trainers/me/stats", headers={"Authorization": f"Bearer {access_token_trainer_example}"})
+
+    assert response.status_code == 200
+    assert response.json()["trainings"][0]["count_favorites"] is None
+
+
+def test_get_trainer_stats_when_the_users_service_fails(mongo_mock, monkeypatch):
+    async def mock_get_all_error(*args, **kwargs):
+        response = Response()
+        response.status_code = 503
+        response.json = lambda: {"detail": "Service unavailable"}
+        return response
+
+    monkeypatch.setattr("app.trainings.trainers_stats.ServiceUsers.get_all", mock_get_all_error)
+
+    response = client.get("/trainers/me/stats", headers={"Authorization": f"Bearer {access_token_trainer_example}"})
+
+    assert response.status_code == 200
+    assert response.json()["trainings"][0]["count_favorites"] is None
@@ -1,3 +1,6 @@
+import asyncio
+import json
+import time
 
 from bson import ObjectId
 from requests.models import Response
@@ -8,6 +11,8 @@ from fastapi.testclient import TestClient
 from app.main import app, logger
 from app.config.auth_settings import SettingsAuth
 from app.trainings.models import UserRoles
+from app.circuit_breaker import OPEN
+from app.services import users_breaker
 
 
 
@@ -144,6 +149,37 @@ def test_unblock_status(mongo_mock):
     assert response.status_code == 200
     assert response.json() == f"Training {training_id_example_mock} successfully unblocked"
 
+async def mock_get_slow(*args, **kwargs):
+    await asyncio.sleep(1)
+    return await mock_get(*args, **kwargs)
+
+def test_get_training_by_id_best_effort_with_failed_user(mongo_mock, monkeypatch):
+    monkeypatch.setattr("app.services.ServiceUsers.get", mock_get_fail)
+    monkeypatch.setattr("app.trainings.models.ServiceUsers.get", mock_get_fail)
+    response = client.get(f"/trainings/{training_id_example_mock}?map_states=false&map_users=best_effort")
+
+    assert response.status_code == 200
+    assert response.json()["trainer"] == {"id": trainer_id_example_mock, "unmapped": True}
+
+def test_get_trainings_best_effort_is_bounded_by_deadline(mongo_mock, monkeypatch):
+    monkeypatch.setattr("app.trainings.models.ServiceUsers.get", mock_get_slow)
+    monkeypatch.setattr("app.main.app_settings.MAP_USERS_DEADLINE_MS", 50)
+
+    start = time.monotonic()
+    response = client.get("/trainings?map_states=false&map_users=best_effort")
+    assert time.monotonic() - start < 0.5
+
+    assert response.status_code == 200
+    assert response.json()[0]["trainer"] == {"id": trainer_id_example_mock, "unmapped": True}
+
+def test_get_trainings_map_users_accepts_booleans(mongo_mock):
+    response = client.get("/trainings?map_states=false&map_users=0")
+    assert response.status_code == 200
+    assert response.json()[0]["trainer"] == {"id": trainer_id_example_mock}
+
+    response = client.get("/trainings?map_states=false&map_users=1")
+    assert response.json()[0]["trainer"]["name"] == "Juan"
+
 def test_get_training_by_id_failed(mongo_mock,monkeypatch):
     monkeypatch.setattr("app.services.ServiceUsers.get", mock_get_fail)
     response = client.get(f"/trainings/{training_id_example_mock}?map_states=false")
@@ -151,7 +187,7 @@ def test_get_training_by_id_failed(mongo_mock,monkeypatch):
     assert response.status_code == 500
     
 def test_get_statistics_by_id_training(mongo_mock, monkeypatch):
-    monkeypatch.setattr("app.trainings.trainings.ServiceUsers.get", mock_get_all_users)
+    monkeypatch.setattr("app.trainings.trainings.ServiceUsers.get_all", mock_get_all_users)
 
     response = client.get(f"/trainings/{training_id_example_mock}/statistics")
     assert response.status_code == 200
@@ -165,7 +201,7 @@ def test_get_statistics_by_id_training(mongo_mock, monkeypatch):
     
     
 def test_get_statistics_by_id_training(mongo_mock, monkeypatch):
-    monkeypatch.setattr("app.trainings.trainings.ServiceUsers.get", mock_get_all_users)
+    monkeypatch.setattr("app.trainings.trainings.ServiceUsers.get_all", mock_get_all_users)
     client.post(f"/trainings/{training_id_example_mock}/score", headers={"Authorization": f"Bearer {access_token_trainer_example}"}, json={"qualification": 5})
     client.post(f"/trainings/{training_id_example_mock}/comment", headers={"Authorization": f"Bearer {access_token_trainer_example}"}, json={"detail": "comment1"})
     client.post(f"/trainings/{training_id_example_mock}/comment", headers={"Authorization": f"Bearer {access_token_trainer_example}"}, json={"detail": "comment2"})
@@ -182,4 +218,39 @@ def test_get_statistics_by_id_training(mongo_mock, monkeypatch):
         'count_comments': 3
     })
     
-    
\ No newline at end of file
+    
+
+def test_export_trainings_ndjson(mongo_mock):
+    trainings = app.database["trainings"]
+    other = dict(training_example_mock, title="B")
+    other.pop("_id", None)
+    other_id = trainings.insert_one(other).inserted_id
+
+    response = client.get("/trainings/export?batch_size=1")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [
+        str(training_id_example_mock),
+        str(other_id),
+    ]
+    assert lines[0]["trainer"] == {"id": trainer_id_example_mock}
+
+    response = client.get(f"/trainings/export?since={training_id_example_mock}")
+    assert [json.loads(line)["title"] for line in response.text.splitlines()] == ["B"]
+
+    response = client.get("/trainings/export?title=B")
+    assert len(response.text.splitlines()) == 1
+
+    response = client.get("/trainings/export?since=yesterday")
+    assert response.status_code == 400
+
+
+def test_get_statistics_while_the_users_circuit_is_open(mongo_mock):
+    users_breaker.transition(OPEN)
+
+    response = client.get(f"/trainings/{training_id_example_mock}/statistics")
+
+    assert response.status_code == 200
+    assert response.json()["count_favorites"] is None